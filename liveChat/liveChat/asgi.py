@@ -1,16 +1,20 @@
 import os
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-import myapp.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'liveChat.settings')
 
+# 앱과 모델을 불러오는 모듈은 get_asgi_application()이 django.setup()을 실행한 뒤에 import해야 합니다.
+django_asgi_app = get_asgi_application()
+
+import myapp.routing  # noqa: E402
+from myapp.handshake import CachedAuthMiddlewareStack  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": django_asgi_app,
+    "websocket": CachedAuthMiddlewareStack(
         URLRouter(
             myapp.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
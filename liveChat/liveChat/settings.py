@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "myapp.metrics.MetricsMiddleware",  # 뷰별 요청 시간과 DB 쿼리 시간 기록
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -70,6 +71,124 @@ CHANNEL_LAYERS = {
         },
     },
 }
+
+# WebSocket 메시지 write-behind 버퍼
+CHAT_WRITE_BUFFER = {
+    'BATCH_SIZE': 200,  # 이 개수만큼 쌓이면 바로 bulk_create
+    'FLUSH_INTERVAL': 0.5,  # 초 단위, 이 시간이 지나면 쌓인 만큼 저장
+}
+
+# 읽음 위치(ReadMark) 저장 버퍼 (ack와 채팅방 입장마다 저장하지 않고 모아서 저장)
+CHAT_READ_MARKS = {
+    'FLUSH_INTERVAL': 2.0,  # 초 단위, 이 시간 동안 모인 읽음 위치를 한 번에 저장
+    'MAX_PENDING': 1000,  # 저장하지 않은 (사용자, 채팅방)이 이 개수만큼 쌓이면 바로 저장
+}
+
+# 연결별 송신 큐
+CHAT_SEND_QUEUE = {
+    'MAX_SIZE': 256,  # 연결마다 쌓아 둘 수 있는 최대 메시지 수
+    'POLICY': 'drop_oldest',  # 큐가 가득 찼을 때: 'drop_oldest', 'drop_newest', 'disconnect'
+    'CLOSE_CODE': 4008,  # 'disconnect' 정책으로 연결을 끊을 때 사용할 close code
+}
+
+# 메시지 전송 rate limit (토큰 버킷)
+# 워커가 여러 개면 'myapp.ratelimit.DjangoCacheRateLimiter'를 사용해 한도를 공유해야 합니다.
+CHAT_RATE_LIMITS = {
+    'BACKEND': 'myapp.ratelimit.LocalRateLimiter',
+    'OPTIONS': {},
+    'RATES': {  # (초당 채워지는 토큰 수, 최대 버스트)
+        'user': (5, 20),  # 로그인 사용자별
+        'anonymous': (2, 10),  # 익명 세션별
+        'room': (100, 300),  # 채팅방별
+    },
+}
+
+# 출력 프레임 묶음 전송 (?coalesce=1로 연결한 클라이언트에만 적용)
+CHAT_COALESCE = {
+    'WINDOW': 0.025,  # 초 단위, 첫 메시지부터 이 시간 동안 모은 메시지를 한 프레임으로 전송
+    'MAX_BATCH': 50,  # 이 개수만큼 모이면 바로 전송
+}
+
+# /metrics 메트릭 (Prometheus 텍스트 형식)
+CHAT_METRICS = {
+    'CACHE_ALIAS': None,  # 워커 간 합계를 낼 공유 캐시 (예: Redis 캐시 alias). None이면 요청을 받은 워커의 값만 반환
+    'PUBLISH_INTERVAL': 15,  # 초 단위, 워커마다 캐시에 메트릭을 저장하는 주기
+    'KEY_PREFIX': 'metrics',
+}
+
+# 채팅방 메시지 기록 페이지네이션
+CHAT_HISTORY = {
+    'PAGE_SIZE': 50,  # 채팅방 상세 화면에 처음 보여줄 최근 메시지 수
+    'MAX_PAGE_SIZE': 200,  # 이전 메시지 JSON 요청에서 허용하는 최대 limit
+    'GZIP_MIN_SIZE': 1024,  # 바이트 단위, 기록 JSON(/history/) 응답이 이보다 크면 gzip으로 압축 (Accept-Encoding: gzip인 경우)
+}
+
+# 채팅방 목록 페이지네이션 (RoomSummary의 최근 활동 순, 키셋 커서)
+CHAT_ROOM_LIST = {
+    'PAGE_SIZE': 50,  # 채팅방 목록 한 페이지에 보여줄 채팅방 수
+}
+
+# 오래된 메시지 보관 (python manage.py archive_messages)
+CHAT_ARCHIVE = {
+    'RETENTION_DAYS': 30,  # 이 일수보다 오래된 메시지를 채팅방별, 날짜별 압축 보관 데이터로 옮김
+    'CHUNK_SIZE': 1000,  # 한 번에 읽고 삭제할 메시지 수
+}
+
+# 채팅방별 최근 메시지 캐시 (링 버퍼)
+# 워커가 여러 개면 'myapp.message_cache.DjangoCacheRecentMessageStore'를 사용해 캐시를 공유해야 합니다.
+CHAT_RECENT_MESSAGES = {
+    'BACKEND': 'myapp.message_cache.LocalRecentMessageStore',
+    'OPTIONS': {
+        'room_capacity': 100,  # 방마다 보관할 최근 메시지 수
+        'max_rooms': 1000,  # 보관할 최대 방 수 (넘으면 가장 오래 사용되지 않은 방부터 제거)
+        'max_bytes': 32 * 1024 * 1024,  # 전체 메모리 한도
+    },
+}
+
+# 채팅방 접속자 레지스트리
+# 워커가 여러 개면 'myapp.presence.DjangoCachePresenceRegistry'를 사용해 접속자 목록을 공유해야 합니다.
+CHAT_PRESENCE = {
+    'BACKEND': 'myapp.presence.LocalPresenceRegistry',
+    'OPTIONS': {},
+}
+
+# 입장/퇴장 알림 묶음 (WINDOW 동안 들어온 알림을 방마다 "alice, bob and 48 others joined the room." 하나로 보내고 저장)
+CHAT_ANNOUNCEMENTS = {
+    'WINDOW': 0.5,  # 초 단위, window의 첫 알림은 바로 보내고 나머지는 window가 끝날 때 모아서 보냄
+    'MAX_NAMES': 2,  # 알림에 표시할 최대 이름 수 (나머지는 "and N others")
+    'COUNT_ONLY_THRESHOLD': 100,  # 접속자가 이보다 많은 방은 이름 없이 접속자 수({"type": "presence", "online_count": N})만 보냄
+}
+
+# 입력 중 표시 ({"type": "typing"}, 저장하지 않고 낮은 우선순위로 방에만 전달)
+CHAT_TYPING = {
+    'INTERVAL': 1.0,  # 초 단위, 방과 사용자마다 이 시간에 한 번만 전달
+    'TTL': 3.0,  # 초 단위, 새 이벤트가 없으면 클라이언트가 이 시간 뒤에 표시를 지움 (INTERVAL보다 길어야 함)
+}
+
+# 채팅방별 메시지 순번(seq) 발급 (재연결할 때 놓친 메시지만 다시 보내는 데 사용)
+# 워커가 여러 개면 'myapp.sequence.DjangoCacheSequenceAllocator'(Redis 등 키가 제거되지 않는 캐시)를 사용해야 합니다.
+CHAT_SEQUENCE = {
+    'BACKEND': 'myapp.sequence.LocalSequenceAllocator',
+    'OPTIONS': {},
+    'MAX_REPLAY': 500,  # 재연결할 때 다시 보낼 최대 메시지 수 (넘으면 클라이언트에 새로 고침을 요청)
+}
+
+# 익명 사용자 ID(익명N) 발급. 데이터베이스 카운터에서 BLOCK_SIZE개씩 번호를 예약해 프로세스 안에서 나눠 줍니다.
+CHAT_ANONYMOUS_IDS = {
+    'BLOCK_SIZE': 100,  # 카운터를 한 번 올릴 때 예약하는 번호 수 (클수록 쓰기가 줄고, 재시작할 때 버리는 번호가 늘어남)
+}
+
+# WebSocket 연결 때 세션 키로 찾은 사용자 캐시 (재연결이 몰려도 세션/사용자 테이블을 조회하지 않음)
+# 로그아웃과 세션 키 변경 때 지우며, 다른 워커의 로컬 캐시는 timeout이 지나야 반영됩니다.
+# 배포 직후의 재연결에도 캐시를 쓰려면 'myapp.handshake.DjangoCacheHandshakeCache'(Redis 등)를 사용합니다.
+CHAT_HANDSHAKE_CACHE = {
+    'BACKEND': 'myapp.handshake.LocalHandshakeCache',
+    'OPTIONS': {
+        'timeout': 30,  # 초 단위, 캐시한 사용자를 보관하는 시간
+        'max_entries': 10000,  # 보관할 최대 세션 수 (넘으면 가장 오래 사용되지 않은 세션부터 제거)
+    },
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
@@ -127,6 +246,8 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # logging
+# 로그는 큐에 넣기만 하고 백그라운드 스레드가 JSON 한 줄씩 파일에 씁니다. (요청과 이벤트 루프를 막지 않습니다)
+# 로거별 레벨은 환경 변수로 바꿀 수 있습니다.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -139,25 +260,32 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'myapp.utils.logging_helpers.JsonFormatter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'myapp.utils.logging_helpers.QueueFileHandler',
             'filename': 'django_debug.log',
-            'formatter': 'verbose',
+            'max_queue_size': 10000,  # 큐가 가득 차면 기다리지 않고 로그를 버립니다.
+            'formatter': 'json',
         },
     },
     'loggers': {
         'django': {
             'handlers': ['file'],
-            'level': 'DEBUG',
+            'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': True,
         },
+        'django.db.backends': {  # 모든 SQL 문을 기록하려면 DEBUG로 설정합니다.
+            'level': os.getenv('DJANGO_DB_LOG_LEVEL', 'WARNING'),
+        },
         'myapp': {  # 'myapp'은 애플리케이션 이름입니다.
             'handlers': ['file'],
-            'level': 'DEBUG',
+            'level': os.getenv('MYAPP_LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO'),
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
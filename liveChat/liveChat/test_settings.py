@@ -0,0 +1,22 @@
+# 테스트와 벤치마크용 설정 (MySQL, Redis 없이 SQLite와 인메모리 채널 레이어로 실행)
+# python manage.py test --settings=liveChat.test_settings
+from .settings import *  # noqa: F401,F403
+from .settings import SECRET_KEY
+
+SECRET_KEY = SECRET_KEY or 'test-secret-key'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',  # noqa: F405
+    }
+}
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# 테스트에서 사용자 생성/로그인을 빠르게 하기 위해 가벼운 해시를 사용합니다.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,128 @@
+import asyncio
+
+from django.conf import settings
+from django.utils import timezone
+
+from .fanout import get_fanout
+from .history import format_timestamp, serialize_message
+from .message_buffer import write_buffer
+from .message_cache import get_recent_message_store
+from .models import Message
+from .presence import get_presence_registry
+from .sequence import get_sequence_allocator
+from .utils.logging_helpers import log_error
+
+JOINED = 'joined'
+LEFT = 'left'
+
+
+def format_announcement(action, names, max_names=2):
+    """'alice joined the room.', 'alice and bob joined the room.', 'alice, bob and 48 others joined the room.'"""
+    if len(names) == 1:
+        subject = names[0]
+    elif len(names) <= max_names:
+        subject = f"{', '.join(names[:-1])} and {names[-1]}"
+    else:
+        others = len(names) - max_names
+        subject = f"{', '.join(names[:max_names])} and {others} other{'s' if others > 1 else ''}"
+    return f'{subject} {action} the room.'
+
+
+class PresenceAnnouncer:
+    """채팅방 입장/퇴장 알림을 방마다 window 동안 모아 하나로 보내는 announcer
+
+    window가 열릴 때 첫 알림은 바로 보내고, window 동안 들어온 알림은 모았다가
+    window가 끝날 때 "alice, bob and 48 others joined the room." 하나로 보냅니다.
+    N명이 한꺼번에 들어와도 프레임(N x N)과 저장(N번)이 window마다 한 번으로 줄어듭니다.
+    persist=True인 알림(참여자 입장/퇴장)은 메시지로 저장하고, 아니면 방 그룹에만 보냅니다.
+    접속자가 count_only_threshold명보다 많은 방에는 이름 없이 접속자 수만 보냅니다.
+    """
+
+    def __init__(self, window=0.5, max_names=2, count_only_threshold=100):
+        self.window = window
+        self.max_names = max_names
+        self.count_only_threshold = count_only_threshold
+        self._windows = {}  # (group, room_id, action, persist) -> (window 타이머, [(이름, user_id)])
+
+    def clear(self):
+        self._windows = {}
+
+    async def announce(self, group, room_id, action, name, user_id=None, persist=False):
+        key = (group, room_id, action, persist)
+        loop = asyncio.get_running_loop()
+        timer, pending = self._windows.get(key, (None, []))
+        if timer is not None and not timer.done() and timer.get_loop() is loop:
+            if all(pending_name != name for pending_name, _ in pending):
+                pending.append((name, user_id))
+            return
+        # 새 window를 엽니다. 이전 이벤트 루프에서 보내지 못하고 남은 알림이 있으면 함께 보냅니다.
+        self._windows[key] = (loop.create_task(self._close_later(key)), [])
+        if all(pending_name != name for pending_name, _ in pending):
+            pending.append((name, user_id))
+        await self._emit(key, pending, immediate=True)
+
+    async def flush(self):
+        """모아 둔 알림을 window가 끝나기를 기다리지 않고 모두 보냅니다."""
+        windows, self._windows = self._windows, {}
+        for key, (timer, pending) in windows.items():
+            timer.cancel()
+            if pending:
+                await self._emit(key, pending)
+
+    async def _close_later(self, key):
+        # 알림이 계속 들어오는 동안에는 window마다 한 번씩 보내고, 조용해지면 window를 닫습니다.
+        while True:
+            await asyncio.sleep(self.window)
+            timer, pending = self._windows.get(key, (None, []))
+            if not pending:
+                self._windows.pop(key, None)
+                return
+            self._windows[key] = (timer, [])
+            await self._emit(key, pending)
+
+    async def _emit(self, key, pending, immediate=False):
+        group, room_id, action, persist = key
+        names = [name for name, _ in pending]
+        content = format_announcement(action, names, self.max_names)
+        created_at = timezone.now()
+        try:
+            if persist:
+                await self._save(room_id, content, *pending[0], created_at, immediate)
+                return
+            online_count = await get_presence_registry().aonline_count(room_id)
+            if online_count > self.count_only_threshold:
+                # 큰 방은 누가 들어왔는지 대신 접속자 수만 알립니다.
+                await get_fanout().publish(group, {'type': 'presence', 'online_count': online_count})
+                return
+            await get_fanout().publish(group, {
+                'content': content,
+                'username': names[0],
+                'created_at': format_timestamp(created_at),
+            })
+        except Exception as e:
+            log_error("Failed to announce %d %s to %s: %s", len(names), action, group, e)
+
+    async def _save(self, room_id, content, name, user_id, created_at, immediate):
+        # 쓰기 버퍼에 넣어 다른 메시지와 함께 저장합니다. window의 첫 알림은 바로 저장해서
+        # 입장한 사용자가 보는 채팅방 화면에 자신의 입장 메시지가 보이도록 합니다.
+        seq = await get_sequence_allocator().aallocate(room_id)
+        message = Message(user_id=user_id, chat_room_id=room_id, content=content, created_at=created_at, seq=seq)
+        await write_buffer.add(message)
+        if immediate:
+            await write_buffer.flush()
+        # 로그인 사용자의 identity는 username입니다. (create_chat_message와 같은 표시 이름)
+        username = name if user_id is not None else 'Anonymous'
+        await get_recent_message_store().aappend(room_id, serialize_message(message, username=username))
+
+
+def _build_presence_announcer():
+    config = getattr(settings, 'CHAT_ANNOUNCEMENTS', {})
+    return PresenceAnnouncer(
+        window=config.get('WINDOW', 0.5),
+        max_names=config.get('MAX_NAMES', 2),
+        count_only_threshold=config.get('COUNT_ONLY_THRESHOLD', 100),
+    )
+
+
+# 프로세스마다 하나의 announcer를 공유합니다.
+presence_announcer = _build_presence_announcer()
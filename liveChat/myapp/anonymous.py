@@ -0,0 +1,109 @@
+import functools
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+
+from .models import Counter
+
+# 세션에 익명 ID를 저장하는 키 (HTTP 뷰와 ChatConsumer가 같은 키를 읽습니다)
+SESSION_KEY = 'anonymous_user_id'
+COUNTER_NAME = 'anonymous'
+
+
+def format_anonymous_id(number):
+    return f'익명{number}'
+
+
+def reserve_block(name, size):
+    """카운터를 size만큼 올리고 예약한 번호 범위 (처음, 끝)을 반환합니다.
+
+    UPDATE가 행을 잠그므로 여러 워커가 동시에 예약해도 범위가 겹치지 않습니다.
+    """
+    with transaction.atomic():
+        if not Counter.objects.filter(name=name).update(value=F('value') + size):
+            Counter.objects.get_or_create(name=name)
+            Counter.objects.filter(name=name).update(value=F('value') + size)
+        end = Counter.objects.filter(name=name).values_list('value', flat=True).get()
+    return end - size + 1, end
+
+
+class AnonymousIdAllocator:
+    """익명 ID 번호를 발급하는 allocator (hi/lo 방식)
+
+    데이터베이스 카운터에서 block_size개씩 번호를 예약해 두고 프로세스 안에서 나눠 주므로
+    데이터베이스 쓰기는 block_size번 발급에 한 번뿐입니다. 번호는 워커 사이에서도 겹치지 않지만,
+    워커마다 다른 블록을 사용하고 재시작하면 남은 번호를 버리므로 연속되지는 않습니다.
+    """
+
+    def __init__(self, block_size=100, counter=COUNTER_NAME):
+        self.block_size = block_size
+        self.counter = counter
+        self.blocks = 0  # 예약한 블록 수 (벤치마크와 테스트용)
+        self._next, self._end = 1, 0
+        # _lock은 번호를 꺼낼 때만 잠깐 잡고, 블록을 예약하는 동안(데이터베이스 쓰기)은 _refill_lock만 잡습니다.
+        # 그래서 이벤트 루프에서 번호를 꺼내는 aallocate()는 블록 예약을 기다리지 않습니다.
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+
+    def _take(self):
+        # 남은 번호가 있으면 하나 꺼내고, 없으면 None을 반환합니다.
+        with self._lock:
+            if self._next > self._end:
+                return None
+            number = self._next
+            self._next += 1
+            return number
+
+    def allocate(self):
+        while True:
+            number = self._take()
+            if number is not None:
+                return number
+            with self._refill_lock:
+                # 기다리는 동안 다른 스레드가 이미 새 블록을 예약했을 수 있습니다.
+                with self._lock:
+                    if self._next <= self._end:
+                        continue
+                start, end = reserve_block(self.counter, self.block_size)
+                with self._lock:
+                    self._next, self._end = start, end
+                    self.blocks += 1
+
+    async def aallocate(self):
+        # 남은 번호가 있으면 스레드로 넘기지 않고 바로 발급합니다.
+        number = self._take()
+        if number is None:
+            number = await sync_to_async(self.allocate)()
+        return number
+
+
+@functools.cache
+def get_anonymous_id_allocator():
+    """설정(CHAT_ANONYMOUS_IDS)에 따라 만든 프로세스 공용 allocator를 반환합니다."""
+    config = getattr(settings, 'CHAT_ANONYMOUS_IDS', {})
+    return AnonymousIdAllocator(block_size=config.get('BLOCK_SIZE', 100))
+
+
+@receiver(setting_changed)
+def reset_anonymous_id_allocator(*, setting, **kwargs):
+    if setting == 'CHAT_ANONYMOUS_IDS':
+        get_anonymous_id_allocator.cache_clear()
+
+
+async def aget_anonymous_id(session, save=False):
+    """세션의 익명 ID를 반환합니다. 처음이면 새 번호를 발급해 세션에 저장합니다.
+
+    HTTP 뷰는 응답할 때 SessionMiddleware가 세션을 저장하지만, WebSocket에서는 save=True로 직접 저장합니다.
+    """
+    anonymous_id = await session.aget(SESSION_KEY)
+    if anonymous_id is None:
+        anonymous_id = format_anonymous_id(await get_anonymous_id_allocator().aallocate())
+        await session.aset(SESSION_KEY, anonymous_id)
+        if save:
+            await session.asave()
+    return anonymous_id
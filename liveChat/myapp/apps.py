@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "myapp"
+
+    def ready(self):
+        # 채팅방을 만들 때 요약을 만드는 시그널 등록
+        from . import summary  # noqa: F401
+        # 로그아웃, 세션 삭제 때 WebSocket 사용자 캐시를 지우는 시그널 등록
+        from . import handshake  # noqa: F401
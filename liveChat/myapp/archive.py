@@ -0,0 +1,142 @@
+import gzip
+import json
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatRoom, Message, MessageArchive
+from .utils.logging_helpers import log_info
+
+
+def get_archive_config():
+    return {'RETENTION_DAYS': 30, 'CHUNK_SIZE': 1000, **getattr(settings, 'CHAT_ARCHIVE', {})}
+
+
+def get_cutoff(days):
+    """days일 전 자정(TIME_ZONE 기준). 하루 단위로 보관하므로 이 시각보다 오래된 메시지를 보관합니다."""
+    day = timezone.localdate() - timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def encode_entries(entries):
+    """메시지 목록을 gzip으로 압축한 NDJSON으로 변환합니다."""
+    lines = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+    return gzip.compress(lines.encode('utf-8'))
+
+
+def decode_entries(data):
+    return [json.loads(line) for line in gzip.decompress(bytes(data)).decode('utf-8').splitlines()]
+
+
+def entry_key(entry):
+    return parse_datetime(entry['created_at']), entry['id']
+
+
+def archive_messages(days=None, chunk_size=None):
+    """보관 기간이 지난 메시지를 채팅방별, 날짜별 MessageArchive로 옮깁니다.
+
+    채팅방마다 오래된 메시지를 (created_at, id) 순서로 chunk_size개씩 읽어 날짜별로 모으고,
+    하루치를 보관한 뒤 원본 메시지를 chunk_size개씩 나누어 삭제합니다.
+    중간에 멈춰도 다시 실행하면 이미 보관한 메시지는 건너뛰므로 중복되지 않습니다.
+    (보관 메시지 수, 보관한 채팅방-날짜 수)를 반환합니다.
+    """
+    config = get_archive_config()
+    days = config['RETENTION_DAYS'] if days is None else days
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    cutoff = get_cutoff(days)
+    archived = room_days = 0
+
+    for chat_room_id in ChatRoom.objects.values_list('id', flat=True).iterator():
+        queryset = Message.objects.filter(chat_room_id=chat_room_id, created_at__lt=cutoff).order_by('created_at', 'id')
+        day, entries, last = None, [], None
+        while True:
+            chunk = queryset.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1])) if last else queryset
+            rows = list(chunk.values('id', 'seq', 'user_id', 'user__username', 'content', 'created_at')[:chunk_size])
+            for row in rows:
+                row_day = timezone.localdate(row['created_at'])
+                if row_day != day and entries:
+                    archived += archive_day(chat_room_id, day, entries, chunk_size)
+                    room_days += 1
+                    entries = []
+                day = row_day
+                entries.append({
+                    'id': row['id'],
+                    'seq': row['seq'],
+                    'user_id': row['user_id'],
+                    'username': row['user__username'],
+                    'content': row['content'],
+                    'created_at': row['created_at'].isoformat(),
+                })
+            if len(rows) < chunk_size:
+                break
+            last = rows[-1]['created_at'], rows[-1]['id']
+        if entries:
+            archived += archive_day(chat_room_id, day, entries, chunk_size)
+            room_days += 1
+
+    log_info("Archived %d messages into %d room-days (before %s)", archived, room_days, cutoff)
+    return archived, room_days
+
+
+def archive_day(chat_room_id, day, entries, chunk_size):
+    """하루치 메시지를 보관하고 원본을 삭제합니다. 같은 날짜의 보관 데이터가 있으면 합칩니다."""
+    with transaction.atomic():
+        archive = MessageArchive.objects.select_for_update().filter(chat_room_id=chat_room_id, day=day).first()
+        if archive is not None:
+            existing = decode_entries(archive.data)
+            archived_ids = {entry['id'] for entry in existing}
+            entries = sorted(existing + [entry for entry in entries if entry['id'] not in archived_ids], key=entry_key)
+        else:
+            archive = MessageArchive(chat_room_id=chat_room_id, day=day)
+        archive.data = encode_entries(entries)
+        archive.message_count = len(entries)
+        archive.last_seq = max((entry.get('seq') or 0 for entry in entries), default=0)
+        archive.first_created_at = parse_datetime(entries[0]['created_at'])
+        archive.last_created_at = parse_datetime(entries[-1]['created_at'])
+        archive.save()
+
+    # 긴 잠금을 피하기 위해 원본 메시지는 chunk_size개씩 따로 삭제합니다.
+    ids = [entry['id'] for entry in entries]
+    deleted = 0
+    for start in range(0, len(ids), chunk_size):
+        deleted += Message.objects.filter(id__in=ids[start:start + chunk_size]).delete()[0]
+    return deleted
+
+
+def to_message(chat_room_id, entry):
+    # 보관된 메시지를 저장되지 않은 Message로 변환합니다. (serialize_message에서 사용자 조회 쿼리가 나가지 않도록 user를 채웁니다)
+    user = User(id=entry['user_id'], username=entry['username']) if entry['user_id'] else None
+    return Message(
+        id=entry['id'],
+        seq=entry.get('seq'),
+        chat_room_id=chat_room_id,
+        user=user,
+        content=entry['content'],
+        created_at=parse_datetime(entry['created_at']),
+    )
+
+
+def get_archived_messages(chat_room_id, before=None, limit=50):
+    """before((created_at, id))보다 오래된 보관 메시지를 최신순으로 최대 limit개 가져옵니다."""
+    archives = MessageArchive.objects.filter(chat_room_id=chat_room_id).order_by('-day')
+    if before is not None:
+        archives = archives.filter(first_created_at__lte=before[0])
+    messages = []
+    for archive in archives.iterator(chunk_size=4):
+        for entry in reversed(decode_entries(archive.data)):
+            if before is not None and entry_key(entry) >= before:
+                continue
+            messages.append(to_message(chat_room_id, entry))
+            if len(messages) >= limit:
+                return messages
+    return messages
+
+
+async def aget_archived_messages(chat_room_id, before=None, limit=50):
+    return await sync_to_async(get_archived_messages)(chat_room_id, before, limit)
@@ -1,63 +1,312 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+import msgpack
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+from . import metrics
+from .anonymous import aget_anonymous_id
+from .announcements import JOINED, presence_announcer
+from .fanout import OutboundMessage, encode_batch, get_fanout
+from .history import SeqGap, aget_messages_after, decode_cursor, encode_cursor, format_timestamp, serialize_message
+from .message_buffer import write_buffer
+from .message_cache import get_recent_message_store
+from .models import ChatRoom, Message
+from .outbox import DROP_OLDEST, ConnectionOutbox
+from .presence import get_presence_registry
+from .ratelimit import acheck_message_rate
+from .read_state import read_mark_buffer
+from .sequence import get_sequence_allocator
+from .typing_indicator import get_typing_ttl, typing_throttle
+from .utils.logging_helpers import log_error
+from .summary import aupdate_online_count
+
+# 바이너리(MessagePack) 프레임을 주고받는 서브프로토콜. 요청하지 않으면 JSON 텍스트 프레임을 사용합니다.
+MSGPACK_SUBPROTOCOL = 'livechat.msgpack'
 
 class ChatConsumer(AsyncWebsocketConsumer):
     # WebSocket 연결 시 실행되는 함수
     async def connect(self):
+        # 연결 도중 실패해도 disconnect()가 한 일만 되돌리도록 먼저 초기화합니다.
+        self.outbox = None
+        self.presence_refresher = None
+        self.joined = False
+        self.registered = False
+        metrics.ensure_publisher()
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
+        # 메시지를 저장할 채팅방 (존재하지 않는 방이면 저장하지 않고 전달만 합니다)
+        self.chat_room_id = await self.get_chat_room_id()
+        # 접속자 레지스트리에 등록할 사용자 식별자 (로그인 사용자는 username, 익명 사용자는 익명 ID)
+        self.identity = await self.get_identity()
 
-        # 방 그룹에 참여
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        # 클라이언트가 MessagePack 서브프로토콜을 요청하면 바이너리 프레임을 사용합니다.
+        self.binary = MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        # ?last_seq=N으로 다시 연결하면 N 다음 메시지를 먼저 보냅니다. 그동안 받은 실시간 메시지는 모아 두었다가 보냅니다.
+        last_seq = query.get('last_seq', [''])[0]
+        self.resume_seq = int(last_seq) if last_seq.isdigit() and self.chat_room_id is not None else None
+        # 연결을 수락하기 전에 받은 실시간 메시지도 모아 두었다가 수락한 뒤에 보냅니다.
+        self.replaying = []
 
-        await self.accept()
-
-        # 입장 메시지 전송
-        username = self.scope["user"].username if self.scope["user"].is_authenticated else "Anonymous"
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': f'{username} joined the room.',
-                'username': username  # 추가
-            }
-        )
+        # ?coalesce=1로 연결하면 짧은 시간 동안 모은 메시지를 배열 프레임 하나로 보냅니다.
+        self.coalesce = query.get('coalesce') == ['1']
+        # 보낼 메시지는 연결마다 있는 크기 제한 큐에 넣고, writer 태스크가 순서대로 보냅니다.
+        self.outbox = self.create_outbox()
+        self.closing = False
+        # 방 그룹에 참여 (채널 레이어 그룹에는 프로세스마다 하나의 relay 채널만 참여합니다)
+        # 다시 보낼 메시지를 조회하기 전에 참여해야 그 사이에 보낸 메시지를 놓치지 않습니다.
+        # 참여하자마자 deliver()가 호출될 수 있으므로 outbox 등은 그 전에 만들어 둡니다.
+        await get_fanout().join(self.room_group_name, self)
+        self.joined = True
+        await self.accept(subprotocol=MSGPACK_SUBPROTOCOL if self.binary else None)
+
+        if self.resume_seq is not None:
+            await self.replay(self.resume_seq)
+        else:
+            held, self.replaying = self.replaying, None
+            for message in held:
+                await self.deliver(message)
+
+        # ?backlog=1로 연결하면 최근 메시지 캐시에 있는 메시지를 먼저 보냅니다. (데이터베이스는 조회하지 않습니다)
+        if query.get('backlog') == ['1'] and self.chat_room_id is not None:
+            cached = await get_recent_message_store().aget(self.chat_room_id)
+            for message in (cached[0] if cached else []):
+                await self.deliver(OutboundMessage({
+                    'content': message['content'],
+                    'username': message['username'],
+                    'created_at': message['created_at'],
+                    'cursor': message['cursor'],
+                    'seq': message.get('seq'),
+                }))
+
+        # 같은 사용자가 이미 다른 연결로 접속 중이면 입장 메시지를 보내지 않습니다.
+        if self.chat_room_id is not None:
+            registry = get_presence_registry()
+            first_connection = await registry.aconnect(self.chat_room_id, self.identity)
+            self.registered = True
+            if registry.refresh_interval:
+                self.presence_refresher = asyncio.create_task(self.refresh_presence(registry))
+            if first_connection:
+                await aupdate_online_count(self.chat_room_id)
+            # 재연결(last_seq)은 이미 입장한 사용자이므로 입장 메시지를 다시 보내지 않습니다.
+            if not first_connection or self.resume_seq is not None:
+                return
+
+        # 입장 메시지 전송 (한꺼번에 들어온 사용자는 announcer가 모아서 하나로 보냅니다)
+        username = self.scope["user"].username if self.scope["user"].is_authenticated else self.identity
+        await presence_announcer.announce(self.room_group_name, self.chat_room_id, JOINED, username)
 
     # WebSocket 연결 종료 시 실행되는 함수
     async def disconnect(self, close_code):
         # 방 그룹에서 나가기
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if self.joined:
+            await get_fanout().leave(self.room_group_name, self)
+        if self.outbox is not None:
+            self.outbox.close()
+        if self.presence_refresher is not None:
+            self.presence_refresher.cancel()
+        if self.registered:
+            if await get_presence_registry().adisconnect(self.chat_room_id, self.identity):
+                await aupdate_online_count(self.chat_room_id)
+        # 버퍼에 남아 있는 메시지와 읽음 위치를 저장
+        await write_buffer.flush()
+        await read_mark_buffer.flush()
+
+    # 연결이 살아 있는 동안 접속자 레지스트리의 만료 시간을 주기적으로 갱신하는 함수
+    async def refresh_presence(self, registry):
+        while True:
+            await asyncio.sleep(registry.refresh_interval)
+            try:
+                await registry.arefresh(self.chat_room_id, self.identity)
+            except Exception as e:
+                log_error("Error refreshing presence of %s in room %s: %s", self.identity, self.chat_room_id, e)
 
     # 클라이언트로부터 메시지를 수신할 때 실행되는 함수
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-
-        # 방 그룹에 메시지 전송
-        username = self.scope["user"].username if self.scope["user"].is_authenticated else "Anonymous"
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': f'{username}: {message}',
-                'username': username  # 추가
-            }
+    async def receive(self, text_data=None, bytes_data=None):
+        data = msgpack.unpackb(bytes_data) if bytes_data is not None else json.loads(text_data)
+        # {"type": "ack", "cursor": ...}: 클라이언트가 보여준 마지막 메시지까지 읽었다는 알림
+        if data.get('type') == 'ack':
+            await self.ack(data.get('cursor'))
+            return
+        # {"type": "typing"}: 입력 중 표시. 저장하지 않고 방에만 보냅니다.
+        if data.get('type') == 'typing':
+            await self.send_typing()
+            return
+        message = data['message']
+        metrics.MESSAGES_RECEIVED.inc()
+
+        # 전송 한도를 넘은 메시지는 방에 전달하지 않고 보낸 사람에게만 오류를 알립니다.
+        retry_after = await acheck_message_rate(self.get_sender_key(), self.room_name)
+        if retry_after:
+            await self.deliver(OutboundMessage({
+                'type': 'error',
+                'code': 'rate_limited',
+                'retry_after': round(retry_after, 3),
+            }))
+            return
+
+        user = self.scope["user"]
+        username = user.username if user.is_authenticated else self.identity
+        content = f'{username}: {message}'
+        typing_throttle.reset(self.room_group_name, self.identity)
+        created_at = timezone.now()
+        seq = None
+
+        # 메시지는 write-behind 버퍼에 모아서 한 번에 저장하고, 최근 메시지 캐시에는 바로 추가
+        if self.chat_room_id is not None and message.strip():
+            seq = await get_sequence_allocator().aallocate(self.chat_room_id)
+            pending = Message(
+                user_id=user.pk if user.is_authenticated else None,
+                chat_room_id=self.chat_room_id,
+                content=content,
+                created_at=created_at,
+                seq=seq,
+            )
+            await write_buffer.add(pending)
+            await get_recent_message_store().aappend(self.chat_room_id, serialize_message(pending, username=username))
+
+        # 방 그룹에 메시지 전송 (JSON 직렬화는 메시지당 한 번만 합니다)
+        await get_fanout().publish(self.room_group_name, {
+            'content': content,
+            'username': username,
+            'created_at': format_timestamp(created_at),
+            # ack에 사용할 위치 (아직 저장 전이라 id가 없으므로 created_at만 담깁니다)
+            'cursor': encode_cursor(created_at, None),
+            'seq': seq,
+        })
+
+    # 읽음 위치를 앞으로 옮기는 함수 (저장은 버퍼가 모아서 합니다)
+    async def ack(self, cursor):
+        user = self.scope['user']
+        if not user.is_authenticated or self.chat_room_id is None or not isinstance(cursor, str):
+            return
+        try:
+            read_at, _ = decode_cursor(cursor)
+        except ValueError:
+            return
+        # 미래 시각으로 읽음 위치를 앞당기지 못하도록 현재 시각으로 제한합니다.
+        await read_mark_buffer.mark(user.pk, self.chat_room_id, min(read_at, timezone.now()))
+
+    # 입력 중 표시를 방에 보내는 함수 (사용자마다 INTERVAL에 한 번, 낮은 우선순위)
+    async def send_typing(self):
+        if not typing_throttle.allow(self.room_group_name, self.identity):
+            return
+        user = self.scope['user']
+        # 클라이언트는 expires_in초 동안 새 이벤트가 없으면 표시를 지웁니다.
+        await get_fanout().publish(self.room_group_name, {
+            'type': 'typing',
+            'username': user.username if user.is_authenticated else self.identity,
+            'expires_in': get_typing_ttl(),
+        }, low_priority=True)
+
+    # 재연결한 클라이언트에 놓친 메시지를 seq 순서로 보낸 뒤 실시간 전달로 전환하는 함수
+    async def replay(self, last_seq):
+        limit = getattr(settings, 'CHAT_SEQUENCE', {}).get('MAX_REPLAY', 500)
+        # 이 프로세스의 쓰기 버퍼에 남은 메시지도 데이터베이스에서 찾을 수 있도록 먼저 저장합니다.
+        await write_buffer.flush()
+        try:
+            missed = await aget_messages_after(self.chat_room_id, last_seq, limit)
+        except SeqGap:
+            # 다른 워커의 쓰기 버퍼에 있는 메시지는 한 번 저장될 시간만큼 기다렸다가 다시 조회합니다.
+            await asyncio.sleep(write_buffer.flush_interval)
+            await write_buffer.flush()
+            try:
+                missed = await aget_messages_after(self.chat_room_id, last_seq, limit)
+            except SeqGap:
+                # 그래도 빠진 seq가 있으면 건너뛰지 않도록 기록 전체를 다시 불러오게 합니다.
+                missed = None
+        live, self.replaying = self.replaying, None
+        if missed is None:
+            # 놓친 메시지가 너무 많거나 끊긴 seq가 있으면 기록 전체를 다시 불러오도록 알립니다.
+            await self.deliver(OutboundMessage({'type': 'reset'}))
+            return
+        for message in missed:
+            await self.deliver(OutboundMessage({
+                'content': message['content'],
+                'username': message['username'],
+                'created_at': message['created_at'],
+                'cursor': message['cursor'],
+                'seq': message['seq'],
+            }))
+            last_seq = message['seq']
+        # 조회하는 동안 받은 실시간 메시지 중 이미 보낸 seq는 건너뜁니다.
+        for message in live:
+            seq = message.payload.get('seq')
+            if seq is None or seq > last_seq:
+                await self.deliver(message)
+
+    # 방 그룹의 메시지를 이 연결로 보내는 함수 (RoomFanout이 호출합니다)
+    async def deliver(self, message):
+        if self.closing:
+            return
+        if self.replaying is not None:
+            # 다시 보내기가 끝난 뒤에는 이미 지난 입력 중 표시이므로 모아 두지 않습니다.
+            if not message.low_priority:
+                self.replaying.append(message)
+            return
+        if not self.outbox.put(message):
+            # 큐가 가득 찬 느린 클라이언트는 연결을 끊습니다. (policy: disconnect)
+            self.closing = True
+            await self.close(code=getattr(settings, 'CHAT_SEND_QUEUE', {}).get('CLOSE_CODE', 4008))
+
+    # writer 태스크가 큐에서 꺼낸 메시지를 소켓으로 보내는 함수
+    async def send_frames(self, messages):
+        if self.coalesce:
+            if self.binary:
+                await self.send(bytes_data=encode_batch(messages, binary=True))
+            else:
+                await self.send(text_data=encode_batch(messages))
+            return
+        for message in messages:
+            if self.binary:
+                await self.send(bytes_data=message.binary)
+            else:
+                await self.send(text_data=message.text)
+
+    def create_outbox(self):
+        config = getattr(settings, 'CHAT_SEND_QUEUE', {})
+        coalesce = getattr(settings, 'CHAT_COALESCE', {})
+        return ConnectionOutbox(
+            self.send_frames,
+            max_size=config.get('MAX_SIZE', 256),
+            policy=config.get('POLICY', DROP_OLDEST),
+            window=coalesce.get('WINDOW', 0.025) if self.coalesce else 0,
+            max_batch=coalesce.get('MAX_BATCH', 50) if self.coalesce else 64,
+            name=self.channel_name,
         )
 
-    # 방 그룹에서 메시지를 수신할 때 실행되는 함수
+    # 채널 레이어로 이 연결에 직접 보낸 메시지를 수신할 때 실행되는 함수
     async def chat_message(self, event):
-        message = event['message']
-        username = event.get('username', 'Anonymous')  # 추가
-
-        # WebSocket으로 메시지 전송
-        await self.send(text_data=json.dumps({
-            'content': message,
-            'username': username  # 추가
-        }))
\ No newline at end of file
+        await self.deliver(OutboundMessage({
+            'content': event['message'],
+            'username': event.get('username', 'Anonymous'),
+            'created_at': event.get('created_at'),
+        }))
+
+    def get_sender_key(self):
+        # rate limit 버킷 키 (로그인 사용자는 사용자별, 익명 사용자는 세션별, 세션이 없으면 연결별)
+        user = self.scope['user']
+        if user.is_authenticated:
+            return f'user:{user.pk}'
+        session = self.scope.get('session')
+        return f'anonymous:{(session.session_key if session is not None else None) or self.channel_name}'
+
+    async def get_identity(self):
+        user = self.scope['user']
+        if user.is_authenticated:
+            return user.username
+        # HTTP 뷰와 같은 세션의 익명 ID를 사용합니다. (세션이 있는데 ID가 없으면 발급해서 저장)
+        # 세션 쿠키 없이 연결하면 번호를 발급해도 다시 연결할 때 유지할 수 없으므로 'Anonymous'를 사용합니다.
+        session = self.scope.get('session')
+        if session is None or not session.session_key:
+            return 'Anonymous'
+        return await aget_anonymous_id(session, save=True)
+
+    @database_sync_to_async
+    def get_chat_room_id(self):
+        if not self.room_name.isdigit():
+            return None
+        return ChatRoom.objects.filter(id=self.room_name).values_list('id', flat=True).first()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import uuid
+import weakref
+
+import msgpack
+from channels.layers import get_channel_layer
+
+from . import metrics
+from .utils.logging_helpers import log_error
+
+# 채널 레이어로 받은 이벤트가 이 프로세스에서 보낸 것인지 구분하기 위한 ID
+PROCESS_ID = uuid.uuid4().hex
+
+
+class OutboundMessage:
+    """여러 소켓에 보낼 메시지. 인코딩(JSON, MessagePack)마다 처음 필요할 때 한 번만 직렬화합니다.
+
+    low_priority인 메시지(입력 중 표시 등)는 송신 큐가 가득 차면 다른 메시지보다 먼저 버립니다.
+    """
+
+    __slots__ = ('payload', 'low_priority', '_text', '_binary')
+
+    def __init__(self, payload, low_priority=False):
+        self.payload = payload
+        self.low_priority = low_priority
+        self._text = None
+        self._binary = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = json.dumps(self.payload)
+        return self._text
+
+    @property
+    def binary(self):
+        if self._binary is None:
+            self._binary = msgpack.packb(self.payload)
+        return self._binary
+
+
+def encode_batch(messages, binary=False):
+    """여러 메시지를 배열 프레임 하나로 만듭니다. 메시지마다 이미 직렬화된 결과를 이어 붙이기만 합니다."""
+    if binary:
+        return msgpack.Packer().pack_array_header(len(messages)) + b''.join(message.binary for message in messages)
+    return '[' + ','.join(message.text for message in messages) + ']'
+
+
+class RoomFanout:
+    """프로세스 안의 채팅방별 연결 레지스트리
+
+    같은 프로세스에 연결된 소켓에는 채널 레이어를 거치지 않고 바로 보냅니다.
+    채널 레이어 그룹에는 소켓마다가 아니라 프로세스마다 relay 채널 하나만 참여하므로,
+    Redis는 다른 프로세스로 전달할 때만 사용되고 한 메시지를 프로세스 수만큼만 전달합니다.
+    """
+
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+        self.rooms = {}  # group -> set of consumers
+        self.relay_channel = None
+        self._reader = None
+
+    def connection_count(self, group):
+        return len(self.rooms.get(group, ()))
+
+    def connection_stats(self):
+        """이 프로세스의 연결별 송신 큐 길이와 버린 메시지 수를 반환합니다."""
+        return [
+            {'group': group, 'channel_name': consumer.channel_name, **consumer.outbox.stats()}
+            for group, connections in self.rooms.items()
+            for consumer in connections
+        ]
+
+    async def join(self, group, consumer):
+        connections = self.rooms.setdefault(group, set())
+        connections.add(consumer)
+        if self.relay_channel is None:
+            self.relay_channel = await self.channel_layer.new_channel('fanout')
+            self._reader = asyncio.get_running_loop().create_task(self._read_relay())
+        # 연결될 때마다 group_add를 호출해 그룹 만료 시간(group_expiry)도 갱신합니다.
+        await self.channel_layer.group_add(group, self.relay_channel)
+
+    async def leave(self, group, consumer):
+        connections = self.rooms.get(group)
+        if connections is None:
+            return
+        connections.discard(consumer)
+        if connections:
+            return
+        del self.rooms[group]
+        await self.channel_layer.group_discard(group, self.relay_channel)
+        # 연결된 방이 하나도 없으면 relay도 멈춥니다.
+        if not self.rooms and self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+            self.relay_channel = None
+
+    async def publish(self, group, payload, low_priority=False):
+        """방의 모든 연결(이 프로세스와 다른 프로세스)에 메시지를 보냅니다."""
+        await self.deliver_local(group, OutboundMessage(payload, low_priority))
+        try:
+            with metrics.GROUP_SEND_SECONDS.time():
+                await self.channel_layer.group_send(group, {
+                    'type': 'chat.fanout',
+                    'origin': PROCESS_ID,
+                    'group': group,
+                    'payload': payload,
+                    'low_priority': low_priority,
+                })
+        except Exception as e:
+            # 이 프로세스의 연결에는 이미 전달했으므로 오류만 기록합니다.
+            metrics.CHANNEL_LAYER_ERRORS.inc(operation='group_send')
+            log_error("Error in group_send to %s: %s", group, e)
+
+    async def deliver_local(self, group, message):
+        """이 프로세스에 연결된 방의 소켓에 메시지를 보냅니다."""
+        connections = list(self.rooms.get(group, ()))
+        metrics.MESSAGES_FANNED_OUT.inc(len(connections))
+        for consumer in connections:
+            try:
+                await consumer.deliver(message)
+            except Exception as e:
+                # 한 연결의 오류가 다른 연결로 보내는 것을 막지 않도록 합니다.
+                log_error("Error delivering to %s: %s", consumer.channel_name, e)
+
+    async def _read_relay(self):
+        channel = self.relay_channel
+        while True:
+            try:
+                event = await self.channel_layer.receive(channel)
+            except Exception as e:
+                metrics.CHANNEL_LAYER_ERRORS.inc(operation='receive')
+                log_error("Error receiving from %s: %s", channel, e)
+                # 채널 레이어(Redis 등)가 복구될 때까지 잠시 기다렸다가 다시 시도합니다.
+                await asyncio.sleep(1)
+                continue
+            try:
+                await self._dispatch(event)
+            except Exception as e:
+                log_error("Error in fanout relay: %s", e)
+
+    async def _dispatch(self, event):
+        if event['type'] == 'chat.fanout':
+            # 이 프로세스에서 보낸 메시지는 이미 전달했습니다.
+            if event['origin'] != PROCESS_ID:
+                await self.deliver_local(event['group'], OutboundMessage(event['payload'], event.get('low_priority', False)))
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_fanout():
+    """현재 이벤트 루프의 RoomFanout을 반환합니다."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = RoomFanout(get_channel_layer())
+    return hub
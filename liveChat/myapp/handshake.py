@@ -0,0 +1,173 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from channels.auth import AuthMiddleware, get_user
+from channels.sessions import CookieMiddleware, SessionMiddleware
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'myapp.handshake.LocalHandshakeCache'
+
+
+class BaseHandshakeCache:
+    """WebSocket 연결 때 세션 키로 찾은 사용자를 잠시 보관하는 캐시의 기본 클래스
+
+    재연결이 몰려도 연결마다 세션 테이블과 사용자 테이블을 조회하지 않도록 합니다.
+    로그아웃하거나 세션 키가 바뀌면(로그인, 비밀번호 변경) 해당 세션 키를 지웁니다.
+    다른 워커의 로컬 캐시나 비밀번호 변경으로 무효가 된 다른 세션은 timeout이 지나야 반영되므로 timeout을 짧게 둡니다.
+    """
+
+    def get(self, session_key):
+        """보관된 사용자를 반환합니다. 없거나 만료되었으면 None을 반환합니다."""
+        raise NotImplementedError
+
+    def set(self, session_key, user):
+        raise NotImplementedError
+
+    def discard(self, session_key):
+        raise NotImplementedError
+
+    async def aget(self, session_key):
+        return self.get(session_key)
+
+    async def aset(self, session_key, user):
+        self.set(session_key, user)
+
+
+class LocalHandshakeCache(BaseHandshakeCache):
+    """프로세스 메모리에 보관하는 캐시 (TTL과 최대 개수가 있는 LRU)"""
+
+    def __init__(self, timeout=30, max_entries=10000):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # session_key -> (만료 시각, 사용자)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, session_key):
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[session_key]
+                return None
+            self._entries.move_to_end(session_key)
+            return entry[1]
+
+    def set(self, session_key, user):
+        with self._lock:
+            self._entries[session_key] = (time.monotonic() + self.timeout, user)
+            self._entries.move_to_end(session_key)
+            # 가장 오래 사용되지 않은 항목부터 버립니다.
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+
+class DjangoCacheHandshakeCache(BaseHandshakeCache):
+    """Django 캐시(Redis 등)에 보관하는 캐시 (여러 워커가 공유)
+
+    배포 직후 새 워커로 재연결이 몰려도 데이터베이스 대신 캐시에서 사용자를 찾고,
+    로그아웃하면 모든 워커에서 바로 무효가 됩니다.
+    """
+
+    def __init__(self, cache_alias='default', timeout=30, key_prefix='handshake'):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, session_key):
+        return f'{self.key_prefix}:{session_key}'
+
+    def get(self, session_key):
+        return self.cache.get(self.make_key(session_key))
+
+    def set(self, session_key, user):
+        self.cache.set(self.make_key(session_key), user, self.timeout)
+
+    def discard(self, session_key):
+        self.cache.delete(self.make_key(session_key))
+
+    async def aget(self, session_key):
+        return await sync_to_async(self.get)(session_key)
+
+    async def aset(self, session_key, user):
+        await sync_to_async(self.set)(session_key, user)
+
+
+@functools.cache
+def get_handshake_cache():
+    """설정(CHAT_HANDSHAKE_CACHE)에 지정된 캐시를 반환합니다. 설정이 없으면 None (캐시하지 않음)"""
+    config = getattr(settings, 'CHAT_HANDSHAKE_CACHE', None)
+    if not config:
+        return None
+    backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_handshake_cache(*, setting, **kwargs):
+    # 테스트에서 override_settings로 설정을 바꾸면 캐시를 다시 만듭니다.
+    if setting == 'CHAT_HANDSHAKE_CACHE':
+        get_handshake_cache.cache_clear()
+
+
+@receiver(post_delete, sender=Session)
+def discard_deleted_session(sender, instance, **kwargs):
+    # 세션이 삭제되면(로그아웃 flush, 로그인과 비밀번호 변경의 cycle_key, 만료 정리) 캐시에서도 지웁니다.
+    cache = get_handshake_cache()
+    if cache is not None:
+        cache.discard(instance.session_key)
+
+
+@receiver(user_logged_out)
+def discard_logged_out_session(sender, request, **kwargs):
+    # 데이터베이스가 아닌 세션 엔진도 로그아웃하면 바로 무효가 되도록 세션 키를 지웁니다.
+    cache = get_handshake_cache()
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if cache is not None and session_key:
+        cache.discard(session_key)
+
+
+class CachedAuthMiddleware(AuthMiddleware):
+    """세션 키로 찾은 사용자를 캐시하는 Channels AuthMiddleware
+
+    캐시에 있으면 세션과 사용자를 조회하지 않습니다. (익명 사용자의 세션 데이터는 ChatConsumer가 필요할 때 읽습니다)
+    """
+
+    async def resolve_scope(self, scope):
+        cache = get_handshake_cache()
+        session_key = scope['session'].session_key
+        if cache is None or not session_key:
+            scope['user']._wrapped = await get_user(scope)
+            return
+        user = await cache.aget(session_key)
+        if user is None:
+            user = await get_user(scope)
+            # 세션 검증에 실패하면 get_user가 세션을 비우므로, 그때는 키가 바뀌어 캐시하지 않습니다.
+            if scope['session'].session_key == session_key:
+                await cache.aset(session_key, user)
+        scope['user']._wrapped = user
+
+
+def CachedAuthMiddlewareStack(inner):
+    return CookieMiddleware(SessionMiddleware(CachedAuthMiddleware(inner)))
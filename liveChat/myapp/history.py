@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .archive import aget_archived_messages, get_archived_messages
+from .message_cache import get_recent_message_store
+from .models import Message
+from .sequence import get_sequence_allocator
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_page_size(limit=None):
+    """요청한 페이지 크기를 설정된 범위 안으로 맞춥니다."""
+    config = getattr(settings, 'CHAT_HISTORY', {})
+    if limit is None:
+        return config.get('PAGE_SIZE', 50)
+    return max(1, min(int(limit), config.get('MAX_PAGE_SIZE', 200)))
+
+
+def encode_cursor(created_at, message_id):
+    """메시지의 (created_at, id)를 커서 문자열로 변환합니다.
+
+    아직 저장되지 않은 메시지(id가 없는 메시지)는 id 0을 사용하므로
+    created_at보다 오래된 메시지만 가리킵니다.
+    """
+    delta = created_at - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f'{microseconds}-{message_id or 0}'
+
+
+def decode_cursor(cursor):
+    """커서 문자열을 (created_at, id)로 변환합니다. 형식이 잘못되면 ValueError를 발생시킵니다."""
+    microseconds, message_id = cursor.split('-')
+    return EPOCH + timedelta(microseconds=int(microseconds)), int(message_id)
+
+
+def get_message_page(chat_room, before=None, limit=None):
+    """before 커서보다 오래된 메시지를 최대 limit개 가져옵니다.
+
+    (chat_room_id, created_at, id) 인덱스를 역순으로 읽기 때문에 기록이 아무리 길어도
+    페이지를 가져오는 비용은 일정합니다. 메시지는 오래된 순으로 정렬해서 반환하고,
+    더 오래된 메시지가 있으면 다음 페이지 커서를 함께 반환합니다.
+    """
+    limit = limit or get_page_size()
+    page = list(page_queryset(chat_room, before, limit))
+    # 최근 메시지 테이블에 더 오래된 메시지가 없으면 보관된 메시지(MessageArchive)에서 이어서 가져옵니다.
+    if len(page) <= limit:
+        page += get_archived_messages(chat_room.id, archive_before(page, before), limit + 1 - len(page))
+    return finish_page(page, limit)
+
+
+async def aget_message_page(chat_room, before=None, limit=None):
+    """get_message_page의 async 버전 (async ORM으로 조회합니다)"""
+    limit = limit or get_page_size()
+    page = [message async for message in page_queryset(chat_room, before, limit)]
+    if len(page) <= limit:
+        page += await aget_archived_messages(chat_room.id, archive_before(page, before), limit + 1 - len(page))
+    return finish_page(page, limit)
+
+
+def archive_before(page, before):
+    # 보관된 메시지는 이 (created_at, id)보다 오래된 것부터 가져옵니다.
+    if page:
+        return page[-1].created_at, page[-1].id
+    return decode_cursor(before) if before else None
+
+
+def page_queryset(chat_room, before, limit):
+    # 다음 페이지가 있는지 알기 위해 limit보다 하나 더 가져옵니다.
+    queryset = Message.objects.filter(chat_room=chat_room).select_related('user')
+    if before:
+        created_at, message_id = decode_cursor(before)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id))
+    return queryset.order_by('-created_at', '-id')[:limit + 1]
+
+
+def finish_page(page, limit):
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    next_cursor = encode_cursor(page[0].created_at, page[0].id) if has_more else None
+    return page, next_cursor
+
+
+def get_recent_messages(chat_room):
+    """채팅방의 최근 메시지 한 페이지를 직렬화된 형태로 가져옵니다.
+
+    최근 메시지 캐시에 있는 방이면 데이터베이스를 조회하지 않습니다.
+    캐시에 없는 방이면 데이터베이스에서 가져와 캐시를 채웁니다.
+    쓰기 버퍼에 아직 저장되지 않은 메시지가 있는 방은 캐시를 채우지 않습니다.
+    (버퍼는 이벤트 루프의 것이므로 여기서 비울 수 없고, 빠진 메시지가 캐시에 고정되기 때문입니다)
+    """
+    from .message_buffer import write_buffer
+
+    store = get_recent_message_store()
+    cached = store.get(chat_room.id)
+    if cached is None:
+        page, next_cursor = get_message_page(chat_room, limit=store.room_capacity)
+        cached = [serialize_message(message) for message in page], next_cursor is not None
+        if not write_buffer.has_pending(chat_room.id):
+            store.prime(chat_room.id, *cached)
+    return recent_page(*cached)
+
+
+async def aget_recent_messages(chat_room):
+    """get_recent_messages의 async 버전
+
+    캐시를 채우기 전에 쓰기 버퍼를 비워 아직 저장되지 않은 메시지가 빠지지 않게 합니다.
+    """
+    from .message_buffer import write_buffer
+
+    store = get_recent_message_store()
+    cached = await store.aget(chat_room.id)
+    if cached is None:
+        await write_buffer.flush()
+        page, next_cursor = await aget_message_page(chat_room, limit=store.room_capacity)
+        cached = [serialize_message(message) for message in page], next_cursor is not None
+        await store.aprime(chat_room.id, *cached)
+    return recent_page(*cached)
+
+
+def recent_page(messages, has_older):
+    # 캐시된 메시지 중 마지막 한 페이지만 반환합니다.
+    page_size = get_page_size()
+    has_older = has_older or len(messages) > page_size
+    messages = messages[-page_size:]
+    next_cursor = messages[0]['cursor'] if messages and has_older else None
+    return messages, next_cursor
+
+
+def serialize_message(message, username=None):
+    """메시지를 JSON 응답 및 최근 메시지 캐시용 dict로 변환합니다."""
+    if username is None:
+        username = message.user.username if message.user else 'Anonymous'
+    return {
+        'id': message.id,
+        'seq': message.seq,
+        'username': username,
+        'content': message.content,
+        'created_at': format_timestamp(message.created_at),
+        'cursor': encode_cursor(message.created_at, message.id),
+    }
+
+
+class SeqGap(Exception):
+    """seq 범위 중 일부 메시지를 아직 찾을 수 없을 때 발생하는 예외 (다른 워커의 쓰기 버퍼에 있거나 저장에 실패한 메시지)"""
+
+
+def is_contiguous(messages, after_seq, until_seq):
+    """메시지의 seq가 after_seq 다음부터 until_seq까지 끊김 없이 이어지는지 확인합니다."""
+    return [message['seq'] for message in messages] == list(range(after_seq + 1, until_seq + 1))
+
+
+def get_messages_after(chat_room_id, after_seq, limit):
+    """after_seq 다음 메시지를 seq 순서로 직렬화해서 가져옵니다. (재연결한 클라이언트에 다시 보낼 메시지)
+
+    최근 메시지 캐시에 빠짐없이 있으면 데이터베이스를 조회하지 않고, 아니면 (chat_room_id, seq) 인덱스로 범위만 읽습니다.
+    놓친 메시지가 limit개보다 많으면 None을 반환합니다. (클라이언트가 새로 고치는 편이 더 쌉니다)
+    발급된 seq 중 아직 저장되지 않은 메시지가 있어 seq가 끊기면 SeqGap을 발생시킵니다.
+    """
+    current = get_sequence_allocator().current(chat_room_id)
+    if current <= after_seq:
+        return []
+    if current - after_seq > limit:
+        return None
+    messages = get_messages_between(chat_room_id, after_seq, current)
+    if not is_contiguous(messages, after_seq, current):
+        raise SeqGap(chat_room_id, after_seq, current)
+    return messages
+
+
+async def aget_messages_after(chat_room_id, after_seq, limit):
+    return await sync_to_async(get_messages_after)(chat_room_id, after_seq, limit)
+
+
+def get_messages_between(chat_room_id, after_seq, until_seq):
+    """after_seq < seq <= until_seq인 메시지를 seq 순서로 직렬화해서 가져옵니다.
+
+    최근 메시지 캐시에 빠짐없이 있으면 데이터베이스를 조회하지 않고, 아니면 (chat_room_id, seq) 인덱스로 범위만 읽습니다.
+    """
+    cached = get_recent_message_store().get(chat_room_id)
+    if cached is not None:
+        messages = sorted(
+            (message for message in cached[0] if after_seq < (message.get('seq') or 0) <= until_seq),
+            key=lambda message: message['seq'],
+        )
+        # 캐시에는 다른 워커가 받은 메시지가 빠져 있을 수 있으므로 seq가 끊김 없이 이어질 때만 사용합니다.
+        if is_contiguous(messages, after_seq, until_seq):
+            return messages
+
+    queryset = Message.objects.filter(chat_room_id=chat_room_id, seq__gt=after_seq, seq__lte=until_seq)
+    return [serialize_message(message) for message in queryset.select_related('user').order_by('seq')]
+
+
+async def aget_messages_between(chat_room_id, after_seq, until_seq):
+    return await sync_to_async(get_messages_between)(chat_room_id, after_seq, until_seq)
+
+
+def format_timestamp(value):
+    """템플릿과 같은 형식(Y-m-d H:i:s)으로 시각을 문자열로 변환합니다."""
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
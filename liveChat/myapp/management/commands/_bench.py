@@ -0,0 +1,33 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """벤치마크용 임시 테스트 데이터베이스를 만들고, 끝나면 삭제합니다.
+
+    운영 데이터베이스에는 아무것도 쓰지 않습니다.
+    SQLite는 메모리 데이터베이스 대신 임시 파일을 사용합니다. 메모리 데이터베이스(shared cache)는
+    여러 스레드가 동시에 쓰면 기다리지 않고 바로 "table is locked" 오류를 냅니다.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite' and not old_test_name:
+        test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        test_settings['NAME'] = old_test_name
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from myapp.archive import archive_messages, get_archive_config, get_cutoff
+from myapp.models import Message
+
+
+class Command(BaseCommand):
+    help = (
+        "보관 기간(CHAT_ARCHIVE['RETENTION_DAYS'])이 지난 메시지를 채팅방별, 날짜별 압축 보관 데이터(MessageArchive)로 "
+        "옮기고 메시지 테이블에서 삭제합니다. cron 등으로 하루에 한 번 실행합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="이 일수보다 오래된 메시지를 보관합니다 (기본값: RETENTION_DAYS)")
+        parser.add_argument('--chunk-size', type=int, help="한 번에 읽고 삭제할 메시지 수 (기본값: CHUNK_SIZE)")
+        parser.add_argument('--dry-run', action='store_true', help="보관할 메시지 수만 출력합니다")
+
+    def handle(self, *args, **options):
+        days = get_archive_config()['RETENTION_DAYS'] if options['days'] is None else options['days']
+        if options['dry_run']:
+            count = Message.objects.filter(created_at__lt=get_cutoff(days)).count()
+            self.stdout.write(f"{count} messages older than {days} days would be archived.")
+            return
+        archived, room_days = archive_messages(days=days, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} messages into {room_days} room-days."))
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from myapp.anonymous import AnonymousIdAllocator
+from ._bench import isolated_database, percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "여러 워커(allocator)와 스레드가 동시에 익명 ID를 발급할 때 중복 여부, 초당 발급 수, "
+        "발급 지연 시간을 측정합니다. 블록 크기 1(발급마다 카운터 UPDATE)과 비교합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="동시에 발급하는 워커(allocator) 수")
+        parser.add_argument('--threads', type=int, default=8, help="워커마다 발급하는 스레드 수")
+        parser.add_argument('--visits', type=int, default=20000, help="전체 첫 방문(발급) 수")
+        parser.add_argument('--block-size', type=int, default=100, help="카운터에서 한 번에 예약하는 번호 수")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            results = [
+                self.run(1, options),
+                self.run(options['block_size'], options),
+            ]
+
+        self.stdout.write(f"database: {connection.vendor}, workers: {options['workers']}, threads per worker: {options['threads']}")
+        self.stdout.write(f"{'block size':>10}{'ids':>8}{'duplicates':>12}{'db writes':>11}{'ids/sec':>11}{'p50 ms':>9}{'p99 ms':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['block_size']:>10}{result['ids']:>8}{result['duplicates']:>12}{result['db_writes']:>11}"
+                f"{result['ids_per_sec']:>11,.0f}{result['p50'] * 1000:>9.3f}{result['p99'] * 1000:>9.3f}"
+            )
+        if any(result['duplicates'] for result in results):
+            self.stdout.write(self.style.ERROR("duplicate anonymous IDs were issued"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"no duplicates, x{results[1]['ids_per_sec'] / results[0]['ids_per_sec']:.1f} faster with blocks"))
+
+    def run(self, block_size, options):
+        # 워커마다 allocator 하나를 만들어 프로세스 여러 개가 같은 카운터 행을 공유하는 상황을 흉내 냅니다.
+        allocators = [AnonymousIdAllocator(block_size=block_size, counter=f'bench-{block_size}') for _ in range(options['workers'])]
+        per_thread = max(1, options['visits'] // (options['workers'] * options['threads']))
+        numbers, latencies = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(options['workers'] * options['threads'])
+
+        def visit(allocator):
+            issued, timings = [], []
+            try:
+                start.wait()
+                for _ in range(per_thread):
+                    started = time.perf_counter()
+                    issued.append(allocator.allocate())
+                    timings.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                numbers.extend(issued)
+                latencies.extend(timings)
+
+        threads = [
+            threading.Thread(target=visit, args=(allocator,))
+            for allocator in allocators for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'block_size': block_size,
+            'ids': len(numbers),
+            'duplicates': len(numbers) - len(set(numbers)),
+            'db_writes': sum(allocator.blocks for allocator in allocators),
+            'ids_per_sec': len(numbers) / elapsed,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import path, reverse
+from django.utils.crypto import get_random_string
+
+from liveChat.asgi import application
+from myapp import urls, views
+from myapp.models import ChatRoom, Message
+from ._bench import isolated_database, percentile
+
+ASYNC_VIEWS = (views.chat_room_list, views.chat_room_detail, views.create_message, views.leave_chat_room)
+
+
+def sync_view(view):
+    # 기존 동기 뷰처럼 요청마다 스레드(sync_to_async)를 거쳐 실행되도록 async 뷰를 감쌉니다.
+    def wrapper(request, *args, **kwargs):
+        return async_to_sync(view)(request, *args, **kwargs)
+    return wrapper
+
+
+# --mode sync에서 사용하는 URLconf (async 뷰를 동기 뷰로 감싼 것 외에는 myapp.urls와 같습니다)
+urlpatterns = [
+    path(str(pattern.pattern), sync_view(pattern.callback) if pattern.callback in ASYNC_VIEWS else pattern.callback, name=pattern.name)
+    for pattern in urls.urlpatterns
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "ASGI 워커 하나에 HTTP 요청과 WebSocket 메시지를 함께 보내면서 async 뷰와 "
+        "동기 뷰(스레드에서 실행)의 동시 요청 처리량과 응답 시간을 비교합니다. "
+        "SQLite와 인메모리 채널 레이어로 실행하려면 --settings=liveChat.test_settings를 사용합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['both', 'async', 'sync'], default='both', help="측정할 뷰 종류")
+        parser.add_argument('--concurrency', type=int, default=50, help="동시에 요청을 보내는 HTTP 클라이언트 수")
+        parser.add_argument('--duration', type=float, default=5.0, help="모드마다 부하를 주는 시간 (초)")
+        parser.add_argument('--websockets', type=int, default=20, help="함께 메시지를 보내는 WebSocket 연결 수")
+        parser.add_argument('--ws-rate', type=float, default=2.0, help="WebSocket 연결마다 초당 보낼 메시지 수")
+        parser.add_argument('--messages', type=int, default=5000, help="미리 저장해 둘 메시지 수")
+        parser.add_argument('--json', action='store_true', help="결과를 JSON으로 출력합니다")
+
+    def handle(self, *args, **options):
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        unlimited = {'RATES': {'user': (1e9, 1e9), 'anonymous': (1e9, 1e9), 'room': (1e9, 1e9)}}
+        results = []
+        with isolated_database(), override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            CHAT_RATE_LIMITS=unlimited,
+        ):
+            user = User.objects.create_user(username='bench', password='bench')
+            rooms = [ChatRoom.objects.create(name=f'bench {i}', created_by=user) for i in range(10)]
+            Message.objects.bulk_create([
+                Message(user=user, chat_room=rooms[i % len(rooms)], content=f'bench: {i}')
+                for i in range(options['messages'])
+            ], batch_size=1000)
+            client = Client()
+            client.force_login(user)
+            session_key = client.cookies['sessionid'].value
+
+            for mode in modes:
+                # sync 모드에서는 async 뷰를 동기 뷰로 감싼 이 모듈의 URLconf를 사용합니다.
+                with override_settings(ROOT_URLCONF=__name__ if mode == 'sync' else 'liveChat.urls'):
+                    result = asyncio.run(self.run(rooms, session_key, options))
+                results.append({'mode': mode, **result})
+
+        self.report(results, options)
+
+    async def run(self, rooms, session_key, options):
+        csrf_token = get_random_string(32)
+        headers = [
+            (b'host', b'localhost'),
+            (b'cookie', f'sessionid={session_key}; csrftoken={csrf_token}'.encode()),
+            (b'x-csrftoken', csrf_token.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+        ]
+        latencies = []
+        errors = 0
+        stop = asyncio.Event()
+
+        def pick_request():
+            # 목록, 입장, 메시지 전송, 나가기를 고르게 섞어 보냅니다.
+            room = random.choice(rooms)
+            return random.choice([
+                ('GET', reverse('chat_room_list'), b''),
+                ('GET', reverse('chat_room_detail', args=[room.id]), b''),
+                ('POST', reverse('create_message', args=[room.id]), urlencode({'content': 'hello'}).encode()),
+                ('GET', reverse('leave_chat_room', args=[room.id]), b''),
+            ])
+
+        async def http_client():
+            nonlocal errors
+            while not stop.is_set():
+                method, url, body = pick_request()
+                started = time.perf_counter()
+                communicator = HttpCommunicator(application, method, url, body=body, headers=headers)
+                response = await communicator.get_response(timeout=30)
+                latencies.append((time.perf_counter() - started) * 1000)
+                await communicator.wait()
+                if response['status'] >= 400:
+                    errors += 1
+
+        ws_latencies = []
+
+        async def websocket_client(index, room):
+            # 자기가 보낸 메시지가 다시 돌아올 때까지의 시간을 잽니다.
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{room.id}/')
+            connected, _ = await communicator.connect(timeout=10)
+            assert connected
+            while not stop.is_set():
+                marker = f'ping:{index}:{time.perf_counter_ns()}'
+                started = time.perf_counter()
+                await communicator.send_json_to({'message': marker})
+                while not stop.is_set():
+                    # receive_from()은 시간이 초과되면 연결을 끊으므로 먼저 도착한 프레임이 있는지 확인합니다.
+                    if await communicator.receive_nothing(timeout=0.05):
+                        continue
+                    if (await communicator.receive_json_from()).get('content', '').endswith(marker):
+                        ws_latencies.append((time.perf_counter() - started) * 1000)
+                        break
+                await asyncio.sleep(1 / options['ws_rate'])
+            await communicator.disconnect()
+
+        tasks = [asyncio.create_task(websocket_client(i, rooms[i % len(rooms)])) for i in range(options['websockets'])]
+        tasks += [asyncio.create_task(http_client()) for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        await asyncio.sleep(options['duration'])
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        return {
+            'concurrency': options['concurrency'],
+            'websockets': options['websockets'],
+            'elapsed_sec': round(elapsed, 3),
+            'requests': len(latencies),
+            'errors': errors,
+            'requests_per_sec': round(len(latencies) / elapsed, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3) if latencies else None,
+                'p95': round(percentile(latencies, 95), 3) if latencies else None,
+                'p99': round(percentile(latencies, 99), 3) if latencies else None,
+            },
+            'ws_messages': len(ws_latencies),
+            'ws_latency_ms': {
+                'p50': round(percentile(ws_latencies, 50), 3) if ws_latencies else None,
+                'p95': round(percentile(ws_latencies, 95), 3) if ws_latencies else None,
+            },
+        }
+
+    def report(self, results, options):
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            latency, ws_latency = result['latency_ms'], result['ws_latency_ms']
+            fmt = lambda value: '-' if value is None else f'{value:.1f}'
+            self.stdout.write(
+                f"{result['mode']:<6} HTTP {result['requests_per_sec']:>7} req/sec  "
+                f"p50/p95/p99 {fmt(latency['p50'])} / {fmt(latency['p95'])} / {fmt(latency['p99'])} ms  "
+                f"({result['requests']} requests, {result['errors']} errors)  "
+                f"WebSocket round trip p50/p95 {fmt(ws_latency['p50'])} / {fmt(ws_latency['p95'])} ms ({result['ws_messages']} messages)"
+            )
+        if len(results) == 2 and results[0]['requests_per_sec']:
+            self.stdout.write(f"async / sync throughput: {results[1]['requests_per_sec'] / results[0]['requests_per_sec']:.2f}x")
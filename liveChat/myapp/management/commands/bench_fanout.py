@@ -0,0 +1,163 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from liveChat.asgi import application
+from myapp.message_buffer import write_buffer
+from myapp.models import ChatRoom, Message
+from ._bench import isolated_database, percentile
+
+# 벤치마크 메시지 본문: "<방 번호>:<클라이언트 번호>:<보낸 시각(ns)>"
+MARKER = 'bench'
+
+
+def format_ms(value):
+    # 받은 메시지가 없으면 지연 시간도 없습니다.
+    return '-' if value is None else f'{value:.2f}'
+
+
+class Command(BaseCommand):
+    help = (
+        "실제 ASGI 애플리케이션(liveChat.asgi.application)에 M개 방 x N개 클라이언트를 연결해 "
+        "전달 지연 시간, 초당 메시지 수, 연결당 메모리, 초당 DB 저장 수를 측정합니다. "
+        "SQLite와 인메모리 채널 레이어로 실행하려면 --settings=liveChat.test_settings를 사용합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=4, help="채팅방 수 (M)")
+        parser.add_argument('--clients', type=int, default=25, help="방마다 연결할 클라이언트 수 (N)")
+        parser.add_argument('--rate', type=float, default=1.0, help="클라이언트마다 초당 보낼 메시지 수")
+        parser.add_argument('--duration', type=float, default=5.0, help="메시지를 보내는 시간 (초)")
+        parser.add_argument('--coalesce', action='store_true', help="클라이언트가 ?coalesce=1로 연결합니다")
+        parser.add_argument('--json', action='store_true', help="결과를 JSON으로 출력합니다")
+        parser.add_argument('--output', help="결과를 JSON 한 줄로 이 파일에 추가합니다 (실행 결과 비교용)")
+
+    def handle(self, *args, **options):
+        # 벤치마크가 rate limit에 걸리지 않도록 한도를 충분히 크게 설정합니다.
+        unlimited = {'RATES': {'user': (1e9, 1e9), 'anonymous': (1e9, 1e9), 'room': (1e9, 1e9)}}
+        with isolated_database(), override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            CHAT_RATE_LIMITS=unlimited,
+        ):
+            owner = User.objects.create_user(username='bench', password='bench')
+            rooms = [ChatRoom.objects.create(name=f'bench {i}', created_by=owner) for i in range(options['rooms'])]
+            result = asyncio.run(self.run(rooms, options))
+            # 버퍼에 남은 메시지까지 저장한 뒤 DB 저장 수를 셉니다.
+            write_buffer.flush_sync()
+            result['db_rows_written'] = Message.objects.filter(chat_room__in=rooms).count()
+            result['db_writes_per_sec'] = round(result['db_rows_written'] / result['elapsed_sec'], 1)
+            result['database'] = connection.vendor
+
+        self.report(result, options)
+
+    async def run(self, rooms, options):
+        clients, rate, duration = options['clients'], options['rate'], options['duration']
+        query = '?coalesce=1' if options['coalesce'] else ''
+
+        # 연결당 메모리: 모든 클라이언트를 연결하기 전후의 Python 메모리 할당량 차이
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        communicators = []
+        for room_index, room in enumerate(rooms):
+            for client_index in range(clients):
+                communicator = WebsocketCommunicator(application, f'/ws/chat/{room.id}/{query}')
+                connected, _ = await communicator.connect(timeout=10)
+                assert connected
+                communicators.append((room_index, client_index, communicator))
+        memory_per_connection = (tracemalloc.get_traced_memory()[0] - before) / len(communicators)
+        tracemalloc.stop()
+
+        latencies = []
+        received = 0
+        stop = asyncio.Event()
+
+        async def receive(communicator):
+            nonlocal received
+            while not stop.is_set():
+                # receive_from()은 시간이 초과되면 연결(애플리케이션)을 끊으므로 먼저 도착한 프레임이 있는지 확인합니다.
+                if await communicator.receive_nothing(timeout=0.5):
+                    continue
+                frame = await communicator.receive_from()
+                now = time.perf_counter_ns()
+                data = json.loads(frame)
+                for item in (data if isinstance(data, list) else [data]):
+                    content = item.get('content', '')
+                    if f'{MARKER}:' not in content:
+                        continue
+                    sent_at = int(content.rsplit(':', 1)[1])
+                    latencies.append((now - sent_at) / 1e6)
+                    received += 1
+
+        sent = 0
+
+        async def send(room_index, client_index, communicator):
+            nonlocal sent
+            # 클라이언트마다 시작 시점을 흩뜨려 모든 클라이언트가 동시에 보내지 않도록 합니다.
+            await asyncio.sleep(random.random() / rate)
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                await communicator.send_json_to({'message': f'{MARKER}:{room_index}:{client_index}:{time.perf_counter_ns()}'})
+                sent += 1
+                await asyncio.sleep(1 / rate)
+
+        receivers = [asyncio.create_task(receive(communicator)) for _, _, communicator in communicators]
+        started = time.perf_counter()
+        await asyncio.gather(*(send(*client) for client in communicators))
+        # 마지막 메시지가 전달될 때까지 기다립니다.
+        expected = sent * clients
+        wait_until = time.perf_counter() + 5
+        while received < expected and time.perf_counter() < wait_until:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*receivers)
+        for _, _, communicator in communicators:
+            await communicator.disconnect()
+
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'rooms': len(rooms),
+            'clients_per_room': clients,
+            'connections': len(communicators),
+            'rate_per_client': rate,
+            'duration_sec': duration,
+            'coalesce': options['coalesce'],
+            'elapsed_sec': round(elapsed, 3),
+            'messages_sent': sent,
+            'messages_per_sec': round(sent / elapsed, 1),
+            'deliveries_expected': expected,
+            'deliveries_received': received,
+            'deliveries_per_sec': round(received / elapsed, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3) if latencies else None,
+                'p95': round(percentile(latencies, 95), 3) if latencies else None,
+                'p99': round(percentile(latencies, 99), 3) if latencies else None,
+                'mean': round(statistics.fmean(latencies), 3) if latencies else None,
+            },
+            'memory_per_connection_bytes': round(memory_per_connection),
+        }
+
+    def report(self, result, options):
+        if options['output']:
+            with open(options['output'], 'a') as f:
+                f.write(json.dumps(result) + '\n')
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        latency = result['latency_ms']
+        self.stdout.write(f"connections:           {result['connections']} ({result['rooms']} rooms x {result['clients_per_room']} clients)")
+        self.stdout.write(f"messages sent:         {result['messages_sent']} ({result['messages_per_sec']}/sec)")
+        self.stdout.write(f"deliveries:            {result['deliveries_received']}/{result['deliveries_expected']} ({result['deliveries_per_sec']}/sec)")
+        self.stdout.write(f"latency p50/p95/p99:   {format_ms(latency['p50'])} / {format_ms(latency['p95'])} / {format_ms(latency['p99'])} ms")
+        self.stdout.write(f"memory per connection: {result['memory_per_connection_bytes']:,} bytes")
+        self.stdout.write(f"DB writes:             {result['db_rows_written']} rows ({result['db_writes_per_sec']}/sec, {result['database']})")
@@ -0,0 +1,42 @@
+import json
+import time
+
+import msgpack
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "JSON 텍스트 프레임과 MessagePack 바이너리 프레임의 크기와 인코딩/디코딩 시간을 비교합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000, help="인코딩/디코딩 반복 횟수")
+        parser.add_argument('--content-length', type=int, default=40, help="메시지 본문 길이")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        payload = {
+            'content': 'testuser: ' + ('안녕하세요 hello ' * options['content_length'])[:options['content_length']],
+            'username': 'testuser',
+            'created_at': '2024-09-18 17:41:00',
+        }
+        encodings = {
+            'json': (lambda data: json.dumps(data).encode(), json.loads),
+            'msgpack': (msgpack.packb, msgpack.unpackb),
+        }
+
+        self.stdout.write(f"{'encoding':<10}{'bytes/frame':>12}{'encode us':>12}{'decode us':>12}")
+        for name, (encode, decode) in encodings.items():
+            frame = encode(payload)
+            assert decode(frame) == payload
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                encode(payload)
+            encode_us = (time.perf_counter() - started) / iterations * 1e6
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                decode(frame)
+            decode_us = (time.perf_counter() - started) / iterations * 1e6
+
+            self.stdout.write(f"{name:<10}{len(frame):>12}{encode_us:>12.2f}{decode_us:>12.2f}")
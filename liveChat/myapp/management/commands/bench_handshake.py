@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+
+from channels.auth import AuthMiddlewareStack
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from myapp.handshake import CachedAuthMiddlewareStack, get_handshake_cache
+from ._bench import isolated_database, percentile
+
+
+class WhoAmIConsumer(AsyncWebsocketConsumer):
+    # 핸드셰이크 비용만 재도록 연결을 받고 인증된 사용자 이름만 보냅니다.
+    async def connect(self):
+        await self.accept()
+        await self.send(text_data=self.scope['user'].username)
+
+
+class QueryCounter:
+    """모든 스레드의 데이터베이스 연결에서 실행한 쿼리 수를 셉니다."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        # 같은 연결 객체가 다시 연결될 때도 신호가 오므로 한 번만 추가합니다.
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = (
+        "로그인 세션 N개가 동시에 WebSocket에 연결(재연결)할 때 초당 핸드셰이크 수와 핸드셰이크당 쿼리 수를 "
+        "AuthMiddlewareStack과 CachedAuthMiddlewareStack(사용자 캐시)으로 비교합니다. "
+        "cold는 캐시가 빈 상태(배포 직후 로컬 캐시), warm은 다시 연결하는 상태입니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=500, help="로그인 세션 수 (라운드마다 세션마다 한 번 연결)")
+        parser.add_argument('--concurrency', type=int, default=100, help="동시에 진행하는 핸드셰이크 수")
+        parser.add_argument('--rounds', type=int, default=3, help="warm 라운드 수")
+
+    def handle(self, *args, **options):
+        config = dict(getattr(settings, 'CHAT_HANDSHAKE_CACHE', None) or {})
+        config['OPTIONS'] = {**config.get('OPTIONS', {}), 'max_entries': max(options['sessions'], 1)}
+        counter = QueryCounter()
+        results = []
+        with isolated_database(), override_settings(CHAT_HANDSHAKE_CACHE=config):
+            sessions = self.create_sessions(options['sessions'])
+            connection_created.connect(counter.install)
+            try:
+                for name, application in [
+                    ('AuthMiddlewareStack', AuthMiddlewareStack(WhoAmIConsumer.as_asgi())),
+                    ('CachedAuthMiddlewareStack', CachedAuthMiddlewareStack(WhoAmIConsumer.as_asgi())),
+                ]:
+                    # 빈 캐시(cold)에서 시작하도록 캐시를 새로 만듭니다.
+                    get_handshake_cache.cache_clear()
+                    for round_index in range(options['rounds'] + 1):
+                        # 이미 열린 연결에는 쿼리 카운터가 없으므로 라운드마다 연결을 새로 엽니다.
+                        connections.close_all()
+                        counter.count = 0
+                        result = asyncio.run(self.run(application, sessions, options['concurrency']))
+                        result.update(stack=name, round='cold' if round_index == 0 else f'warm {round_index}')
+                        result['queries_per_handshake'] = counter.count / len(sessions)
+                        results.append(result)
+            finally:
+                connection_created.disconnect(counter.install)
+                connections.close_all()
+
+        self.stdout.write(f"database: {connection.vendor}, sessions: {options['sessions']}, concurrency: {options['concurrency']}")
+        self.stdout.write(f"{'stack':<27}{'round':<8}{'handshakes/sec':>15}{'p50 ms':>9}{'p99 ms':>9}{'queries/handshake':>19}")
+        for result in results:
+            self.stdout.write(
+                f"{result['stack']:<27}{result['round']:<8}{result['handshakes_per_sec']:>15,.0f}"
+                f"{result['p50'] * 1000:>9.2f}{result['p99'] * 1000:>9.2f}{result['queries_per_handshake']:>19.2f}"
+            )
+
+        baseline = [result for result in results if result['stack'] == 'AuthMiddlewareStack' and result['round'] != 'cold']
+        cached = [result for result in results if result['stack'] == 'CachedAuthMiddlewareStack' and result['round'] != 'cold']
+        speedup = max(result['handshakes_per_sec'] for result in cached) / max(result['handshakes_per_sec'] for result in baseline)
+        self.stdout.write(self.style.SUCCESS(f"warm reconnects x{speedup:.1f} faster with the handshake cache"))
+
+    def create_sessions(self, count):
+        # 로그인한 것과 같은 세션(사용자 ID, 인증 백엔드, 비밀번호 해시)을 직접 만듭니다.
+        users = User.objects.bulk_create([User(username=f'bench{i}', password='!') for i in range(count)])
+        sessions = []
+        for user in users:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            sessions.append((session.session_key, user.username))
+        return sessions
+
+    async def run(self, application, sessions, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def handshake(session_key, username):
+            async with semaphore:
+                started = time.perf_counter()
+                communicator = WebsocketCommunicator(
+                    application, '/', headers=[(b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_key}'.encode())]
+                )
+                connected, _ = await communicator.connect(timeout=30)
+                assert connected
+                # 캐시를 사용해도 같은 사용자로 인증되어야 합니다.
+                assert await communicator.receive_from(timeout=30) == username
+                latencies.append(time.perf_counter() - started)
+                await communicator.disconnect()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[handshake(session_key, username) for session_key, username in sessions])
+        elapsed = time.perf_counter() - started
+        return {
+            'handshakes_per_sec': len(sessions) / elapsed,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        }
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from myapp.message_buffer import MessageWriteBuffer
+from myapp.models import ChatRoom, Message
+from ._bench import isolated_database
+
+
+class Command(BaseCommand):
+    help = "메시지마다 save()를 호출할 때와 write-behind 버퍼(bulk_create)를 사용할 때의 초당 저장 행 수를 비교합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000, help="저장할 메시지 수")
+        parser.add_argument('--batch-size', type=int, default=200, help="버퍼의 배치 크기")
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        batch_size = options['batch_size']
+
+        with isolated_database():
+            user = User.objects.create_user(username='bench', password='bench')
+            chat_room = ChatRoom.objects.create(name='bench', created_by=user)
+
+            # 1) 메시지마다 save()
+            started = time.perf_counter()
+            for i in range(count):
+                Message(user=user, chat_room=chat_room, content=f'bench: message {i}').save()
+            save_elapsed = time.perf_counter() - started
+
+            # 2) write-behind 버퍼
+            buffer = MessageWriteBuffer(batch_size=batch_size, flush_interval=60)
+
+            async def fill_buffer():
+                for i in range(count):
+                    await buffer.add(Message(user_id=user.id, chat_room_id=chat_room.id, content=f'bench: buffered {i}'))
+                await buffer.flush()
+
+            started = time.perf_counter()
+            asyncio.run(fill_buffer())
+            buffer_elapsed = time.perf_counter() - started
+
+            assert Message.objects.filter(chat_room=chat_room).count() == count * 2
+
+        save_rate = count / save_elapsed
+        buffer_rate = count / buffer_elapsed
+        self.stdout.write(f"messages:         {count}")
+        self.stdout.write(f"per-message save: {save_rate:,.0f} rows/sec ({save_elapsed:.3f}s)")
+        self.stdout.write(f"write-behind:     {buffer_rate:,.0f} rows/sec ({buffer_elapsed:.3f}s, batch_size={batch_size})")
+        self.stdout.write(self.style.SUCCESS(f"speedup:          x{buffer_rate / save_rate:.1f}"))
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from myapp.models import ChatRoom, Message
+from myapp.room_transfer import export_room, import_room
+from ._bench import isolated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "메시지 수를 늘려 가며 export_room/import_room의 초당 메시지 수와 최대 Python 메모리 할당량을 측정합니다. "
+        "메시지 수가 늘어도 최대 메모리가 일정해야 합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help="채팅방 메시지 수 목록 (쉼표로 구분)")
+        parser.add_argument('--users', type=int, default=100, help="메시지를 보낸 사용자 수")
+        parser.add_argument('--export-chunk-size', type=int, default=2000)
+        parser.add_argument('--import-chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        results = []
+        # DEBUG이면 실행한 SQL을 모두 기록하므로 메모리와 시간이 운영 환경과 달라집니다.
+        with override_settings(DEBUG=False), isolated_database(), tempfile.TemporaryDirectory() as directory:
+            users = User.objects.bulk_create([User(username=f'bench{i}', password='!') for i in range(options['users'])])
+            for size in sizes:
+                chat_room = self.seed(size, users)
+                path = os.path.join(directory, f'room-{size}.ndjson')
+                result = {'messages': size}
+                # 처리량은 tracemalloc 없이, 최대 메모리는 tracemalloc을 켜고 한 번 더 실행해서 잽니다.
+                result['export_per_sec'], _ = self.measure(lambda: self.export(chat_room, path, options))
+                _, result['export_peak'] = self.measure(lambda: self.export(chat_room, path, options), trace=True)
+                result['import_per_sec'], _ = self.measure(lambda: self.import_(path, f'import {size} a', options))
+                _, result['import_peak'] = self.measure(lambda: self.import_(path, f'import {size} b', options), trace=True)
+                results.append(result)
+
+        self.stdout.write(f"database: {connection.vendor}")
+        self.stdout.write(f"{'messages':>10}{'export msg/sec':>16}{'export peak MB':>16}{'import msg/sec':>16}{'import peak MB':>16}")
+        for result in results:
+            self.stdout.write(
+                f"{result['messages']:>10}{result['export_per_sec']:>16,.0f}{result['export_peak'] / 2**20:>16.2f}"
+                f"{result['import_per_sec']:>16,.0f}{result['import_peak'] / 2**20:>16.2f}"
+            )
+        growth = max(result['export_peak'] for result in results[1:] or results) / results[0]['export_peak']
+        import_growth = max(result['import_peak'] for result in results[1:] or results) / results[0]['import_peak']
+        self.stdout.write(self.style.SUCCESS(
+            f"peak memory x{growth:.2f} (export), x{import_growth:.2f} (import) for x{sizes[-1] / sizes[0]:.0f} messages"
+        ))
+
+    def seed(self, size, users):
+        chat_room = ChatRoom.objects.create(name=f'bench {size}', created_by=users[0])
+        started = timezone.now() - timedelta(seconds=size)
+        batch = []
+        for i in range(size):
+            batch.append(Message(
+                user=users[i % len(users)],
+                chat_room=chat_room,
+                content=f'{users[i % len(users)].username}: 벤치마크 메시지 {i}',
+                created_at=started + timedelta(seconds=i),
+                seq=i + 1,
+            ))
+            if len(batch) == 5000:
+                Message.objects.bulk_create(batch)
+                batch = []
+        Message.objects.bulk_create(batch)
+        return chat_room
+
+    def export(self, chat_room, path, options):
+        with open(path, 'w', encoding='utf-8') as out:
+            return export_room(chat_room, out, chunk_size=options['export_chunk_size'])
+
+    def import_(self, path, name, options):
+        with open(path, encoding='utf-8') as lines:
+            return import_room(lines, name=name, chunk_size=options['import_chunk_size'])[1]
+
+    def measure(self, run, trace=False):
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        count = run()
+        elapsed = time.perf_counter() - started
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return count / elapsed, peak
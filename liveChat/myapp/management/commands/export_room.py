@@ -0,0 +1,42 @@
+import gzip
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import ChatRoom
+from myapp.room_transfer import export_room
+
+
+class Command(BaseCommand):
+    help = (
+        "채팅방의 메시지 기록(보관된 메시지 포함)을 NDJSON으로 내보냅니다. "
+        "메시지를 chunk 단위로 읽으므로 메시지 수와 관계없이 메모리 사용량이 일정합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('chat_room_id', type=int, help="내보낼 채팅방 ID")
+        parser.add_argument('--output', '-o', help="저장할 파일 (기본값: 표준 출력). .gz로 끝나면 gzip으로 압축합니다")
+        parser.add_argument('--gzip', action='store_true', help="gzip으로 압축합니다")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="한 번에 읽을 메시지 수")
+
+    def handle(self, *args, **options):
+        chat_room = ChatRoom.objects.select_related('created_by').filter(id=options['chat_room_id']).first()
+        if chat_room is None:
+            raise CommandError(f"Chat room {options['chat_room_id']} does not exist.")
+        path = options['output']
+        compress = options['gzip'] or (path or '').endswith('.gz')
+        raw = open(path, 'wb') if path else sys.stdout.buffer
+        binary = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+        out = io.TextIOWrapper(binary, encoding='utf-8')
+        try:
+            exported = export_room(chat_room, out, chunk_size=options['chunk_size'])
+            out.flush()
+        finally:
+            # TextIOWrapper를 닫으면 표준 출력도 닫히므로 떼어 내고, gzip과 파일만 닫습니다.
+            out.detach()
+            if compress:
+                binary.close()
+            if path:
+                raw.close()
+        self.stderr.write(self.style.SUCCESS(f"Exported {exported} messages from '{chat_room.name}'."))
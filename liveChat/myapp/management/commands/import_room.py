@@ -0,0 +1,50 @@
+import gzip
+import io
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.room_transfer import import_room
+
+
+class Command(BaseCommand):
+    help = (
+        "export_room으로 내보낸 NDJSON(또는 .gz) 파일을 새 채팅방으로 가져옵니다. "
+        "chunk 단위 트랜잭션에서 한꺼번에 저장하고, 사용자는 username으로 연결합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="가져올 파일 ('-'이면 표준 입력). gzip으로 압축된 파일도 읽습니다")
+        parser.add_argument('--name', help="새 채팅방 이름 (기본값: 내보낸 채팅방 이름)")
+        parser.add_argument('--owner', help="새 채팅방을 만든 사용자 (기본값: 내보낸 채팅방을 만든 사용자)")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="트랜잭션 하나에 저장할 메시지 수")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            owner = User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"User '{options['owner']}' does not exist.")
+
+        raw = sys.stdin.buffer if options['input'] == '-' else open(options['input'], 'rb')
+        try:
+            # gzip 파일은 매직 넘버로 알아봅니다.
+            binary = io.BufferedReader(raw) if not isinstance(raw, io.BufferedReader) else raw
+            if binary.peek(2)[:2] == b'\x1f\x8b':
+                binary = gzip.GzipFile(fileobj=binary, mode='rb')
+            lines = io.TextIOWrapper(binary, encoding='utf-8')
+            try:
+                chat_room, imported, unmapped = import_room(
+                    lines, name=options['name'], owner=owner, chunk_size=options['chunk_size'],
+                )
+            except (ValueError, EOFError, gzip.BadGzipFile) as e:
+                # 형식이 잘못된 줄(줄 번호 포함), 잘린 gzip 파일
+                raise CommandError(str(e))
+        finally:
+            if raw is not sys.stdin.buffer:
+                raw.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} messages into '{chat_room.name}' (id {chat_room.id})."))
+        if unmapped:
+            self.stdout.write(self.style.WARNING(f"{unmapped} usernames did not match a user; their messages were imported without a user."))
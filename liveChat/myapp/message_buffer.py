@@ -0,0 +1,82 @@
+import asyncio
+import atexit
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from .models import Message
+from .summary import record_messages
+from .utils.logging_helpers import log_error
+
+
+class MessageWriteBuffer:
+    """WebSocket 메시지를 모아 두었다가 bulk_create로 한 번에 저장하는 write-behind 버퍼"""
+
+    def __init__(self, batch_size=200, flush_interval=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def has_pending(self, chat_room_id):
+        """아직 저장되지 않은 채팅방의 메시지가 있는지 확인합니다."""
+        return any(message.chat_room_id == chat_room_id for message in self._pending)
+
+    async def add(self, message):
+        """저장할 메시지를 버퍼에 추가합니다. 크기 임계값에 도달하면 바로 저장합니다."""
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    async def flush(self):
+        """버퍼에 쌓인 메시지를 모두 저장합니다."""
+        # 이벤트 루프 안에서는 리스트를 통째로 교체하는 것만으로 충분히 원자적입니다.
+        batch, self._pending = self._pending, []
+        if batch:
+            await database_sync_to_async(self._write)(batch)
+
+    def flush_sync(self):
+        """이벤트 루프 밖(프로세스 종료 시)에서 남은 메시지를 저장합니다."""
+        batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def _schedule_flush(self):
+        # 타이머가 이미 돌고 있으면 새로 만들지 않습니다.
+        # 이전 이벤트 루프에서 만든 타이머는 다시 실행되지 않으므로 새로 예약합니다.
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and not self._timer.done() and self._timer.get_loop() is loop:
+            return
+        self._timer = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def _write(self, batch):
+        try:
+            Message.objects.bulk_create(batch, batch_size=self.batch_size)
+            record_messages(batch)
+        except Exception as e:
+            # 저장에 실패한 배치는 다시 쌓지 않고 버립니다. (버퍼가 끝없이 커지는 것을 방지)
+            log_error("Failed to flush %d buffered messages: %s", len(batch), e)
+
+
+def _build_write_buffer():
+    config = getattr(settings, 'CHAT_WRITE_BUFFER', {})
+    return MessageWriteBuffer(
+        batch_size=config.get('BATCH_SIZE', 200),
+        flush_interval=config.get('FLUSH_INTERVAL', 0.5),
+    )
+
+
+# 프로세스마다 하나의 버퍼를 공유합니다.
+write_buffer = _build_write_buffer()
+
+# 프로세스가 종료될 때 남아 있는 메시지를 저장합니다.
+atexit.register(write_buffer.flush_sync)
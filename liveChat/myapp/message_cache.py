@@ -0,0 +1,209 @@
+import functools
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'myapp.message_cache.LocalRecentMessageStore'
+
+
+def estimate_size(message):
+    """직렬화된 메시지가 차지하는 메모리를 대략 계산합니다."""
+    return 64 + sum(len(value) for value in message.values() if isinstance(value, str))
+
+
+class BaseRecentMessageStore:
+    """채팅방별 최근 메시지 링 버퍼 저장소의 기본 클래스
+
+    get()이 None을 반환하면 아직 데이터베이스에서 채워지지 않은 방입니다.
+    append()는 이미 채워진 방에만 메시지를 추가하므로, 캐시에 있는 방의 메시지는
+    항상 데이터베이스의 최근 메시지와 같습니다.
+    """
+
+    def __init__(self, room_capacity=100):
+        self.room_capacity = room_capacity
+
+    def get(self, room_id):
+        """(오래된 순 메시지 목록, 더 오래된 메시지가 있는지) 또는 None을 반환합니다."""
+        raise NotImplementedError
+
+    def prime(self, room_id, messages, has_older):
+        """데이터베이스에서 가져온 최근 메시지로 방을 채웁니다."""
+        raise NotImplementedError
+
+    def append(self, room_id, message):
+        """새 메시지를 방의 링 버퍼에 추가합니다."""
+        raise NotImplementedError
+
+    def discard(self, room_id):
+        """방을 캐시에서 제거합니다."""
+        raise NotImplementedError
+
+    async def aget(self, room_id):
+        return self.get(room_id)
+
+    async def aprime(self, room_id, messages, has_older):
+        self.prime(room_id, messages, has_older)
+
+    async def aappend(self, room_id, message):
+        self.append(room_id, message)
+
+    async def adiscard(self, room_id):
+        self.discard(room_id)
+
+
+class LocalRecentMessageStore(BaseRecentMessageStore):
+    """프로세스 메모리에 최근 메시지를 보관하는 저장소
+
+    방 개수와 전체 메모리 사용량이 한도를 넘으면 가장 오래 사용되지 않은 방부터 제거합니다.
+    프로세스끼리 공유되지 않으므로 워커가 하나일 때나 테스트에서 사용합니다.
+    """
+
+    def __init__(self, room_capacity=100, max_rooms=1000, max_bytes=32 * 1024 * 1024):
+        super().__init__(room_capacity)
+        self.max_rooms = max_rooms
+        self.max_bytes = max_bytes
+        self._rooms = OrderedDict()  # room_id -> [deque of (message, size), has_older, bytes]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rooms)
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+    def get(self, room_id):
+        with self._lock:
+            entry = self._rooms.get(room_id)
+            if entry is None:
+                return None
+            self._rooms.move_to_end(room_id)
+            return [message for message, size in entry[0]], entry[1]
+
+    def prime(self, room_id, messages, has_older):
+        with self._lock:
+            self._discard(room_id)
+            entry = [deque(), has_older, 0]
+            self._rooms[room_id] = entry
+            for message in messages:
+                self._push(entry, message)
+            self._evict()
+
+    def append(self, room_id, message):
+        with self._lock:
+            entry = self._rooms.get(room_id)
+            if entry is None:
+                return
+            self._rooms.move_to_end(room_id)
+            self._push(entry, message)
+            self._evict()
+
+    def discard(self, room_id):
+        with self._lock:
+            self._discard(room_id)
+
+    def _push(self, entry, message):
+        size = estimate_size(message)
+        entry[0].append((message, size))
+        entry[2] += size
+        self._bytes += size
+        # 용량을 넘으면 가장 오래된 메시지를 버립니다.
+        while len(entry[0]) > self.room_capacity:
+            _, dropped = entry[0].popleft()
+            entry[1] = True
+            entry[2] -= dropped
+            self._bytes -= dropped
+
+    def _discard(self, room_id):
+        entry = self._rooms.pop(room_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        # 가장 오래 사용되지 않은 방부터 제거합니다. (방금 사용한 방은 남겨 둡니다)
+        while len(self._rooms) > 1 and (len(self._rooms) > self.max_rooms or self._bytes > self.max_bytes):
+            _, entry = self._rooms.popitem(last=False)
+            self._bytes -= entry[2]
+
+
+class DjangoCacheRecentMessageStore(BaseRecentMessageStore):
+    """Django 캐시(Redis 등)에 최근 메시지를 보관하는 저장소
+
+    여러 워커가 같은 캐시를 공유할 때 사용합니다. 사용하지 않는 방은 timeout이 지나면
+    만료되고, 메모리 한도와 제거 정책은 캐시 서버 설정을 따릅니다.
+    """
+
+    def __init__(self, room_capacity=100, cache_alias='default', timeout=3600, key_prefix='recent-messages'):
+        super().__init__(room_capacity)
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, room_id):
+        return f'{self.key_prefix}:{room_id}'
+
+    def get(self, room_id):
+        return self._unpack(self.cache.get(self.make_key(room_id)))
+
+    def prime(self, room_id, messages, has_older):
+        self.cache.set(self.make_key(room_id), self._pack(messages, has_older), self.timeout)
+
+    def append(self, room_id, message):
+        # 읽고 쓰는 사이에 다른 워커가 추가한 메시지는 덮어쓸 수 있습니다.
+        # 캐시는 최근 메시지를 빠르게 보여주기 위한 것이고 원본은 항상 데이터베이스입니다.
+        key = self.make_key(room_id)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.set(key, self._pack(entry['messages'] + [message], entry['has_older']), self.timeout)
+
+    def discard(self, room_id):
+        self.cache.delete(self.make_key(room_id))
+
+    async def aget(self, room_id):
+        return self._unpack(await self.cache.aget(self.make_key(room_id)))
+
+    async def aprime(self, room_id, messages, has_older):
+        await self.cache.aset(self.make_key(room_id), self._pack(messages, has_older), self.timeout)
+
+    async def aappend(self, room_id, message):
+        key = self.make_key(room_id)
+        entry = await self.cache.aget(key)
+        if entry is not None:
+            await self.cache.aset(key, self._pack(entry['messages'] + [message], entry['has_older']), self.timeout)
+
+    async def adiscard(self, room_id):
+        await self.cache.adelete(self.make_key(room_id))
+
+    def _pack(self, messages, has_older):
+        has_older = has_older or len(messages) > self.room_capacity
+        return {'messages': messages[-self.room_capacity:], 'has_older': has_older}
+
+    def _unpack(self, entry):
+        if entry is None:
+            return None
+        return entry['messages'], entry['has_older']
+
+
+@functools.cache
+def get_recent_message_store():
+    """설정(CHAT_RECENT_MESSAGES)에 지정된 최근 메시지 저장소를 반환합니다."""
+    config = getattr(settings, 'CHAT_RECENT_MESSAGES', {})
+    backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_recent_message_store(*, setting, **kwargs):
+    # 테스트에서 override_settings로 설정을 바꾸면 저장소를 다시 만듭니다.
+    if setting == 'CHAT_RECENT_MESSAGES':
+        get_recent_message_store.cache_clear()
@@ -0,0 +1,321 @@
+import contextvars
+import math
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .utils.logging_helpers import log_error
+
+# 지연 시간 히스토그램의 기본 버킷 (초)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+REGISTRY = []  # 등록된 모든 메트릭
+GAUGE_CALLBACKS = []  # 수집할 때 값을 계산하는 게이지 함수
+
+# 스레드마다 자기 샤드(dict)에만 쓰므로 값을 올릴 때 락이 필요 없습니다.
+# 수집할 때 모든 샤드를 더합니다. (끝난 스레드의 샤드도 누적 값이므로 남겨 둡니다)
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+
+
+def get_shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY.append(self)
+
+
+class Counter(Metric):
+    """계속 증가하는 값 (예: 받은 메시지 수)"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = get_shard()
+        key = (self.name, label_key(labels))
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """관측값(예: 지연 시간)의 버킷별 개수, 합계, 개수"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = get_shard()
+        key = (self.name, label_key(labels))
+        values = shard.get(key)
+        if values is None:
+            # 버킷별 개수(마지막은 +Inf), 합계, 개수
+            values = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Gauge(Metric):
+    """수집할 때 callback으로 계산하는 현재 값 (예: 연결 수). callback은 {labels: 값}을 반환합니다."""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        GAUGE_CALLBACKS.append((name, callback))
+
+
+def merge(target, name, labels, value):
+    values = target.setdefault(name, {})
+    current = values.get(labels)
+    if current is None:
+        values[labels] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        values[labels] = [a + b for a, b in zip(current, value)]
+    else:
+        values[labels] = current + value
+
+
+def snapshot():
+    """이 프로세스의 모든 메트릭 값을 {이름: {labels: 값}}으로 반환합니다."""
+    result = {}
+    with _shards_lock:
+        shards = list(_shards)
+    for shard in shards:
+        for (name, labels), value in list(shard.items()):
+            merge(result, name, labels, value)
+    for name, callback in GAUGE_CALLBACKS:
+        try:
+            for labels, value in callback().items():
+                merge(result, name, labels, value)
+        except Exception as e:
+            log_error("Error collecting metric %s: %s", name, e)
+    return result
+
+
+def get_config():
+    return {'CACHE_ALIAS': None, 'PUBLISH_INTERVAL': 15, 'KEY_PREFIX': 'metrics', **getattr(settings, 'CHAT_METRICS', {})}
+
+
+def publish_snapshot():
+    """이 프로세스의 스냅샷을 공유 캐시에 저장합니다. (여러 워커의 값을 합치기 위해)"""
+    from .fanout import PROCESS_ID
+    config = get_config()
+    if not config['CACHE_ALIAS']:
+        return
+    cache = caches[config['CACHE_ALIAS']]
+    prefix, timeout = config['KEY_PREFIX'], config['PUBLISH_INTERVAL'] * 3
+    cache.set(f'{prefix}:{PROCESS_ID}', snapshot(), timeout)
+    # 프로세스 목록은 읽고 쓰는 사이에 다른 워커가 쓸 수 있지만, 다음 주기에 다시 추가됩니다.
+    processes = cache.get(f'{prefix}:processes') or {}
+    now = time.time()
+    processes = {pid: seen for pid, seen in processes.items() if now - seen < timeout}
+    processes[PROCESS_ID] = now
+    cache.set(f'{prefix}:processes', processes, None)
+
+
+def collect():
+    """모든 워커의 메트릭을 합친 값을 반환합니다. 캐시를 설정하지 않았으면 이 프로세스의 값만 반환합니다."""
+    config = get_config()
+    if not config['CACHE_ALIAS']:
+        return snapshot()
+    publish_snapshot()
+    cache = caches[config['CACHE_ALIAS']]
+    prefix = config['KEY_PREFIX']
+    processes = cache.get(f'{prefix}:processes') or {}
+    result = {}
+    for process_snapshot in cache.get_many([f'{prefix}:{pid}' for pid in processes]).values():
+        for name, values in process_snapshot.items():
+            for labels, value in values.items():
+                merge(result, name, labels, value)
+    return result
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def ensure_publisher():
+    """공유 캐시를 설정했으면 스냅샷을 주기적으로 저장하는 백그라운드 스레드를 시작합니다."""
+    global _publisher
+    if _publisher is not None or not get_config()['CACHE_ALIAS']:
+        return
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = threading.Thread(target=run_publisher, name='metrics-publisher', daemon=True)
+            _publisher.start()
+
+
+def run_publisher():
+    while True:
+        time.sleep(get_config()['PUBLISH_INTERVAL'])
+        try:
+            publish_snapshot()
+        except Exception as e:
+            log_error("Error publishing metrics: %s", e)
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(values):
+    """메트릭 값을 Prometheus 텍스트 형식으로 변환합니다."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for labels, value in sorted(values.get(metric.name, {}).items()):
+            if metric.type != 'histogram':
+                lines.append(f'{metric.name}{format_labels(labels)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value):
+                cumulative += count
+                lines.append(f'{metric.name}_bucket{format_labels(labels, le=format_value(float(bound)))} {cumulative}')
+            lines.append(f'{metric.name}_sum{format_labels(labels)} {format_value(value[-2])}')
+            lines.append(f'{metric.name}_count{format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def connection_counts():
+    # 이 프로세스의 이벤트 루프마다 있는 RoomFanout의 방별 연결 수
+    from .fanout import _hubs
+    counts = {}
+    for hub in list(_hubs.values()):
+        for group, connections in list(hub.rooms.items()):
+            key = (('room', group.removeprefix('chat_')),)
+            counts[key] = counts.get(key, 0) + len(connections)
+    return counts
+
+
+def send_queue_depth():
+    from .fanout import _hubs
+    depth = sum(stats['queue_depth'] for hub in list(_hubs.values()) for stats in hub.connection_stats())
+    return {(): depth}
+
+
+ACTIVE_CONNECTIONS = Gauge('livechat_active_connections', 'Open WebSocket connections per room.', connection_counts)
+SEND_QUEUE_DEPTH = Gauge('livechat_send_queue_depth', 'Messages waiting in per-connection send queues.', send_queue_depth)
+MESSAGES_RECEIVED = Counter('livechat_messages_received_total', 'Chat messages received from WebSocket clients.')
+MESSAGES_FANNED_OUT = Counter('livechat_messages_fanned_out_total', 'Messages queued for delivery to local WebSocket connections.')
+MESSAGES_DROPPED = Counter('livechat_messages_dropped_total', 'Messages dropped because a send queue was full.')
+GROUP_SEND_SECONDS = Histogram('livechat_group_send_seconds', 'Time spent in channel layer group_send.')
+SEND_SECONDS = Histogram('livechat_send_seconds', 'Time to write a batch of queued messages to a WebSocket.')
+CHANNEL_LAYER_ERRORS = Counter('livechat_channel_layer_errors_total', 'Errors raised by the channel layer.')
+VIEW_SECONDS = Histogram('livechat_view_seconds', 'HTTP request time per view.')
+VIEW_DB_SECONDS = Histogram('livechat_view_db_seconds', 'Database query time per HTTP request, per view.')
+
+
+# 요청마다 DB 쿼리 시간을 누적할 곳. async 뷰의 쿼리는 다른 스레드에서 실행되지만
+# sync_to_async가 contextvar를 복사하므로 같은 목록에 누적됩니다.
+_query_time = contextvars.ContextVar('query_time', default=None)
+
+
+def record_query_time(execute, sql, params, many, context):
+    total = _query_time.get()
+    if total is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        total[0] += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # 새 데이터베이스 연결마다 쿼리 시간 측정 wrapper를 추가합니다.
+    if record_query_time not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query_time)
+
+
+class MetricsMiddleware:
+    """뷰별 요청 시간과 DB 쿼리 시간을 기록하는 미들웨어 (동기/async 요청 모두 지원)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        ensure_publisher()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        total = [0.0]
+        token = _query_time.set(total)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            _query_time.reset(token)
+            self.observe(request, time.perf_counter() - started, total[0])
+
+    async def __acall__(self, request):
+        total = [0.0]
+        token = _query_time.set(total)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            _query_time.reset(token)
+            self.observe(request, time.perf_counter() - started, total[0])
+
+    def observe(self, request, elapsed, db_time):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        VIEW_SECONDS.observe(elapsed, view=view)
+        VIEW_DB_SECONDS.observe(db_time, view=view)
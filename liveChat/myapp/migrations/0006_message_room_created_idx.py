@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0005_alter_message_created_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["chat_room", "created_at", "id"],
+                name="message_room_created_idx",
+            ),
+        ),
+    ]
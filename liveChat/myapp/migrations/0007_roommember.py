@@ -0,0 +1,85 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+JOINED_SUFFIX = " joined the room."
+
+
+def backfill_room_members(apps, schema_editor):
+    """기존 입장 메시지로 참여자 목록을 채웁니다."""
+    Message = apps.get_model("myapp", "Message")
+    RoomMember = apps.get_model("myapp", "RoomMember")
+    joined = (
+        Message.objects.filter(content__endswith=JOINED_SUFFIX)
+        .values_list("chat_room_id", "content")
+        .iterator(chunk_size=2000)
+    )
+    members = {
+        (chat_room_id, content[: -len(JOINED_SUFFIX)])
+        for chat_room_id, content in joined
+        if len(content) - len(JOINED_SUFFIX) <= 150
+    }
+    RoomMember.objects.bulk_create(
+        [
+            RoomMember(chat_room_id=chat_room_id, identity=identity)
+            for chat_room_id, identity in members
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0006_message_room_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomMember",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("identity", models.CharField(max_length=150)),
+                (
+                    "joined_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "chat_room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="myapp.chatroom"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("chat_room", "identity"), name="unique_room_member"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_room_members, migrations.RunPython.noop),
+    ]
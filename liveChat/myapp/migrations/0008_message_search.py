@@ -0,0 +1,70 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:10
+
+from django.db import migrations
+
+# SQLite: 메시지 테이블을 원본으로 하는 FTS5 external content 테이블과 동기화 트리거
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE myapp_message_fts USING fts5(
+        content, content='myapp_message', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER myapp_message_fts_insert AFTER INSERT ON myapp_message BEGIN
+        INSERT INTO myapp_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER myapp_message_fts_delete AFTER DELETE ON myapp_message BEGIN
+        INSERT INTO myapp_message_fts(myapp_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER myapp_message_fts_update AFTER UPDATE OF content ON myapp_message BEGIN
+        INSERT INTO myapp_message_fts(myapp_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO myapp_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    # 기존 메시지로 인덱스를 채웁니다.
+    "INSERT INTO myapp_message_fts(myapp_message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS myapp_message_fts_update",
+    "DROP TRIGGER IF EXISTS myapp_message_fts_delete",
+    "DROP TRIGGER IF EXISTS myapp_message_fts_insert",
+    "DROP TABLE IF EXISTS myapp_message_fts",
+]
+
+# MySQL: InnoDB FULLTEXT 인덱스는 행이 추가/삭제될 때 자동으로 갱신됩니다.
+# ngram parser는 공백으로 단어를 나누지 않는 한국어도 검색할 수 있게 합니다.
+MYSQL_FORWARDS = [
+    "ALTER TABLE myapp_message ADD FULLTEXT INDEX message_content_fts (content) WITH PARSER ngram",
+]
+
+MYSQL_BACKWARDS = [
+    "ALTER TABLE myapp_message DROP INDEX message_content_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0007_roommember"),
+    ]
+
+    operations = [
+        # 데이터베이스 종류마다 다른 전문 검색 인덱스를 만듭니다. (그 외 데이터베이스는 인덱스 없이 검색합니다)
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARDS, "mysql": MYSQL_FORWARDS}),
+            run({"sqlite": SQLITE_BACKWARDS, "mysql": MYSQL_BACKWARDS}),
+        ),
+    ]
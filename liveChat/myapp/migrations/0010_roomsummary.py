@@ -0,0 +1,97 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+PREVIEW_LENGTH = 100
+
+
+def backfill_room_summaries(apps, schema_editor):
+    """기존 채팅방의 요약을 만듭니다. (접속자 수는 0에서 시작합니다)"""
+    ChatRoom = apps.get_model("myapp", "ChatRoom")
+    Message = apps.get_model("myapp", "Message")
+    MessageArchive = apps.get_model("myapp", "MessageArchive")
+    RoomSummary = apps.get_model("myapp", "RoomSummary")
+
+    counts = dict(
+        Message.objects.values("chat_room_id")
+        .annotate(count=models.Count("id"))
+        .values_list("chat_room_id", "count")
+    )
+    for chat_room_id, count in (
+        MessageArchive.objects.values("chat_room_id")
+        .annotate(count=models.Sum("message_count"))
+        .values_list("chat_room_id", "count")
+    ):
+        counts[chat_room_id] = counts.get(chat_room_id, 0) + count
+
+    last_messages = ChatRoom.objects.annotate(
+        last_message_id=models.Subquery(
+            Message.objects.filter(chat_room=models.OuterRef("pk"))
+            .order_by("-created_at", "-id")
+            .values("id")[:1]
+        )
+    ).values_list("id", "last_message_id")
+    now = django.utils.timezone.now()
+    rooms = list(last_messages)
+    summaries = []
+    for start in range(0, len(rooms), 1000):
+        chunk = rooms[start : start + 1000]
+        messages = Message.objects.only("content", "created_at").in_bulk(
+            [last_message_id for _, last_message_id in chunk if last_message_id]
+        )
+        for chat_room_id, last_message_id in chunk:
+            summary = RoomSummary(
+                chat_room_id=chat_room_id,
+                message_count=counts.get(chat_room_id, 0),
+                last_activity_at=now,
+            )
+            message = messages.get(last_message_id)
+            if message is not None:
+                summary.last_message = message.content[:PREVIEW_LENGTH]
+                summary.last_message_at = summary.last_activity_at = message.created_at
+            summaries.append(summary)
+    RoomSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0009_messagearchive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomSummary",
+            fields=[
+                (
+                    "chat_room",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="myapp.chatroom",
+                    ),
+                ),
+                ("last_message", models.CharField(blank=True, max_length=100)),
+                ("last_message_at", models.DateTimeField(blank=True, null=True)),
+                ("message_count", models.PositiveIntegerField(default=0)),
+                ("online_count", models.PositiveIntegerField(default=0)),
+                (
+                    "last_activity_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["-last_activity_at", "-chat_room"],
+                        name="summary_activity_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_room_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_message_seq(apps, schema_editor):
+    # 기존 메시지에 채팅방별로 (created_at, id) 순서대로 1부터 seq를 매깁니다.
+    ChatRoom = apps.get_model("myapp", "ChatRoom")
+    Message = apps.get_model("myapp", "Message")
+    for chat_room_id in ChatRoom.objects.values_list("id", flat=True).iterator():
+        batch = []
+        queryset = Message.objects.filter(chat_room_id=chat_room_id).order_by("created_at", "id")
+        for seq, message in enumerate(queryset.only("id").iterator(chunk_size=BATCH_SIZE), start=1):
+            message.seq = seq
+            batch.append(message)
+            if len(batch) >= BATCH_SIZE:
+                Message.objects.bulk_update(batch, ["seq"])
+                batch = []
+        if batch:
+            Message.objects.bulk_update(batch, ["seq"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0011_readmark"),
+    ]
+
+    operations = [
+        # null을 허용하는 열은 SQLite에서도 테이블을 다시 만들지 않고 추가되므로
+        # 0008의 전문 검색 트리거가 그대로 유지됩니다.
+        migrations.AddField(
+            model_name="message",
+            name="seq",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["chat_room", "seq"], name="message_room_seq_idx"),
+        ),
+        migrations.RunPython(backfill_message_seq, migrations.RunPython.noop),
+    ]
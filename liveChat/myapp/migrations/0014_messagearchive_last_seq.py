@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:20
+
+import gzip
+import json
+
+from django.db import migrations, models
+
+
+def backfill_last_seq(apps, schema_editor):
+    # 기존 보관 데이터의 가장 큰 seq를 채웁니다. (seq가 생기기 전에 보관된 메시지는 0)
+    MessageArchive = apps.get_model("myapp", "MessageArchive")
+    for archive in MessageArchive.objects.iterator(chunk_size=100):
+        lines = gzip.decompress(bytes(archive.data)).decode("utf-8").splitlines()
+        archive.last_seq = max((json.loads(line).get("seq") or 0 for line in lines), default=0)
+        archive.save(update_fields=["last_seq"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0013_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="messagearchive",
+            name="last_seq",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_seq, migrations.RunPython.noop),
+    ]
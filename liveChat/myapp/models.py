@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 
@@ -15,7 +16,18 @@ class Message(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # write-behind 버퍼로 늦게 저장되더라도 메시지를 보낸 시각을 유지하기 위해 default를 사용합니다.
+    created_at = models.DateTimeField(default=timezone.now)
+    # 채팅방 안에서의 순번 (myapp/sequence.py에서 발급). 재연결한 클라이언트에 놓친 메시지만 다시 보내는 데 사용합니다.
+    seq = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # 채팅방별 keyset 페이지네이션 (chat_room_id, created_at, id) 순서와 같은 복합 인덱스
+            models.Index(fields=['chat_room', 'created_at', 'id'], name='message_room_created_idx'),
+            # 재연결할 때 seq 범위 조회와 채팅방의 가장 큰 seq 조회
+            models.Index(fields=['chat_room', 'seq'], name='message_room_seq_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}: {self.content[:20]}"
@@ -27,3 +39,92 @@ class Message(models.Model):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+
+class RoomMember(models.Model):
+    """채팅방 참여자 모델 (입장 메시지 중복 방지용)"""
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+    # 로그인 사용자는 username, 익명 사용자는 익명 ID
+    identity = models.CharField(max_length=150)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    joined_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chat_room', 'identity'], name='unique_room_member'),
+        ]
+
+    def __str__(self):
+        return f"{self.identity} in {self.chat_room.name}"
+
+class MessageArchive(models.Model):
+    """보관 기간이 지난 메시지를 채팅방별, 날짜별로 압축해 보관하는 모델
+
+    data는 메시지를 한 줄에 하나씩 JSON으로 쓴 NDJSON을 gzip으로 압축한 것입니다. (myapp/archive.py)
+    """
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+    day = models.DateField()
+    data = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    # 보관된 메시지 중 가장 큰 seq. 채팅방의 메시지를 모두 보관해도 seq가 1부터 다시 시작하지 않게 합니다.
+    last_seq = models.PositiveBigIntegerField(default=0)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chat_room', 'day'], name='unique_room_archive_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_room.name} {self.day} ({self.message_count} messages)"
+
+class RoomSummary(models.Model):
+    """채팅방 목록에 보여줄 채팅방별 요약 (메시지를 저장하거나 접속자가 바뀔 때 갱신합니다)
+
+    채팅방 목록에서 방마다 집계 쿼리를 실행하지 않도록 마지막 메시지, 메시지 수, 접속자 수를 미리 저장합니다.
+    """
+    chat_room = models.OneToOneField(ChatRoom, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    last_message = models.CharField(max_length=100, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    online_count = models.PositiveIntegerField(default=0)
+    # 채팅방 목록 정렬 기준 (마지막 메시지 시각, 메시지가 없으면 채팅방을 만든 시각)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # 채팅방 목록 keyset 페이지네이션 (last_activity_at, chat_room_id) 역순
+            models.Index(fields=['-last_activity_at', '-chat_room'], name='summary_activity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_room.name} summary"
+
+class ReadMark(models.Model):
+    """사용자가 채팅방에서 어디까지 읽었는지 나타내는 읽음 위치 (사용자, 채팅방마다 한 행)
+
+    메시지마다 읽음 행을 만들지 않고 마지막으로 읽은 메시지 시각만 저장합니다.
+    안 읽은 메시지 수는 (chat_room_id, created_at) 인덱스의 범위 개수로 계산합니다. (myapp/read_state.py)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+    last_read_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chat_room'], name='unique_read_mark'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} read {self.chat_room.name} until {self.last_read_at}"
+
+class Counter(models.Model):
+    """이름별 정수 카운터 (익명 ID처럼 여러 워커가 겹치지 않게 번호를 발급할 때 사용합니다)
+
+    번호는 카운터를 한 번 올릴 때 블록 단위로 예약합니다. (myapp/anonymous.py)
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
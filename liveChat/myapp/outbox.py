@@ -0,0 +1,111 @@
+import asyncio
+from collections import deque
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+from .utils.logging_helpers import log_error, log_warning
+
+# 큐가 가득 찼을 때의 정책
+DROP_OLDEST = 'drop_oldest'  # 가장 오래된 메시지를 버리고 새 메시지를 넣습니다.
+DROP_NEWEST = 'drop_newest'  # 새 메시지를 버립니다.
+DISCONNECT = 'disconnect'  # 연결을 끊습니다.
+POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+class ConnectionOutbox:
+    """연결마다 하나씩 두는 크기 제한 송신 큐
+
+    put()은 큐에 넣기만 하고 바로 끝나며, 실제 전송은 연결마다 하나씩 있는 writer 태스크가 합니다.
+    느린 클라이언트는 자기 큐만 채우므로 같은 방의 다른 연결로 보내는 것이 늦어지지 않습니다.
+
+    window가 있으면 첫 메시지부터 window 초 동안(또는 max_batch개가 모일 때까지) 기다렸다가
+    모인 메시지를 한 번에 send()로 넘깁니다.
+    """
+
+    def __init__(self, send, max_size=256, policy=DROP_OLDEST, window=0, max_batch=64, name=''):
+        if policy not in POLICIES:
+            raise ImproperlyConfigured(f"Unknown send queue policy '{policy}'. Choose one of {', '.join(POLICIES)}.")
+        self.send = send  # 메시지 목록을 받아 소켓으로 보내는 코루틴 함수
+        self.max_size = max_size
+        self.policy = policy
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self.queue = deque()
+        self.dropped = 0
+        self.sent = 0
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    def __len__(self):
+        return len(self.queue)
+
+    def put(self, message):
+        """메시지를 큐에 넣습니다. 큐가 가득 찼고 정책이 disconnect이면 False를 반환합니다.
+
+        큐가 가득 차면 정책과 관계없이 low_priority 메시지부터 버립니다.
+        """
+        if len(self.queue) >= self.max_size:
+            if getattr(message, 'low_priority', False):
+                self._drop()
+                return True
+            if self._drop_low_priority():
+                self._drop()
+            else:
+                if self.policy == DISCONNECT:
+                    return False
+                if not self.dropped:
+                    log_warning("Send queue of %s is full, dropping messages (%s)", self.name, self.policy)
+                self._drop()
+                if self.policy == DROP_NEWEST:
+                    return True
+                self.queue.popleft()
+        self.queue.append(message)
+        self._ready.set()
+        if len(self.queue) >= self.max_batch:
+            self._full.set()
+        return True
+
+    def _drop(self):
+        self.dropped += 1
+        metrics.MESSAGES_DROPPED.inc()
+
+    def _drop_low_priority(self):
+        # 가장 오래된 low_priority 메시지를 큐에서 뺍니다. (큐가 가득 찼을 때만 훑습니다)
+        for index, queued in enumerate(self.queue):
+            if getattr(queued, 'low_priority', False):
+                del self.queue[index]
+                return True
+        return False
+
+    def stats(self):
+        return {'queue_depth': len(self.queue), 'dropped': self.dropped, 'sent': self.sent}
+
+    def close(self):
+        """writer 태스크를 멈추고 남은 메시지를 버립니다."""
+        self._writer.cancel()
+        self.queue.clear()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            if self.window and len(self.queue) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+            if len(self.queue) < self.max_batch:
+                self._full.clear()
+            if not self.queue:
+                self._ready.clear()
+            if not batch:
+                continue
+            try:
+                with metrics.SEND_SECONDS.time():
+                    await self.send(batch)
+                self.sent += len(batch)
+            except Exception as e:
+                log_error("Error sending to %s: %s", self.name, e)
@@ -0,0 +1,243 @@
+import functools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'myapp.presence.LocalPresenceRegistry'
+
+
+class BasePresenceRegistry:
+    """채팅방별 접속자(room, identity) 레지스트리의 기본 클래스
+
+    같은 사용자가 여러 탭으로 접속할 수 있으므로 identity마다 연결 수를 셉니다.
+    """
+
+    def connect(self, room_id, identity):
+        """연결을 추가합니다. identity의 첫 연결이면 True를 반환합니다."""
+        raise NotImplementedError
+
+    def disconnect(self, room_id, identity):
+        """연결을 제거합니다. identity의 마지막 연결이었으면 True를 반환합니다."""
+        raise NotImplementedError
+
+    def leave(self, room_id, identity):
+        """identity의 모든 연결을 제거합니다. (채팅방 나가기)"""
+        raise NotImplementedError
+
+    def online_users(self, room_id):
+        """접속 중인 identity 목록을 반환합니다."""
+        raise NotImplementedError
+
+    def is_online(self, room_id, identity):
+        return identity in self.online_users(room_id)
+
+    def online_count(self, room_id):
+        return len(self.online_users(room_id))
+
+    # 연결이 살아 있다는 것을 알리는 주기 (None이면 갱신하지 않아도 되는 레지스트리)
+    refresh_interval = None
+
+    def refresh(self, room_id, identity):
+        """identity의 연결이 아직 살아 있으므로 만료 시간을 갱신합니다."""
+
+    async def aconnect(self, room_id, identity):
+        return self.connect(room_id, identity)
+
+    async def adisconnect(self, room_id, identity):
+        return self.disconnect(room_id, identity)
+
+    async def aleave(self, room_id, identity):
+        self.leave(room_id, identity)
+
+    async def aonline_count(self, room_id):
+        return self.online_count(room_id)
+
+    async def arefresh(self, room_id, identity):
+        self.refresh(room_id, identity)
+
+
+class LocalPresenceRegistry(BasePresenceRegistry):
+    """프로세스 메모리에 접속자를 보관하는 레지스트리 (워커가 하나일 때나 테스트용)"""
+
+    def __init__(self):
+        self._rooms = {}  # room_id -> Counter(identity -> 연결 수)
+        self._lock = threading.Lock()
+
+    def connect(self, room_id, identity):
+        with self._lock:
+            connections = self._rooms.setdefault(room_id, Counter())
+            connections[identity] += 1
+            return connections[identity] == 1
+
+    def disconnect(self, room_id, identity):
+        with self._lock:
+            connections = self._rooms.get(room_id)
+            if not connections or identity not in connections:
+                return False
+            connections[identity] -= 1
+            if connections[identity] > 0:
+                return False
+            del connections[identity]
+            if not connections:
+                del self._rooms[room_id]
+            return True
+
+    def leave(self, room_id, identity):
+        with self._lock:
+            connections = self._rooms.get(room_id)
+            if connections:
+                connections.pop(identity, None)
+                if not connections:
+                    del self._rooms[room_id]
+
+    def online_users(self, room_id):
+        with self._lock:
+            return list(self._rooms.get(room_id, ()))
+
+    def is_online(self, room_id, identity):
+        with self._lock:
+            return identity in self._rooms.get(room_id, ())
+
+    def online_count(self, room_id):
+        with self._lock:
+            return len(self._rooms.get(room_id, ()))
+
+
+class DjangoCachePresenceRegistry(BasePresenceRegistry):
+    """Django 캐시(Redis 등)에 접속자를 보관하는 레지스트리 (여러 워커가 공유)
+
+    identity마다 연결 수를 별도의 키에 두고 add/incr/decr로 원자적으로 바꾸므로, 여러 워커가 동시에
+    연결하거나 끊어도 첫 연결과 마지막 연결을 한 번씩만 알립니다. 방의 접속자 목록은 첫 연결과
+    마지막 연결 때만 방 잠금(cache.add) 안에서 바꿉니다.
+    연결이 살아 있는 동안 consumer가 refresh_interval마다 만료 시간을 갱신하므로, 워커가 비정상 종료되어
+    갱신이 멈춘 연결만 timeout이 지나면 사라집니다.
+    """
+
+    def __init__(self, cache_alias='default', timeout=3600, key_prefix='presence', lock_timeout=5):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.lock_timeout = lock_timeout
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def refresh_interval(self):
+        return self.timeout / 3
+
+    def make_key(self, room_id):
+        return f'{self.key_prefix}:{room_id}'
+
+    def make_count_key(self, room_id, identity):
+        return f'{self.key_prefix}:{room_id}:count:{identity}'
+
+    @contextmanager
+    def room_lock(self, room_id):
+        # 잠금을 가진 워커가 죽어도 lock_timeout이 지나면 키가 만료되어 다시 얻을 수 있습니다.
+        key = f'{self.make_key(room_id)}:lock'
+        while not self.cache.add(key, 1, self.lock_timeout):
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            self.cache.delete(key)
+
+    def connect(self, room_id, identity):
+        key = self.make_count_key(room_id, identity)
+        if self.cache.add(key, 1, self.timeout):
+            count = 1
+        else:
+            try:
+                count = self.cache.incr(key)
+            except ValueError:
+                # add와 incr 사이에 키가 만료되었으면 처음부터 다시 합니다.
+                return self.connect(room_id, identity)
+            self.cache.touch(key, self.timeout)
+        if count != 1:
+            return False
+        self.update_members(room_id, identity)
+        return True
+
+    def disconnect(self, room_id, identity):
+        key = self.make_count_key(room_id, identity)
+        try:
+            count = self.cache.decr(key)
+        except ValueError:
+            return False
+        if count < 0:
+            # leave로 이미 지운 identity의 연결이 끊긴 경우
+            self.cache.incr(key)
+            return False
+        if count > 0:
+            return False
+        self.update_members(room_id, identity)
+        return True
+
+    def leave(self, room_id, identity):
+        self.cache.set(self.make_count_key(room_id, identity), 0, self.timeout)
+        self.update_members(room_id, identity)
+
+    def update_members(self, room_id, identity):
+        """identity의 연결 수에 맞춰 방의 접속자 목록을 고칩니다. (연결 수가 0이 되었거나 0에서 늘어난 경우)"""
+        key = self.make_key(room_id)
+        with self.room_lock(room_id):
+            # 잠금을 기다리는 동안 다른 워커가 연결 수를 바꿀 수 있으므로 잠금 안에서 연결 수를 다시 읽습니다.
+            members = self.cache.get(key) or []
+            if identity not in members:
+                members.append(identity)
+            members = self._online(room_id, members)
+            self.cache.set(key, members, self.timeout)
+
+    def _online(self, room_id, members):
+        # 연결 수가 0이거나 갱신이 멈춰 만료된 identity는 뺍니다.
+        keys = {identity: self.make_count_key(room_id, identity) for identity in members}
+        counts = self.cache.get_many(keys.values())
+        return [identity for identity in members if counts.get(keys[identity], 0) > 0]
+
+    def refresh(self, room_id, identity):
+        self.cache.touch(self.make_count_key(room_id, identity), self.timeout)
+        self.cache.touch(self.make_key(room_id), self.timeout)
+
+    def online_users(self, room_id):
+        return self._online(room_id, self.cache.get(self.make_key(room_id)) or [])
+
+    # 캐시 서버와 통신하는 동안 이벤트 루프가 멈추지 않도록 스레드에서 실행합니다.
+    async def aconnect(self, room_id, identity):
+        return await sync_to_async(self.connect)(room_id, identity)
+
+    async def adisconnect(self, room_id, identity):
+        return await sync_to_async(self.disconnect)(room_id, identity)
+
+    async def aleave(self, room_id, identity):
+        await sync_to_async(self.leave)(room_id, identity)
+
+    async def aonline_count(self, room_id):
+        return await sync_to_async(self.online_count)(room_id)
+
+    async def arefresh(self, room_id, identity):
+        await sync_to_async(self.refresh)(room_id, identity)
+
+
+@functools.cache
+def get_presence_registry():
+    """설정(CHAT_PRESENCE)에 지정된 접속자 레지스트리를 반환합니다."""
+    config = getattr(settings, 'CHAT_PRESENCE', {})
+    backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_presence_registry(*, setting, **kwargs):
+    # 테스트에서 override_settings로 설정을 바꾸면 레지스트리를 다시 만듭니다.
+    if setting == 'CHAT_PRESENCE':
+        get_presence_registry.cache_clear()
@@ -0,0 +1,140 @@
+import functools
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'myapp.ratelimit.LocalRateLimiter'
+
+# (초당 채워지는 토큰 수, 최대 토큰 수(버스트))
+DEFAULT_RATES = {
+    'user': (5, 20),
+    'anonymous': (2, 10),
+    'room': (100, 300),
+}
+
+
+def refill(tokens, updated, now, rate, burst):
+    """마지막 갱신 이후 흐른 시간만큼 토큰을 채웁니다."""
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class BaseRateLimiter:
+    """토큰 버킷 rate limiter의 기본 클래스"""
+
+    def consume(self, key, rate, burst, cost=1):
+        """토큰을 사용합니다. 허용되면 0, 아니면 다시 시도할 수 있을 때까지의 초를 반환합니다."""
+        raise NotImplementedError
+
+    async def aconsume(self, key, rate, burst, cost=1):
+        return self.consume(key, rate, burst, cost)
+
+
+class LocalRateLimiter(BaseRateLimiter):
+    """프로세스 메모리에 버킷을 보관하는 rate limiter (워커마다 따로 셉니다)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        # 1분 넘게 사용되지 않은 버킷은 이미 가득 찼다고 보고 제거합니다.
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if now - updated > 60:
+                del self._buckets[key]
+
+
+class DjangoCacheRateLimiter(BaseRateLimiter):
+    """Django 캐시(Redis 등)에 버킷을 보관하는 rate limiter (여러 워커가 공유)
+
+    읽고 쓰는 사이에 다른 워커가 토큰을 사용하면 한도보다 조금 더 허용될 수 있습니다.
+    """
+
+    def __init__(self, cache_alias='default', key_prefix='ratelimit'):
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def consume(self, key, rate, burst, cost=1):
+        now = time.time()
+        cache_key = f'{self.key_prefix}:{key}'
+        tokens, updated = self.cache.get(cache_key) or (burst, now)
+        tokens = refill(tokens, updated, now, rate, burst)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        # 버킷이 가득 찰 때까지만 보관합니다.
+        self.cache.set(cache_key, (tokens, now), math.ceil((burst - tokens) / rate) + 1)
+        return 0 if allowed else (cost - tokens) / rate
+
+    async def aconsume(self, key, rate, burst, cost=1):
+        return await sync_to_async(self.consume)(key, rate, burst, cost)
+
+
+@functools.cache
+def get_rate_limiter():
+    """설정(CHAT_RATE_LIMITS)에 지정된 rate limiter를 반환합니다."""
+    config = getattr(settings, 'CHAT_RATE_LIMITS', {})
+    backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_rate_limiter(*, setting, **kwargs):
+    # 테스트에서 override_settings로 설정을 바꾸면 rate limiter를 다시 만듭니다.
+    if setting == 'CHAT_RATE_LIMITS':
+        get_rate_limiter.cache_clear()
+
+
+def get_rate(scope):
+    return {**DEFAULT_RATES, **getattr(settings, 'CHAT_RATE_LIMITS', {}).get('RATES', {})}[scope]
+
+
+def message_rate_keys(sender_key, room_id):
+    """메시지 하나에 사용할 (버킷 키, 한도) 목록. sender_key는 'user:<id>' 또는 'anonymous:<세션>'입니다."""
+    return [
+        (sender_key, get_rate(sender_key.split(':', 1)[0])),
+        (f'room:{room_id}', get_rate('room')),
+    ]
+
+
+def check_message_rate(sender_key, room_id):
+    """보낸 사람과 채팅방의 버킷에서 토큰을 사용합니다. 한도를 넘으면 다시 시도할 수 있을 때까지의 초를 반환합니다."""
+    limiter = get_rate_limiter()
+    for key, (rate, burst) in message_rate_keys(sender_key, room_id):
+        retry_after = limiter.consume(key, rate, burst)
+        if retry_after:
+            return retry_after
+    return 0
+
+
+async def acheck_message_rate(sender_key, room_id):
+    limiter = get_rate_limiter()
+    for key, (rate, burst) in message_rate_keys(sender_key, room_id):
+        retry_after = await limiter.aconsume(key, rate, burst)
+        if retry_after:
+            return retry_after
+    return 0
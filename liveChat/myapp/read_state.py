@@ -0,0 +1,150 @@
+import asyncio
+import atexit
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+
+from .models import Message, ReadMark
+from .utils.logging_helpers import log_error
+
+
+class ReadMarkBuffer:
+    """읽음 위치 갱신을 모아 두었다가 한 번에 저장하는 버퍼
+
+    스크롤하면서 ack를 자주 보내도 (사용자, 채팅방)마다 가장 늦은 시각만 남기고
+    flush_interval마다 한 번만 저장하므로, 메시지마다 쓰기가 일어나지 않습니다.
+    """
+
+    def __init__(self, flush_interval=2.0, max_pending=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def clear(self):
+        self._pending = {}
+
+    def pending(self, user_id, chat_room_id):
+        """아직 저장하지 않은 읽음 위치 (없으면 None)"""
+        return self._pending.get((user_id, chat_room_id))
+
+    async def mark(self, user_id, chat_room_id, read_at):
+        """읽음 위치를 기록합니다. 이미 기록한 위치보다 앞선 위치는 무시합니다."""
+        key = (user_id, chat_room_id)
+        current = self._pending.get(key)
+        if current is None or read_at > current:
+            self._pending[key] = read_at
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    async def flush(self):
+        """모아 둔 읽음 위치를 모두 저장합니다."""
+        marks, self._pending = self._pending, {}
+        if marks:
+            await database_sync_to_async(self._write)(marks)
+
+    def flush_sync(self):
+        """이벤트 루프 밖(프로세스 종료 시)에서 남은 읽음 위치를 저장합니다."""
+        marks, self._pending = self._pending, {}
+        if marks:
+            self._write(marks)
+
+    def _schedule_flush(self):
+        # 타이머가 이미 돌고 있으면 새로 만들지 않습니다. (MessageWriteBuffer와 같은 방식)
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and not self._timer.done() and self._timer.get_loop() is loop:
+            return
+        self._timer = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def _write(self, marks):
+        try:
+            save_read_marks(marks)
+        except Exception as e:
+            log_error("Failed to save %d read marks: %s", len(marks), e)
+
+
+def save_read_marks(marks, batch_size=500):
+    """{(user_id, chat_room_id): read_at}을 저장합니다.
+
+    없는 읽음 위치는 INSERT(충돌 무시)로 만들고, 있는 읽음 위치는 UPDATE 한 번으로 앞으로만 옮깁니다.
+    앞으로 움직이는지는 UPDATE의 WHERE에서 확인하므로 여러 워커가 동시에 저장해도 읽음 위치가 되돌아가지 않습니다.
+    (다른 기기에서 더 뒤까지 읽었으면 되돌리지 않습니다)
+    """
+    items = list(marks.items())
+    with transaction.atomic():
+        ReadMark.objects.bulk_create(
+            [ReadMark(user_id=user_id, chat_room_id=chat_room_id, last_read_at=read_at) for (user_id, chat_room_id), read_at in items],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            # 행마다 조건이 하나만 맞으므로 맞은 조건의 시각으로 바꿉니다.
+            advance = Q()
+            for (user_id, chat_room_id), read_at in batch:
+                advance |= Q(user_id=user_id, chat_room_id=chat_room_id, last_read_at__lt=read_at)
+            ReadMark.objects.filter(advance).update(last_read_at=Case(
+                *[
+                    When(user_id=user_id, chat_room_id=chat_room_id, then=Value(read_at))
+                    for (user_id, chat_room_id), read_at in batch
+                ],
+                default=F('last_read_at'),
+            ))
+
+
+def get_unread_counts(user_id, chat_room_ids):
+    """채팅방별 안 읽은 메시지 수를 {chat_room_id: 개수}로 반환합니다. (쿼리 최대 2개)
+
+    읽음 위치가 있는 채팅방만 계산합니다. 채팅방마다 (chat_room_id, created_at) 인덱스의
+    범위 하나를 세므로 비용은 전체 메시지 수가 아니라 안 읽은 메시지 수에 비례합니다.
+    """
+    marks = dict(
+        ReadMark.objects.filter(user_id=user_id, chat_room_id__in=chat_room_ids).values_list('chat_room_id', 'last_read_at')
+    )
+    # 아직 저장하지 않은 읽음 위치도 반영합니다.
+    for chat_room_id in chat_room_ids:
+        pending = read_mark_buffer.pending(user_id, chat_room_id)
+        if pending is not None and (marks.get(chat_room_id) is None or pending > marks[chat_room_id]):
+            marks[chat_room_id] = pending
+    if not marks:
+        return {}
+
+    condition = Q()
+    for chat_room_id, last_read_at in marks.items():
+        condition |= Q(chat_room_id=chat_room_id, created_at__gt=last_read_at)
+    counts = dict.fromkeys(marks, 0)
+    counts.update(
+        Message.objects.filter(condition).order_by().values('chat_room_id').annotate(count=Count('id')).values_list('chat_room_id', 'count')
+    )
+    return counts
+
+
+async def aget_unread_counts(user_id, chat_room_ids):
+    return await sync_to_async(get_unread_counts)(user_id, chat_room_ids)
+
+
+def _build_read_mark_buffer():
+    config = getattr(settings, 'CHAT_READ_MARKS', {})
+    return ReadMarkBuffer(
+        flush_interval=config.get('FLUSH_INTERVAL', 2.0),
+        max_pending=config.get('MAX_PENDING', 1000),
+    )
+
+
+# 프로세스마다 하나의 버퍼를 공유합니다.
+read_mark_buffer = _build_read_mark_buffer()
+
+# 프로세스가 종료될 때 남아 있는 읽음 위치를 저장합니다.
+atexit.register(read_mark_buffer.flush_sync)
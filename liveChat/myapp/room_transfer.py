@@ -0,0 +1,153 @@
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from .archive import decode_entries, entry_key
+from .models import ChatRoom, Message, MessageArchive, RoomSummary
+from .summary import PREVIEW_LENGTH
+from .utils.logging_helpers import log_info
+
+# 내보내기 파일 형식 버전 (첫 줄의 room 헤더에 기록합니다)
+FORMAT_VERSION = 1
+
+
+def export_room(chat_room, out, chunk_size=2000):
+    """채팅방의 메시지 기록을 NDJSON으로 out(텍스트 스트림)에 씁니다. 내보낸 메시지 수를 반환합니다.
+
+    첫 줄은 채팅방 헤더이고, 그 뒤로 메시지가 한 줄에 하나씩 오래된 순으로 옵니다.
+    보관된 메시지(MessageArchive)는 하루치씩, 메시지 테이블은 iterator(chunk_size)로 읽으므로
+    메시지 수와 관계없이 메모리 사용량이 일정합니다.
+    """
+    out.write(json.dumps({'room': {
+        'name': chat_room.name,
+        'created_by': chat_room.created_by.username,
+        'version': FORMAT_VERSION,
+    }}, ensure_ascii=False) + '\n')
+
+    messages = Message.objects.filter(chat_room=chat_room).order_by('created_at', 'id')
+    first = messages.values_list('created_at', 'id').first()
+    exported = 0
+    for archive in MessageArchive.objects.filter(chat_room=chat_room).order_by('day').iterator(chunk_size=4):
+        # 보관 도중 멈춰 메시지 테이블에도 남아 있는 메시지는 메시지 테이블에서 내보냅니다.
+        entries = [entry for entry in decode_entries(archive.data) if first is None or entry_key(entry) < first]
+        out.writelines(format_line(entry['username'], entry['content'], entry['created_at']) for entry in entries)
+        exported += len(entries)
+
+    rows = messages.values_list('user__username', 'content', 'created_at').iterator(chunk_size=chunk_size)
+    for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+        out.writelines(format_line(username, content, created_at.isoformat()) for username, content, created_at in chunk)
+        exported += len(chunk)
+    log_info("Exported %d messages from chat room %s", exported, chat_room.id)
+    return exported
+
+
+def format_line(username, content, created_at):
+    # seq는 가져오는 쪽에서 새로 발급하므로 내보내지 않습니다.
+    return json.dumps({'username': username, 'content': content, 'created_at': created_at}, ensure_ascii=False) + '\n'
+
+
+def import_room(lines, name=None, owner=None, chunk_size=5000):
+    """export_room으로 내보낸 NDJSON 줄들을 새 채팅방으로 가져옵니다. (채팅방, 가져온 메시지 수, 찾지 못한 사용자 수)를 반환합니다.
+
+    chunk_size줄씩 읽어 트랜잭션 하나에서 bulk_create로 저장하므로 파일 크기와 관계없이 메모리 사용량이 일정합니다.
+    사용자는 username으로 이 데이터베이스의 사용자와 연결하고, 없는 사용자의 메시지는 사용자 없이(Anonymous) 저장합니다.
+    seq는 1부터 다시 발급하고 채팅방 요약(RoomSummary)은 청크마다 한 번에 갱신합니다.
+    형식이 잘못된 줄이 있으면 줄 번호와 함께 ValueError를 발생시키고, 만든 채팅방을 삭제하므로
+    일부만 가져온 채팅방이 남지 않습니다.
+    """
+    lines = iter(lines)
+    header = parse_header(next(lines, ''))
+    owner = owner or User.objects.filter(username=header['created_by']).first()
+    if owner is None:
+        raise ValueError(f"User '{header['created_by']}' does not exist; choose an owner for the chat room.")
+    name = name or header['name']
+    if ChatRoom.objects.filter(name=name).exists():
+        raise ValueError(f"Chat room '{name}' already exists; choose another name.")
+    chat_room = ChatRoom.objects.create(name=name, created_by=owner)
+
+    user_ids = {}  # username -> user_id (없는 사용자는 None)
+    numbered = enumerate(lines, start=2)  # 1번 줄은 헤더
+    imported = unmapped = 0
+    try:
+        for chunk in iter(lambda: list(islice(numbered, chunk_size)), []):
+            entries = [parse_entry(line, number) for number, line in chunk if line.strip()]
+            if not entries:
+                continue
+            usernames = {username for username, _, _ in entries if username and username not in user_ids}
+            if usernames:
+                found = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+                unmapped += len(usernames - found.keys())
+                user_ids.update(dict.fromkeys(usernames))
+                user_ids.update(found)
+            messages = [
+                Message(
+                    user_id=user_ids.get(username),
+                    chat_room_id=chat_room.id,
+                    content=content,
+                    created_at=created_at,
+                    seq=imported + index,
+                )
+                for index, (username, content, created_at) in enumerate(entries, start=1)
+            ]
+            with transaction.atomic():
+                # 검색 색인은 0008_message_search의 트리거가 행마다 함께 갱신합니다.
+                Message.objects.bulk_create(messages, batch_size=chunk_size)
+                # 메시지는 오래된 순이므로 청크의 마지막 메시지가 가장 최근 메시지입니다.
+                last = messages[-1]
+                RoomSummary.objects.filter(chat_room=chat_room).update(
+                    message_count=F('message_count') + len(messages),
+                    last_message=last.content[:PREVIEW_LENGTH],
+                    last_message_at=last.created_at,
+                    last_activity_at=last.created_at,
+                )
+            imported += len(messages)
+    except BaseException:
+        chat_room.delete()
+        raise
+    log_info("Imported %d messages into chat room %s (%d unknown users)", imported, chat_room.id, unmapped)
+    return chat_room, imported, unmapped
+
+
+def parse_header(line):
+    """첫 줄의 채팅방 헤더를 읽어 확인합니다. 형식이 잘못되면 ValueError를 발생시킵니다."""
+    try:
+        header = json.loads(line).get('room') if line.strip() else None
+    except (ValueError, AttributeError):
+        header = None
+    if not isinstance(header, dict):
+        raise ValueError('Line 1: the first line must be a room header.')
+    if header.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Line 1: unsupported export format version: {header.get('version')}")
+    for field in ('name', 'created_by'):
+        if not isinstance(header.get(field), str) or not header[field]:
+            raise ValueError(f"Line 1: the room header has no '{field}'.")
+    return header
+
+
+def parse_entry(line, number):
+    """메시지 한 줄을 (username, content, created_at)으로 읽습니다. 형식이 잘못되면 줄 번호와 함께 ValueError를 발생시킵니다."""
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f'Line {number}: invalid JSON ({e})')
+    if not isinstance(entry, dict):
+        raise ValueError(f'Line {number}: expected a message object.')
+    # 사용자 없는 메시지도 username을 null로 내보내므로 키가 없으면 잘못된 줄입니다.
+    if 'username' not in entry:
+        raise ValueError(f"Line {number}: 'username' is missing.")
+    username, content = entry['username'], entry.get('content')
+    if username is not None and not isinstance(username, str):
+        raise ValueError(f"Line {number}: 'username' must be a string or null.")
+    if not isinstance(content, str):
+        raise ValueError(f"Line {number}: 'content' is missing.")
+    try:
+        created_at = parse_datetime(entry.get('created_at') or '')
+    except (ValueError, TypeError):
+        created_at = None
+    if created_at is None:
+        raise ValueError(f"Line {number}: 'created_at' is missing or not an ISO 8601 datetime.")
+    return username, content, created_at
@@ -0,0 +1,98 @@
+import re
+
+from django.db import connection
+
+from .models import Message
+
+# 검색어에서 단어로 사용할 문자 (전문 검색 연산자와 따옴표 등은 버립니다)
+WORD_RE = re.compile(r'\w+')
+MAX_TERMS = 8
+
+
+def get_terms(query):
+    """검색어를 단어 목록으로 나눕니다."""
+    return WORD_RE.findall(query or '')[:MAX_TERMS]
+
+
+def encode_search_cursor(offset):
+    return str(offset)
+
+
+def decode_search_cursor(cursor):
+    """검색 결과 커서(다음 결과의 위치)를 정수로 변환합니다. 형식이 잘못되면 ValueError를 발생시킵니다."""
+    offset = int(cursor)
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    return offset
+
+
+def search_messages(query, chat_room_id=None, cursor=None, limit=20):
+    """메시지를 전문 검색합니다. chat_room_id가 없으면 모든 채팅방에서 검색합니다.
+
+    관련도 순으로 최대 limit개와 다음 페이지 커서를 반환합니다.
+    SQLite는 FTS5 테이블, MySQL은 FULLTEXT 인덱스를 사용하므로 검색 비용은 전체 메시지 수가 아니라
+    검색어가 들어 있는 메시지 수에 비례합니다. 그 외 데이터베이스는 인덱스 없이 최신순으로 검색합니다.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return [], None
+    offset = decode_search_cursor(cursor) if cursor else 0
+
+    # 다음 페이지가 있는지 알기 위해 limit보다 하나 더 가져옵니다.
+    if connection.vendor == 'sqlite':
+        ids = search_sqlite(terms, chat_room_id, offset, limit + 1)
+    elif connection.vendor == 'mysql':
+        ids = search_mysql(terms, chat_room_id, offset, limit + 1)
+    else:
+        ids = search_fallback(terms, chat_room_id, offset, limit + 1)
+
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    messages = Message.objects.select_related('user').in_bulk(ids)
+    results = [messages[message_id] for message_id in ids if message_id in messages]
+    return results, encode_search_cursor(offset + limit) if has_more else None
+
+
+def search_sqlite(terms, chat_room_id, offset, limit):
+    # 단어마다 접두어 검색("단어"*)을 하고, 모든 단어가 들어 있는 메시지만 찾습니다. bm25는 작을수록 관련도가 높습니다.
+    match = ' '.join('"{}"*'.format(term) for term in terms)
+    sql = (
+        'SELECT m.id FROM myapp_message_fts f JOIN myapp_message m ON m.id = f.rowid '
+        'WHERE myapp_message_fts MATCH %s'
+    )
+    params = [match]
+    if chat_room_id is not None:
+        sql += ' AND m.chat_room_id = %s'
+        params.append(chat_room_id)
+    sql += ' ORDER BY bm25(myapp_message_fts), m.id DESC LIMIT %s OFFSET %s'
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_mysql(terms, chat_room_id, offset, limit):
+    # BOOLEAN MODE에서 +단어는 반드시 포함해야 하는 단어입니다. (ngram parser가 단어를 n-gram으로 나눕니다)
+    against = ' '.join('+"{}"'.format(term) for term in terms)
+    sql = (
+        'SELECT id FROM myapp_message '
+        'WHERE MATCH(content) AGAINST (%s IN BOOLEAN MODE)'
+    )
+    params = [against]
+    if chat_room_id is not None:
+        sql += ' AND chat_room_id = %s'
+        params.append(chat_room_id)
+    sql += ' ORDER BY MATCH(content) AGAINST (%s IN BOOLEAN MODE) DESC, id DESC LIMIT %s OFFSET %s'
+    params += [against, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_fallback(terms, chat_room_id, offset, limit):
+    queryset = Message.objects.all()
+    if chat_room_id is not None:
+        queryset = queryset.filter(chat_room_id=chat_room_id)
+    for term in terms:
+        queryset = queryset.filter(content__icontains=term)
+    return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True)[offset:offset + limit])
@@ -0,0 +1,128 @@
+import functools
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models import Max
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Message, MessageArchive
+
+DEFAULT_BACKEND = 'myapp.sequence.LocalSequenceAllocator'
+
+
+def get_stored_seq(room_id):
+    # 저장된 메시지 중 가장 큰 seq ((chat_room_id, seq) 인덱스의 마지막 항목만 읽습니다)
+    stored = Message.objects.filter(chat_room_id=room_id).aggregate(seq=Max('seq'))['seq'] or 0
+    # 메시지를 모두 보관한 채팅방도 이어서 발급하도록 보관 데이터의 가장 큰 seq와 비교합니다.
+    archived = MessageArchive.objects.filter(chat_room_id=room_id).aggregate(seq=Max('last_seq'))['seq'] or 0
+    return max(stored, archived)
+
+
+class BaseSequenceAllocator:
+    """채팅방별 메시지 순번(seq)을 1부터 차례로 발급하는 allocator의 기본 클래스
+
+    클라이언트는 마지막으로 받은 seq로 다시 연결해 놓친 메시지만 받습니다. (ChatConsumer.replay)
+    처음 사용하는 채팅방은 저장된(보관된 것 포함) 메시지의 가장 큰 seq에서 이어서 발급합니다.
+    """
+
+    def allocate(self, room_id):
+        """다음 seq를 발급합니다."""
+        raise NotImplementedError
+
+    def current(self, room_id):
+        """마지막으로 발급한 seq (없으면 0)를 반환합니다."""
+        raise NotImplementedError
+
+    async def aallocate(self, room_id):
+        return await sync_to_async(self.allocate)(room_id)
+
+    async def acurrent(self, room_id):
+        return await sync_to_async(self.current)(room_id)
+
+
+class LocalSequenceAllocator(BaseSequenceAllocator):
+    """프로세스 메모리에서 seq를 발급하는 allocator (워커가 하나일 때나 테스트용)"""
+
+    def __init__(self):
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, room_id):
+        self._ensure(room_id)
+        with self._lock:
+            self._rooms[room_id] += 1
+            return self._rooms[room_id]
+
+    def current(self, room_id):
+        self._ensure(room_id)
+        return self._rooms[room_id]
+
+    async def aallocate(self, room_id):
+        # 이미 시작한 채팅방은 데이터베이스를 조회하지 않으므로 스레드로 넘기지 않습니다.
+        if room_id in self._rooms:
+            return self.allocate(room_id)
+        return await super().aallocate(room_id)
+
+    async def acurrent(self, room_id):
+        if room_id in self._rooms:
+            return self._rooms[room_id]
+        return await super().acurrent(room_id)
+
+    def _ensure(self, room_id):
+        if room_id in self._rooms:
+            return
+        # 락을 잡은 채로 쿼리하지 않습니다. 동시에 조회해도 먼저 넣은 값만 사용합니다.
+        stored = get_stored_seq(room_id)
+        with self._lock:
+            self._rooms.setdefault(room_id, stored)
+
+
+class DjangoCacheSequenceAllocator(BaseSequenceAllocator):
+    """Django 캐시(Redis 등)의 원자적 incr로 seq를 발급하는 allocator (여러 워커가 공유)
+
+    키가 없으면(캐시 재시작, 제거) 저장된 메시지의 가장 큰 seq로 다시 시작합니다.
+    이때 아직 쓰기 버퍼에 있는 메시지의 seq는 다시 발급될 수 있으므로 키가 제거되지 않는 캐시를 사용해야 합니다.
+    """
+
+    def __init__(self, cache_alias='default', key_prefix='seq'):
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, room_id):
+        return f'{self.key_prefix}:{room_id}'
+
+    def allocate(self, room_id):
+        key = self.make_key(room_id)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # 키가 없으면 만들고 다시 올립니다. (다른 워커가 먼저 만들었으면 add는 무시됩니다)
+            self.cache.add(key, get_stored_seq(room_id), None)
+            return self.cache.incr(key)
+
+    def current(self, room_id):
+        seq = self.cache.get(self.make_key(room_id))
+        return get_stored_seq(room_id) if seq is None else seq
+
+
+@functools.cache
+def get_sequence_allocator():
+    """설정(CHAT_SEQUENCE)에 지정된 seq allocator를 반환합니다."""
+    config = getattr(settings, 'CHAT_SEQUENCE', {})
+    backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_sequence_allocator(*, setting, **kwargs):
+    # 테스트에서 override_settings로 설정을 바꾸면 allocator를 다시 만듭니다.
+    if setting == 'CHAT_SEQUENCE':
+        get_sequence_allocator.cache_clear()
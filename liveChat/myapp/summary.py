@@ -0,0 +1,86 @@
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .history import decode_cursor, encode_cursor
+from .models import ChatRoom, RoomSummary
+from .presence import get_presence_registry
+
+# 채팅방 목록에 보여줄 마지막 메시지 길이 (RoomSummary.last_message의 max_length)
+PREVIEW_LENGTH = 100
+# 이름 접두어 검색의 상한 (접두어로 시작하는 이름은 모두 prefix 이상, prefix + U+FFFF 미만입니다)
+PREFIX_END = '\uffff'
+
+
+@receiver(post_save, sender=ChatRoom)
+def create_room_summary(sender, instance, created, raw=False, **kwargs):
+    # 채팅방을 만들면 요약도 함께 만듭니다.
+    if created and not raw:
+        RoomSummary.objects.get_or_create(chat_room=instance)
+
+
+def record_messages(messages):
+    """저장한 메시지를 채팅방 요약에 반영합니다. (채팅방마다 UPDATE 한 번)
+
+    버퍼에서 늦게 저장된 메시지가 더 최근 메시지를 덮어쓰지 않도록
+    마지막 메시지는 created_at이 더 늦을 때만 바꿉니다.
+    """
+    counts = Counter()
+    latest = {}
+    for message in messages:
+        counts[message.chat_room_id] += 1
+        last = latest.get(message.chat_room_id)
+        if last is None or message.created_at >= last.created_at:
+            latest[message.chat_room_id] = message
+
+    for chat_room_id, count in counts.items():
+        last = latest[chat_room_id]
+        newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=last.created_at)
+        RoomSummary.objects.filter(chat_room_id=chat_room_id).update(
+            message_count=F('message_count') + count,
+            last_message=Case(When(newer, then=Value(last.content[:PREVIEW_LENGTH])), default=F('last_message')),
+            last_message_at=Case(When(newer, then=Value(last.created_at)), default=F('last_message_at')),
+            last_activity_at=Case(When(newer, then=Value(last.created_at)), default=F('last_activity_at')),
+        )
+
+
+async def arecord_messages(messages):
+    await sync_to_async(record_messages)(messages)
+
+
+async def aupdate_online_count(chat_room_id):
+    """접속자 레지스트리의 접속자 수를 채팅방 요약에 저장합니다."""
+    online_count = await get_presence_registry().aonline_count(chat_room_id)
+    await RoomSummary.objects.filter(chat_room_id=chat_room_id).aupdate(online_count=online_count)
+
+
+def get_room_list_page_size():
+    return getattr(settings, 'CHAT_ROOM_LIST', {}).get('PAGE_SIZE', 50)
+
+
+def room_page_queryset(before=None, prefix='', limit=None):
+    """최근 활동 순 채팅방 목록 쿼리 (before 커서 다음부터, 다음 페이지가 있는지 알기 위해 limit + 1개)"""
+    queryset = RoomSummary.objects.select_related('chat_room')
+    if prefix:
+        # LIKE 대신 범위 조건을 사용해야 SQLite에서도 이름의 유니크 인덱스를 사용합니다.
+        queryset = queryset.filter(chat_room__name__gte=prefix, chat_room__name__lt=prefix + PREFIX_END)
+    if before:
+        last_activity_at, chat_room_id = decode_cursor(before)
+        queryset = queryset.filter(
+            Q(last_activity_at__lt=last_activity_at) | Q(last_activity_at=last_activity_at, chat_room_id__lt=chat_room_id)
+        )
+    return queryset.order_by('-last_activity_at', '-chat_room_id')[:limit + 1]
+
+
+async def aget_room_page(before=None, prefix='', limit=None):
+    """채팅방 요약을 최근 활동 순으로 한 페이지 가져옵니다. (요약 목록, 다음 페이지 커서)를 반환합니다."""
+    limit = limit or get_room_list_page_size()
+    page = [summary async for summary in room_page_queryset(before, prefix, limit)]
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = encode_cursor(page[-1].last_activity_at, page[-1].chat_room_id) if has_more else None
+    return page, next_cursor
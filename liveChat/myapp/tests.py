@@ -1,14 +1,76 @@
 import asyncio
-from django.test import TestCase, Client
+import gzip
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+import msgpack
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.template.base import Template
+from django.test import TestCase, TransactionTestCase, Client, override_settings, tag
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
 from django.urls import reverse
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .models import ChatRoom, Message
+from . import consumers, metrics
+from .anonymous import AnonymousIdAllocator
+from .announcements import JOINED, format_announcement, presence_announcer
+from .archive import archive_messages, decode_entries
+from .consumers import MSGPACK_SUBPROTOCOL, ChatConsumer
+from .fanout import PROCESS_ID, OutboundMessage, RoomFanout, encode_batch, get_fanout
+from .handshake import LocalHandshakeCache, get_handshake_cache
+from .history import aget_recent_messages, decode_cursor, get_message_page, get_messages_after, get_recent_messages, serialize_message
+from .message_buffer import MessageWriteBuffer, write_buffer
+from .message_cache import LocalRecentMessageStore, get_recent_message_store
+from .models import ChatRoom, Message, MessageArchive, ReadMark, RoomMember, RoomSummary
+from .outbox import DISCONNECT, DROP_NEWEST, DROP_OLDEST, ConnectionOutbox
+from .presence import DjangoCachePresenceRegistry, get_presence_registry
+from .ratelimit import LocalRateLimiter, get_rate_limiter
+from .read_state import ReadMarkBuffer, get_unread_counts, read_mark_buffer, save_read_marks
+from .room_transfer import import_room
+from .search import search_messages
+from .sequence import get_sequence_allocator
+from .summary import record_messages
+from .typing_indicator import TypingThrottle, typing_throttle
+from .utils.logging_helpers import JsonFormatter, QueueFileHandler, log_debug
+from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
 from liveChat.asgi import application
 
-class ChatRoomTests(TestCase):
+class ChatStateResetMixin:
+    """테스트마다 프로세스에 남는 채팅 상태(최근 메시지 캐시, 접속자, 전송 한도, seq, 버퍼 등)를 초기화합니다."""
+
+    def setUp(self):
+        super().setUp()
+        # 공유 백엔드(Django 캐시)는 캐시를 비우고, 프로세스 메모리 백엔드는 새로 만듭니다.
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        get_recent_message_store.cache_clear()
+        get_presence_registry.cache_clear()
+        get_rate_limiter.cache_clear()
+        get_sequence_allocator.cache_clear()
+        read_mark_buffer.clear()
+        presence_announcer.clear()
+        typing_throttle.clear()
+        get_handshake_cache.cache_clear()
+
+class ChatRoomTests(ChatStateResetMixin, TransactionTestCase):
     def setUp(self):
+        super().setUp()
         # 테스트 사용자 생성
         self.user = User.objects.create_user(username='testuser', password='testpassword')
         self.client = Client()
@@ -85,6 +147,1484 @@ class ChatRoomTests(TestCase):
 
         asyncio.run(async_test())
 
+    def test_asgi_module_imports_before_setup(self):
+        # 테스트 프로세스는 이미 django.setup()을 실행했으므로 새 프로세스에서 asgi.py를 import합니다. (daphne liveChat.asgi:application)
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'liveChat.test_settings'}
+        result = subprocess.run(
+            [sys.executable, '-c', 'import liveChat.asgi'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+class MessageWriteBufferTests(ChatStateResetMixin, TransactionTestCase):
+    """WebSocket 메시지 write-behind 버퍼에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    def test_websocket_messages_are_saved_on_disconnect(self):
+        # WebSocket으로 보낸 메시지가 연결 종료 시 저장되는지 테스트
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+
+            await communicator.send_json_to({'message': 'Hello, world!'})
+            response = await communicator.receive_json_from()
+            self.assertIn('created_at', response)
+
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+        message = Message.objects.get()
+        self.assertEqual(message.content, 'testuser: Hello, world!')
+        self.assertEqual(message.user, self.user)
+        self.assertEqual(message.chat_room, self.chat_room)
+
+    def test_buffer_flushes_on_batch_size(self):
+        # 배치 크기만큼 쌓이면 타이머를 기다리지 않고 저장되는지 테스트
+        buffer = MessageWriteBuffer(batch_size=3, flush_interval=60)
+
+        async def async_test():
+            for i in range(7):
+                await buffer.add(Message(user_id=self.user.id, chat_room_id=self.chat_room.id, content=f'message {i}'))
+            self.assertEqual(len(buffer), 1)
+            await buffer.flush()
+
+        asyncio.run(async_test())
+        self.assertEqual(Message.objects.filter(chat_room=self.chat_room).count(), 7)
+
+class RecentMessageStoreTests(ChatStateResetMixin, TransactionTestCase):
+    """채팅방별 최근 메시지 캐시에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    def test_ring_buffer_keeps_latest_messages(self):
+        # 방 용량을 넘으면 가장 오래된 메시지부터 버리는지 테스트
+        store = LocalRecentMessageStore(room_capacity=3)
+        store.prime(1, [], False)
+        for i in range(5):
+            store.append(1, {'content': f'message {i}'})
+        messages, has_older = store.get(1)
+        self.assertEqual([message['content'] for message in messages], ['message 2', 'message 3', 'message 4'])
+        self.assertTrue(has_older)
+        # 채워지지 않은 방에는 추가하지 않습니다.
+        store.append(2, {'content': 'message'})
+        self.assertIsNone(store.get(2))
+
+    def test_idle_rooms_are_evicted(self):
+        # 방 개수와 메모리 한도를 넘으면 가장 오래 사용되지 않은 방을 제거하는지 테스트
+        store = LocalRecentMessageStore(room_capacity=10, max_rooms=2)
+        store.prime(1, [], False)
+        store.prime(2, [], False)
+        store.get(1)
+        store.prime(3, [], False)
+        self.assertIsNotNone(store.get(1))
+        self.assertIsNone(store.get(2))
+
+        store = LocalRecentMessageStore(room_capacity=10, max_bytes=500)
+        store.prime(1, [{'content': 'a' * 300}], False)
+        store.prime(2, [{'content': 'b' * 300}], False)
+        self.assertIsNone(store.get(1))
+        self.assertLessEqual(store.total_bytes, 500)
+
+    @override_settings(CHAT_RECENT_MESSAGES={
+        'BACKEND': 'myapp.message_cache.DjangoCacheRecentMessageStore',
+        'OPTIONS': {'room_capacity': 2},
+    })
+    def test_django_cache_backend(self):
+        # Django 캐시 백엔드가 로컬 백엔드와 같게 동작하는지 테스트
+        store = get_recent_message_store()
+        store.discard(self.chat_room.id)
+        self.assertIsNone(store.get(self.chat_room.id))
+        store.prime(self.chat_room.id, [{'content': 'message 0'}], False)
+        store.append(self.chat_room.id, {'content': 'message 1'})
+        store.append(self.chat_room.id, {'content': 'message 2'})
+        messages, has_older = store.get(self.chat_room.id)
+        self.assertEqual([message['content'] for message in messages], ['message 1', 'message 2'])
+        self.assertTrue(has_older)
+        store.discard(self.chat_room.id)
+
+    def test_chat_room_detail_is_served_from_cache(self):
+        # 한 번 채워진 방은 데이터베이스를 다시 조회하지 않고 캐시로 렌더링하는지 테스트
+        self.client.login(username='testuser', password='testpassword')
+        self.client.post(reverse('create_message', args=[self.chat_room.id]), {'content': 'first'})
+        self.client.get(reverse('chat_room_detail', args=[self.chat_room.id]))
+
+        # 캐시를 거치지 않고 직접 저장한 메시지는 보이지 않아야 합니다.
+        Message.objects.create(user=self.user, chat_room=self.chat_room, content='bypassed')
+        self.client.post(reverse('create_message', args=[self.chat_room.id]), {'content': 'second'})
+        response = self.client.get(reverse('chat_room_detail', args=[self.chat_room.id]))
+        self.assertContains(response, 'testuser: first')
+        self.assertContains(response, 'testuser: second')
+        self.assertNotContains(response, 'bypassed')
+
+    def test_websocket_messages_fill_cache_and_backlog(self):
+        # WebSocket 메시지가 캐시에 추가되고, backlog 요청 시 캐시에서 전송되는지 테스트
+        get_recent_message_store().prime(self.chat_room.id, [], False)
+
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'Hello, world!'})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/?backlog=1')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            response = await communicator.receive_json_from()
+            self.assertEqual(response['content'], 'testuser: Hello, world!')
+            response = await communicator.receive_json_from()
+            self.assertEqual(response['content'], 'testuser joined the room.')
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+    def test_cold_cache_includes_buffered_messages(self):
+        # 캐시가 비어 있을 때 쓰기 버퍼에 남은 메시지도 최근 메시지에 포함되는지 테스트
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'Hello, world!'})
+            await communicator.receive_json_from()
+            self.assertTrue(write_buffer.has_pending(self.chat_room.id))
+
+            # 동기 경로는 버퍼를 비울 수 없으므로 캐시를 채우지 않습니다.
+            get_recent_message_store.cache_clear()
+            await sync_to_async(get_recent_messages)(self.chat_room)
+            self.assertIsNone(get_recent_message_store().get(self.chat_room.id))
+
+            messages, next_cursor = await aget_recent_messages(self.chat_room)
+            self.assertEqual([message['content'] for message in messages], ['testuser: Hello, world!'])
+            self.assertIsNone(next_cursor)
+            cached, has_older = get_recent_message_store().get(self.chat_room.id)
+            self.assertEqual([message['content'] for message in cached], ['testuser: Hello, world!'])
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+class PresenceTests(ChatStateResetMixin, TransactionTestCase):
+    """참여자 목록과 접속자 레지스트리에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_join_message_is_created_once_per_membership(self):
+        # 입장 메시지는 처음 입장할 때만 생성되고, 나간 뒤 다시 입장하면 다시 생성되는지 테스트
+        url = reverse('chat_room_detail', args=[self.chat_room.id])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Message.objects.filter(content='testuser joined the room.').count(), 1)
+        self.assertTrue(RoomMember.objects.filter(chat_room=self.chat_room, identity='testuser').exists())
+
+        self.client.post(reverse('leave_chat_room', args=[self.chat_room.id]))
+        self.assertFalse(RoomMember.objects.filter(chat_room=self.chat_room, identity='testuser').exists())
+        self.client.get(url)
+        self.assertEqual(Message.objects.filter(content='testuser joined the room.').count(), 2)
+
+    def test_online_count_follows_websocket_connections(self):
+        # 같은 사용자의 여러 연결은 한 명으로 세고, 입장 메시지도 한 번만 보내는지 테스트
+        url = reverse('chat_room_online', args=[self.chat_room.id])
+
+        async def async_test():
+            first = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            first.scope['user'] = self.user
+            await first.connect()
+            await first.receive_json_from()
+
+            second = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            second.scope['user'] = self.user
+            await second.connect()
+            self.assertTrue(await first.receive_nothing())
+            self.assertTrue(get_presence_registry().is_online(self.chat_room.id, 'testuser'))
+            self.assertEqual(get_presence_registry().online_count(self.chat_room.id), 1)
+
+            await first.disconnect()
+            self.assertEqual(get_presence_registry().online_count(self.chat_room.id), 1)
+            await second.disconnect()
+
+        asyncio.run(async_test())
+        self.assertEqual(self.client.get(url).json(), {'online_count': 0, 'users': []})
+
+    def test_disconnect_after_failed_connect(self):
+        # 연결 도중 실패한 consumer의 disconnect가 오류 없이 끝나고 다른 연결의 접속 상태를 지우지 않는지 테스트
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+
+            consumer = ChatConsumer()
+            consumer.scope = {'url_route': {'kwargs': {'room_name': str(self.chat_room.id)}}, 'user': self.user}
+            with mock.patch.object(ChatConsumer, 'get_identity', side_effect=RuntimeError('session unavailable')):
+                with self.assertRaises(RuntimeError):
+                    await consumer.connect()
+            await consumer.disconnect(1006)
+            self.assertEqual(get_presence_registry().online_count(self.chat_room.id), 1)
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+    def test_shared_registry_counts_concurrent_connections_once(self):
+        # 여러 워커가 동시에 연결/해제해도 identity마다 첫 연결과 마지막 연결을 한 번씩만 알리는지 테스트
+        cache.clear()
+        registry = DjangoCachePresenceRegistry(key_prefix='presence-test')
+        identities = [f'user{i}' for i in range(10)]
+
+        def run_all(method):
+            results = []
+            def worker():
+                # 워커마다 레지스트리를 따로 만듭니다.
+                own = DjangoCachePresenceRegistry(key_prefix='presence-test')
+                results.extend(getattr(own, method)(1, identity) for identity in identities)
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+
+        self.assertEqual(run_all('connect').count(True), 10)
+        self.assertEqual(sorted(registry.online_users(1)), sorted(identities))
+        self.assertEqual(run_all('disconnect').count(True), 10)
+        self.assertEqual(registry.online_count(1), 0)
+
+        # leave는 identity의 모든 연결을 지우고, 남은 연결이 끊겨도 다시 세지 않습니다.
+        registry.connect(1, 'alice')
+        registry.connect(1, 'alice')
+        registry.leave(1, 'alice')
+        self.assertFalse(registry.is_online(1, 'alice'))
+        self.assertFalse(registry.disconnect(1, 'alice'))
+        self.assertTrue(registry.connect(1, 'alice'))
+        self.assertEqual(registry.online_users(1), ['alice'])
+
+    @override_settings(CHAT_PRESENCE={
+        'BACKEND': 'myapp.presence.DjangoCachePresenceRegistry',
+        'OPTIONS': {'key_prefix': 'presence-refresh', 'timeout': 0.3},
+    })
+    def test_open_connection_refreshes_shared_registry(self):
+        # 연결이 살아 있는 동안에는 timeout이 지나도 접속자 목록에서 사라지지 않는지 테스트
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await asyncio.sleep(0.6)
+            self.assertEqual(await get_presence_registry().aonline_count(self.chat_room.id), 1)
+            await communicator.disconnect()
+            self.assertEqual(await get_presence_registry().aonline_count(self.chat_room.id), 0)
+
+        asyncio.run(async_test())
+
+class FanoutTests(ChatStateResetMixin, TransactionTestCase):
+    """프로세스 내 fan-out에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    async def connect_all(self, count):
+        communicators = []
+        for _ in range(count):
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            await communicator.connect()
+            communicators.append(communicator)
+        # 입장 메시지는 첫 연결에서만 전송됩니다.
+        await communicators[0].receive_json_from()
+        return communicators
+
+    def test_message_is_serialized_once_for_all_sockets(self):
+        # 방에 연결된 소켓 수와 관계없이 메시지를 한 번만 직렬화하는지 테스트
+        async def async_test():
+            communicators = await self.connect_all(3)
+            with mock.patch('myapp.fanout.json', wraps=json) as fanout_json:
+                await communicators[0].send_json_to({'message': 'Hello, world!'})
+                frames = [await communicator.receive_from() for communicator in communicators]
+            self.assertEqual(fanout_json.dumps.call_count, 1)
+            self.assertEqual(len(set(frames)), 1)
+            self.assertEqual(json.loads(frames[0])['content'], 'Anonymous: Hello, world!')
+            for communicator in communicators:
+                await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+    def test_messages_from_other_processes_are_delivered_locally(self):
+        # 다른 프로세스에서 채널 레이어로 보낸 메시지는 전달하고, 자기 자신이 보낸 메시지는 무시하는지 테스트
+        group = f'chat_{self.chat_room.id}'
+
+        async def async_test():
+            communicators = await self.connect_all(2)
+            channel_layer = get_channel_layer()
+            for origin in (PROCESS_ID, 'other-process'):
+                await channel_layer.group_send(group, {
+                    'type': 'chat.fanout',
+                    'origin': origin,
+                    'group': group,
+                    'payload': {'content': f'from {origin}', 'username': 'remote'},
+                })
+            for communicator in communicators:
+                response = await communicator.receive_json_from()
+                self.assertEqual(response['content'], 'from other-process')
+                self.assertTrue(await communicator.receive_nothing())
+                await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+    def test_message_published_while_joining_is_delivered(self):
+        # 방에 등록된 뒤 group_add를 기다리는 동안 다른 연결이 보낸 메시지도 받는지 테스트
+        group = f'chat_{self.chat_room.id}'
+
+        async def async_test():
+            fanout = get_fanout()
+            group_add = fanout.channel_layer.group_add
+
+            async def publish_during_group_add(*args):
+                await fanout.publish(group, {'content': 'while joining', 'username': 'other'})
+                await group_add(*args)
+
+            with mock.patch.object(fanout.channel_layer, 'group_add', publish_during_group_add):
+                communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+                connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            response = await communicator.receive_json_from()
+            self.assertEqual(response['content'], 'while joining')
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+class MsgpackSubprotocolTests(ChatStateResetMixin, TransactionTestCase):
+    """MessagePack 서브프로토콜에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    def test_msgpack_and_json_clients_share_a_room(self):
+        # MessagePack 클라이언트와 JSON 클라이언트가 같은 방에서 각자의 인코딩으로 메시지를 받는지 테스트
+        async def async_test():
+            binary = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/', subprotocols=[MSGPACK_SUBPROTOCOL])
+            binary.scope['user'] = self.user
+            connected, subprotocol = await binary.connect()
+            self.assertTrue(connected)
+            self.assertEqual(subprotocol, MSGPACK_SUBPROTOCOL)
+            response = msgpack.unpackb(await binary.receive_from())
+            self.assertEqual(response['content'], 'testuser joined the room.')
+
+            text = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            connected, subprotocol = await text.connect()
+            self.assertIsNone(subprotocol)
+            await binary.receive_from()
+            await text.receive_json_from()
+
+            await binary.send_to(bytes_data=msgpack.packb({'message': 'Hello, world!'}))
+            response = msgpack.unpackb(await binary.receive_from())
+            self.assertEqual(response['content'], 'testuser: Hello, world!')
+            response = await text.receive_json_from()
+            self.assertEqual(response['content'], 'testuser: Hello, world!')
+
+            await binary.disconnect()
+            await text.disconnect()
+
+        asyncio.run(async_test())
+
+class CoalescingTests(ChatStateResetMixin, TransactionTestCase):
+    """출력 프레임 묶음 전송에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    @override_settings(CHAT_COALESCE={'WINDOW': 0.2, 'MAX_BATCH': 3})
+    def test_events_are_sent_as_array_frames(self):
+        # 묶음 전송 클라이언트는 배열 프레임을, 일반 클라이언트는 메시지마다 프레임을 받는지 테스트
+        async def async_test():
+            batched = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/?coalesce=1')
+            batched.scope['user'] = self.user
+            await batched.connect()
+            response = await batched.receive_json_from()
+            self.assertEqual([item['content'] for item in response], ['testuser joined the room.'])
+
+            sender = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            await sender.connect()
+            await sender.receive_json_from()
+            for i in range(4):
+                await sender.send_json_to({'message': f'message {i}'})
+                response = await sender.receive_json_from()
+                self.assertEqual(response['content'], f'Anonymous: message {i}')
+
+            # MAX_BATCH(3)만큼 모이면 바로, 나머지는 WINDOW가 지난 뒤 전송됩니다.
+            response = await batched.receive_json_from()
+            self.assertEqual([item['content'] for item in response], ['Anonymous joined the room.', 'Anonymous: message 0', 'Anonymous: message 1'])
+            response = await batched.receive_json_from()
+            self.assertEqual([item['content'] for item in response], ['Anonymous: message 2', 'Anonymous: message 3'])
+
+            await batched.disconnect()
+            await sender.disconnect()
+
+        asyncio.run(async_test())
+
+    def test_msgpack_batch_frame(self):
+        # MessagePack 배열 프레임이 메시지별 인코딩을 이어 붙인 것과 같은지 테스트
+        messages = [OutboundMessage({'content': f'message {i}'}) for i in range(3)]
+        self.assertEqual(msgpack.unpackb(encode_batch(messages, binary=True)), [message.payload for message in messages])
+        self.assertEqual(json.loads(encode_batch(messages)), [message.payload for message in messages])
+
+class ConnectionOutboxTests(TestCase):
+    """연결별 송신 큐에 대한 테스트 케이스"""
+
+    async def stalled_outbox(self, policy, sent):
+        # 첫 전송에서 멈추는(느린) 클라이언트를 흉내 냅니다.
+        release = asyncio.Event()
+
+        async def send(messages):
+            await release.wait()
+            sent.extend(messages)
+
+        outbox = ConnectionOutbox(send, max_size=3, policy=policy, max_batch=1)
+        outbox.put('first')
+        await asyncio.sleep(0)  # writer가 'first'를 꺼내 전송을 시작할 때까지 기다립니다.
+        return outbox, release
+
+    def test_drop_policies(self):
+        # 큐가 가득 찼을 때 정책에 따라 오래된/새 메시지를 버리는지 테스트
+        async def async_test(policy):
+            sent = []
+            outbox, release = await self.stalled_outbox(policy, sent)
+            results = [outbox.put(f'message {i}') for i in range(5)]
+            self.assertEqual(outbox.stats(), {'queue_depth': 3, 'dropped': 2, 'sent': 0})
+            release.set()
+            while outbox.queue:
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            outbox.close()
+            return results, sent
+
+        results, sent = asyncio.run(async_test(DROP_OLDEST))
+        self.assertTrue(all(results))
+        self.assertEqual(sent, ['first', 'message 2', 'message 3', 'message 4'])
+        results, sent = asyncio.run(async_test(DROP_NEWEST))
+        self.assertEqual(sent, ['first', 'message 0', 'message 1', 'message 2'])
+
+    def test_disconnect_policy(self):
+        # disconnect 정책은 큐가 가득 차면 False를 반환하는지 테스트
+        async def async_test():
+            outbox, release = await self.stalled_outbox(DISCONNECT, [])
+            results = [outbox.put(f'message {i}') for i in range(4)]
+            outbox.close()
+            return results
+
+        self.assertEqual(asyncio.run(async_test()), [True, True, True, False])
+
+    def test_low_priority_messages_are_dropped_first(self):
+        # 큐가 가득 차면 정책(disconnect 포함)보다 먼저 입력 중 표시 같은 낮은 우선순위 메시지를 버리는지 테스트
+        async def async_test():
+            sent = []
+            outbox, release = await self.stalled_outbox(DISCONNECT, sent)
+            typing = OutboundMessage({'type': 'typing'}, low_priority=True)
+            results = [outbox.put('message 0'), outbox.put(typing), outbox.put('message 1'), outbox.put('message 2')]
+            results.append(outbox.put(OutboundMessage({'type': 'typing'}, low_priority=True)))
+            self.assertEqual(outbox.stats(), {'queue_depth': 3, 'dropped': 2, 'sent': 0})
+            release.set()
+            while outbox.queue:
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            outbox.close()
+            return results, sent
+
+        results, sent = asyncio.run(async_test())
+        self.assertTrue(all(results))
+        self.assertEqual(sent, ['first', 'message 0', 'message 1', 'message 2'])
+
+    def test_slow_client_does_not_delay_room(self):
+        # 멈춘 클라이언트가 있어도 같은 방의 다른 연결은 바로 메시지를 받는지 테스트
+        async def async_test():
+            class Connection:
+                def __init__(self, outbox):
+                    self.outbox = outbox
+                    self.channel_name = 'test'
+
+                async def deliver(self, message):
+                    self.outbox.put(message)
+
+            received = []
+
+            async def fast_send(messages):
+                received.extend(message.payload for message in messages)
+
+            slow, release = await self.stalled_outbox(DROP_OLDEST, [])
+            fast = ConnectionOutbox(fast_send)
+            hub = RoomFanout(channel_layer=None)
+            hub.rooms['chat_1'] = {Connection(slow), Connection(fast)}
+            for i in range(10):
+                await hub.deliver_local('chat_1', OutboundMessage(i))
+            await asyncio.sleep(0)
+            self.assertEqual(received, list(range(10)))
+            self.assertEqual(slow.dropped, 7)
+            slow.close()
+            fast.close()
+
+        asyncio.run(async_test())
+
+@override_settings(CHAT_RATE_LIMITS={'RATES': {'user': (0.001, 2), 'anonymous': (0.001, 2), 'room': (0.001, 3)}})
+class RateLimitTests(ChatStateResetMixin, TransactionTestCase):
+    """메시지 전송 rate limit에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    def test_token_bucket_refills(self):
+        # 버스트만큼 허용한 뒤 거부하고, 시간이 지나면 다시 허용하는지 테스트
+        limiter = LocalRateLimiter()
+        with mock.patch('myapp.ratelimit.time.monotonic', return_value=100.0):
+            self.assertEqual([limiter.consume('key', 1, 2) for _ in range(2)], [0, 0])
+            self.assertAlmostEqual(limiter.consume('key', 1, 2), 1.0)
+        with mock.patch('myapp.ratelimit.time.monotonic', return_value=101.0):
+            self.assertEqual(limiter.consume('key', 1, 2), 0)
+
+    def test_create_message_over_limit(self):
+        # 한도를 넘은 HTTP 메시지는 저장하지 않고 429를 반환하는지 테스트
+        self.client.login(username='testuser', password='testpassword')
+        url = reverse('create_message', args=[self.chat_room.id])
+        statuses = [self.client.post(url, {'content': f'message {i}'}).status_code for i in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_websocket_over_limit_gets_error_frame(self):
+        # 한도를 넘은 WebSocket 메시지는 방에 전달하지 않고 보낸 사람에게만 오류 프레임을 보내는지 테스트
+        async def async_test():
+            sender = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            sender.scope['user'] = self.user
+            await sender.connect()
+            await sender.receive_json_from()
+            listener = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            await listener.connect()
+            await sender.receive_json_from()
+            await listener.receive_json_from()
+
+            for i in range(3):
+                await sender.send_json_to({'message': f'message {i}'})
+            for i in range(2):
+                self.assertEqual((await listener.receive_json_from())['content'], f'testuser: message {i}')
+                await sender.receive_json_from()
+            response = await sender.receive_json_from()
+            self.assertEqual(response['type'], 'error')
+            self.assertEqual(response['code'], 'rate_limited')
+            self.assertTrue(await listener.receive_nothing())
+
+            # 다른 사용자가 보내도 채팅방 한도(3)를 넘으면 거부됩니다.
+            await listener.send_json_to({'message': 'first'})
+            await listener.receive_json_from()
+            await listener.send_json_to({'message': 'second'})
+            self.assertEqual((await listener.receive_json_from())['code'], 'rate_limited')
+
+            await sender.disconnect()
+            await listener.disconnect()
+
+        asyncio.run(async_test())
+
+class MetricsTests(ChatStateResetMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.chat_room = ChatRoom.objects.create(name='Test Room', created_by=self.user)
+
+    def value(self, name, labels=()):
+        return metrics.snapshot().get(name, {}).get(labels, 0)
+
+    def test_counter_sums_thread_shards(self):
+        # 스레드마다 따로 올린 값이 수집할 때 합쳐지는지 테스트
+        before = self.value('livechat_messages_dropped_total')
+        threads = [threading.Thread(target=lambda: [metrics.MESSAGES_DROPPED.inc() for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.value('livechat_messages_dropped_total') - before, 400)
+
+    def test_render_histogram(self):
+        # 히스토그램이 누적 버킷, +Inf, _sum, _count로 출력되는지 테스트
+        histogram = metrics.Histogram('livechat_test_seconds', 'Test.', buckets=(0.1, 1))
+        metrics.REGISTRY.remove(histogram)
+        values = {'livechat_test_seconds': {(('view', 'a'),): [1, 2, 0, 1.5, 3]}}
+        with mock.patch.object(metrics, 'REGISTRY', [histogram]):
+            text = metrics.render(values)
+        self.assertIn('# TYPE livechat_test_seconds histogram', text)
+        self.assertIn('livechat_test_seconds_bucket{view="a",le="0.1"} 1', text)
+        self.assertIn('livechat_test_seconds_bucket{view="a",le="1.0"} 3', text)
+        self.assertIn('livechat_test_seconds_bucket{view="a",le="+Inf"} 3', text)
+        self.assertIn('livechat_test_seconds_count{view="a"} 3', text)
+
+    def test_metrics_view_reports_websocket_and_view_metrics(self):
+        # WebSocket 연결 수, 받은 메시지 수, 뷰별 시간이 /metrics에 나오는지 테스트
+        received = self.value('livechat_messages_received_total')
+        self.client.get(reverse('chat_room_list'))
+
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'hello'})
+            await communicator.receive_json_from()
+            text = (await sync_to_async(self.client.get)(reverse('metrics'))).content.decode()
+            await communicator.disconnect()
+            return text
+
+        text = asyncio.run(async_test())
+        self.assertIn(f'livechat_active_connections{{room="{self.chat_room.id}"}} 1', text)
+        self.assertIn(f'livechat_messages_received_total {received + 1}', text)
+        self.assertIn('livechat_view_seconds_count{view="chat_room_list"}', text)
+        self.assertIn('livechat_group_send_seconds_count', text)
+
+    @override_settings(CHAT_METRICS={'CACHE_ALIAS': 'default', 'KEY_PREFIX': 'metrics-test'})
+    def test_collect_sums_worker_snapshots(self):
+        # 공유 캐시에 저장된 다른 워커의 스냅샷과 합쳐지는지 테스트
+        cache.set('metrics-test:other', {'livechat_messages_received_total': {(): 5}})
+        cache.set('metrics-test:processes', {'other': time.time()})
+        try:
+            total = metrics.collect()['livechat_messages_received_total'][()]
+            self.assertEqual(total, self.value('livechat_messages_received_total') + 5)
+        finally:
+            cache.clear()
+
+class LoggingTests(TestCase):
+    def test_json_formatter_includes_arguments_and_extra(self):
+        # %-스타일 인자와 extra 값이 JSON에 기록되는지 테스트
+        record = logging.makeLogRecord({'name': 'myapp', 'levelname': 'INFO', 'msg': 'room=%s count=%d', 'args': ('방', 3), 'room_id': 7})
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['message'], 'room=방 count=3')
+        self.assertEqual(data['room_id'], 7)
+        self.assertEqual(data['level'], 'INFO')
+
+    def test_helpers_format_lazily(self):
+        # 레벨이 꺼져 있으면 인자를 문자열로 바꾸지 않는지 테스트
+        argument = mock.MagicMock()
+        app_logger = logging.getLogger('myapp')
+        level = app_logger.level
+        app_logger.setLevel(logging.INFO)  # setLevel은 isEnabledFor 캐시도 비웁니다.
+        try:
+            log_debug('value=%s', argument)
+        finally:
+            app_logger.setLevel(level)
+        argument.__str__.assert_not_called()
+
+    def test_queue_file_handler_writes_in_background(self):
+        # 로그가 백그라운드 스레드에서 JSON 한 줄로 파일에 쓰이는지 테스트
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.log')
+            handler = QueueFileHandler(filename)
+            handler.setFormatter(JsonFormatter())
+            test_logger = logging.getLogger('myapp.tests.queue')
+            test_logger.addHandler(handler)
+            try:
+                test_logger.warning('hello %s', 'world')
+            finally:
+                test_logger.removeHandler(handler)
+                handler.close()
+            with open(filename, encoding='utf-8') as f:
+                self.assertEqual(json.loads(f.readline())['message'], 'hello world')
+
+    def test_queue_file_handler_drops_when_full(self):
+        # 큐가 가득 차면 기다리지 않고 로그를 버리는지 테스트
+        with tempfile.TemporaryDirectory() as directory:
+            handler = QueueFileHandler(os.path.join(directory, 'test.log'), max_queue_size=1)
+            handler.listener.stop()  # 큐를 비우지 않도록 writer 스레드를 멈춥니다.
+            try:
+                for i in range(3):
+                    handler.handle(logging.makeLogRecord({'msg': f'message {i}'}))
+                self.assertEqual(handler.dropped, 2)
+            finally:
+                handler.close()
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+        cls.chat_room = ChatRoom.objects.create(name='검색 채팅방', created_by=cls.user)
+        cls.other_room = ChatRoom.objects.create(name='다른 채팅방', created_by=cls.user)
+
+    def create(self, content, chat_room=None):
+        return Message.objects.create(user=self.user, chat_room=chat_room or self.chat_room, content=content)
+
+    def test_search_room_by_word_prefix(self):
+        # 채팅방 안에서 단어 접두어로 검색되고 다른 방의 메시지는 제외되는지 테스트
+        message = self.create('testuser: 안녕하세요 여러분')
+        self.create('testuser: 안녕하세요', chat_room=self.other_room)
+        self.create('testuser: 잘 가요')
+        results, next_cursor = search_messages('안녕', chat_room_id=self.chat_room.id)
+        self.assertEqual(results, [message])
+        self.assertIsNone(next_cursor)
+
+    def test_search_requires_all_terms_and_ranks(self):
+        # 모든 단어가 들어 있는 메시지만 찾고, 관련도가 높은 메시지가 먼저 오는지 테스트
+        self.create('testuser: deploy')
+        weak = self.create('testuser: deploy failed after a long long long long discussion about the weather')
+        strong = self.create('testuser: deploy failed')
+        results, _ = search_messages('deploy failed')
+        self.assertEqual(results, [strong, weak])
+
+    def test_index_follows_bulk_create_and_delete(self):
+        # bulk_create(쓰기 버퍼)로 추가한 메시지와 삭제한 메시지가 인덱스에 반영되는지 테스트
+        Message.objects.bulk_create([Message(chat_room=self.chat_room, content=f'Anonymous: bulk {i}') for i in range(3)])
+        self.assertEqual(len(search_messages('bulk')[0]), 3)
+        Message.objects.filter(content='Anonymous: bulk 0').delete()
+        self.assertEqual(len(search_messages('bulk')[0]), 2)
+        self.chat_room.delete()
+        self.assertEqual(search_messages('bulk')[0], [])
+
+    def test_search_pagination(self):
+        # 커서를 따라가면 모든 결과를 중복 없이 가져오는지 테스트 (쿼리 수는 페이지당 일정)
+        messages = {self.create(f'testuser: page {i}') for i in range(5)}
+        found, cursor = [], None
+        while True:
+            with self.assertNumQueries(2):
+                results, cursor = search_messages('page', cursor=cursor, limit=2)
+            found += results
+            if cursor is None:
+                break
+        self.assertEqual(len(found), 5)
+        self.assertEqual(set(found), messages)
+
+    def test_search_views(self):
+        # 채팅방 검색 뷰와 전체 검색 뷰가 JSON 결과를 반환하는지 테스트
+        self.create('testuser: 점심 메뉴')
+        self.create('testuser: 점심 시간', chat_room=self.other_room)
+        data = self.client.get(reverse('chat_room_search', args=[self.chat_room.id]), {'q': '점심'}).json()
+        self.assertEqual([result['content'] for result in data['results']], ['testuser: 점심 메뉴'])
+        data = self.client.get(reverse('search'), {'q': '점심'}).json()
+        self.assertEqual({result['chat_room_id'] for result in data['results']}, {self.chat_room.id, self.other_room.id})
+        self.assertEqual(self.client.get(reverse('search'), {'q': '"*'}).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('search'), {'q': '점심', 'cursor': 'x'}).status_code, 400)
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+        cls.chat_room = ChatRoom.objects.create(name='보관 채팅방', created_by=cls.user)
+
+    def create(self, content, days_ago, user=None):
+        return Message.objects.create(user=user, chat_room=self.chat_room, content=content, created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_archive_moves_old_messages_per_day(self):
+        # 보관 기간이 지난 메시지가 날짜별 보관 데이터로 옮겨지고 삭제되는지 테스트
+        for i in range(3):
+            self.create(f'old {i}', days_ago=40, user=self.user)
+        self.create('older', days_ago=41)
+        recent = self.create('recent', days_ago=1)
+        self.assertEqual(archive_messages(days=30, chunk_size=2), (4, 2))
+        self.assertEqual(list(Message.objects.all()), [recent])
+        archive = MessageArchive.objects.get(day=timezone.localdate(timezone.now() - timedelta(days=40)))
+        self.assertEqual(archive.message_count, 3)
+        entries = decode_entries(archive.data)
+        self.assertEqual([entry['content'] for entry in entries], ['old 0', 'old 1', 'old 2'])
+        self.assertEqual(entries[0]['username'], 'testuser')
+
+    def test_archive_merges_without_duplicates(self):
+        # 같은 날짜를 다시 보관하면 기존 보관 데이터와 합쳐지고 중복되지 않는지 테스트
+        first = self.create('first', days_ago=40)
+        archive_messages(days=30)
+        # 보관 후 삭제 전에 멈춘 경우처럼 이미 보관된 메시지가 남아 있는 상황
+        Message.objects.create(id=first.id, chat_room=self.chat_room, content='first', created_at=first.created_at)
+        self.create('second', days_ago=40)
+        archive_messages(days=30)
+        archive = MessageArchive.objects.get()
+        self.assertEqual([entry['content'] for entry in decode_entries(archive.data)], ['first', 'second'])
+        self.assertFalse(Message.objects.exists())
+
+    def test_pagination_continues_into_archive(self):
+        # 커서가 최근 메시지를 지나면 보관된 메시지를 이어서 가져오는지 테스트
+        for i in range(5):
+            self.create(f'메시지 {i}', days_ago=45 - i, user=self.user)
+        for i in range(5, 9):
+            self.create(f'메시지 {i}', days_ago=9 - i)
+        archive_messages(days=30)
+        contents, cursor = [], None
+        while True:
+            page, cursor = get_message_page(self.chat_room, before=cursor, limit=3)
+            contents = [serialize_message(message)['content'] for message in page] + contents
+            if cursor is None:
+                break
+        self.assertEqual(contents, [f'메시지 {i}' for i in range(9)])
+        with self.assertNumQueries(2):
+            page, _ = get_message_page(self.chat_room, limit=6)
+            self.assertEqual(serialize_message(page[0])['username'], 'testuser')
+
+    def test_archive_command_dry_run(self):
+        self.create('old', days_ago=40)
+        out = io.StringIO()
+        call_command('archive_messages', '--days', '30', '--dry-run', stdout=out)
+        self.assertIn('1 messages older than 30 days', out.getvalue())
+        self.assertEqual(Message.objects.count(), 1)
+
+class RoomSummaryTests(ChatStateResetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+        now = timezone.now()
+        cls.rooms = [ChatRoom.objects.create(name=name, created_by=cls.user) for name in ['개발', '개발자 모임', '디자인', '기획']]
+        # 마지막 활동 시각이 같은 방이 있어도 페이지가 겹치거나 빠지지 않는지 확인하기 위해 두 방의 시각을 같게 합니다.
+        for i, room in enumerate(cls.rooms):
+            RoomSummary.objects.filter(chat_room=room).update(last_activity_at=now - timedelta(minutes=min(i, 2)))
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='testuser', password='12345')
+
+    def test_summary_follows_messages(self):
+        # 채팅방을 만들면 요약이 생기고, 메시지를 저장하면 개수와 마지막 메시지가 갱신되는지 테스트
+        room = self.rooms[3]
+        self.client.post(reverse('create_message', args=[room.id]), {'content': '첫 메시지'})
+        summary = RoomSummary.objects.get(chat_room=room)
+        self.assertEqual(summary.message_count, 1)
+        self.assertEqual(summary.last_message, 'testuser: 첫 메시지')
+        self.assertEqual(summary.last_activity_at, summary.last_message_at)
+
+        # 늦게 저장된(버퍼) 오래된 메시지는 개수만 늘리고 마지막 메시지는 바꾸지 않습니다.
+        old = Message.objects.create(chat_room=room, content='오래된 메시지', created_at=timezone.now() - timedelta(hours=1))
+        record_messages([old])
+        summary.refresh_from_db()
+        self.assertEqual(summary.message_count, 2)
+        self.assertEqual(summary.last_message, 'testuser: 첫 메시지')
+
+    def test_list_pages_by_activity(self):
+        # 최근 활동 순으로 페이지를 나누고, 커서로 모든 방을 한 번씩 가져오는지 테스트
+        names, cursor = [], None
+        with self.settings(CHAT_ROOM_LIST={'PAGE_SIZE': 1}):
+            while True:
+                response = self.client.get(reverse('chat_room_list'), {'cursor': cursor} if cursor else {})
+                names += [summary.chat_room.name for summary in response.context['summaries']]
+                cursor = response.context['next_cursor']
+                if cursor is None:
+                    break
+        self.assertEqual(names, ['개발', '개발자 모임', '기획', '디자인'])
+        self.assertEqual(self.client.get(reverse('chat_room_list'), {'cursor': 'x'}).status_code, 400)
+
+    def test_list_prefix_search(self):
+        response = self.client.get(reverse('chat_room_list'), {'q': '개발'})
+        self.assertEqual([summary.chat_room.name for summary in response.context['summaries']], ['개발', '개발자 모임'])
+        self.assertNotContains(response, '디자인</a>')
+
+    def test_list_queries_do_not_grow_with_rooms(self):
+        # 세션, 사용자, 요약(채팅방 JOIN), 읽음 위치 쿼리만 실행되어야 합니다.
+        with self.assertNumQueries(4):
+            self.client.get(reverse('chat_room_list'))
+        ChatRoom.objects.bulk_create([ChatRoom(name=f'방 {i}', created_by=self.user) for i in range(20)])
+        RoomSummary.objects.bulk_create([RoomSummary(chat_room=room) for room in ChatRoom.objects.filter(summary__isnull=True)])
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('chat_room_list'), {'q': '방'})
+        self.assertEqual(len(response.context['summaries']), 20)
+
+class ReadStateTests(ChatStateResetMixin, TransactionTestCase):
+    """읽음 위치와 안 읽은 메시지 수에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='읽음 테스트 채팅방', created_by=self.user)
+        self.other_room = ChatRoom.objects.create(name='다른 채팅방', created_by=self.user)
+
+    def test_buffer_keeps_latest_mark(self):
+        # 여러 번 ack해도 (사용자, 채팅방)마다 가장 늦은 위치 하나만 저장하고, 저장된 위치를 되돌리지 않는지 테스트
+        now = timezone.now()
+        buffer = ReadMarkBuffer(flush_interval=60)
+
+        async def async_test():
+            for seconds in [10, 30, 20]:
+                await buffer.mark(self.user.id, self.chat_room.id, now - timedelta(seconds=60 - seconds))
+            self.assertEqual(len(buffer), 1)
+            await buffer.flush()
+
+        asyncio.run(async_test())
+        self.assertEqual(ReadMark.objects.get().last_read_at, now - timedelta(seconds=30))
+        # 트랜잭션 하나에서 INSERT(충돌 무시)와 앞으로만 옮기는 UPDATE
+        with self.assertNumQueries(4):
+            save_read_marks({(self.user.id, self.chat_room.id): now - timedelta(seconds=50)})
+        self.assertEqual(ReadMark.objects.get().last_read_at, now - timedelta(seconds=30))
+
+    def test_save_read_marks_never_moves_backwards(self):
+        # 다른 워커가 더 뒤의 위치를 먼저 저장했어도 앞선 위치로 덮어쓰지 않는지 테스트 (새 위치는 만들고, 앞으로는 옮깁니다)
+        now = timezone.now()
+        ReadMark.objects.create(user=self.user, chat_room=self.chat_room, last_read_at=now)
+        ReadMark.objects.create(user=self.other, chat_room=self.chat_room, last_read_at=now - timedelta(minutes=5))
+        save_read_marks({
+            (self.user.id, self.chat_room.id): now - timedelta(minutes=1),
+            (self.other.id, self.chat_room.id): now - timedelta(minutes=1),
+            (self.user.id, self.other_room.id): now,
+        })
+        marks = {(mark.user_id, mark.chat_room_id): mark.last_read_at for mark in ReadMark.objects.all()}
+        self.assertEqual(marks, {
+            (self.user.id, self.chat_room.id): now,
+            (self.other.id, self.chat_room.id): now - timedelta(minutes=1),
+            (self.user.id, self.other_room.id): now,
+        })
+
+    def test_unread_counts(self):
+        now = timezone.now()
+        for i in range(5):
+            Message.objects.create(user=self.other, chat_room=self.chat_room, content=f'message {i}', created_at=now - timedelta(minutes=5 - i))
+        Message.objects.create(user=self.other, chat_room=self.other_room, content='other', created_at=now)
+        ReadMark.objects.create(user=self.user, chat_room=self.chat_room, last_read_at=now - timedelta(minutes=3))
+        # 읽음 위치가 없는 채팅방은 계산하지 않습니다.
+        with self.assertNumQueries(2):
+            self.assertEqual(get_unread_counts(self.user.id, [self.chat_room.id, self.other_room.id]), {self.chat_room.id: 2})
+        # 아직 저장하지 않은 읽음 위치도 반영합니다.
+        asyncio.run(read_mark_buffer.mark(self.user.id, self.other_room.id, now))
+        self.assertEqual(get_unread_counts(self.user.id, [self.chat_room.id, self.other_room.id]), {self.chat_room.id: 2, self.other_room.id: 0})
+
+    def test_websocket_ack_advances_mark(self):
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'hello'})
+            cursor = (await communicator.receive_json_from())['cursor']
+            await communicator.send_json_to({'type': 'ack', 'cursor': 'invalid'})
+            await communicator.send_json_to({'type': 'ack', 'cursor': cursor})
+            self.assertTrue(await communicator.receive_nothing())
+            self.assertEqual(read_mark_buffer.pending(self.user.id, self.chat_room.id), decode_cursor(cursor)[0])
+            # 연결이 끊기면 모아 둔 읽음 위치를 저장합니다.
+            await communicator.disconnect()
+            return cursor
+
+        cursor = asyncio.run(async_test())
+        self.assertEqual(ReadMark.objects.get(user=self.user, chat_room=self.chat_room).last_read_at, decode_cursor(cursor)[0])
+
+    def test_room_list_shows_unread_after_visit(self):
+        # 채팅방에 들어가면 읽은 것으로 기록되고, 이후 다른 사용자의 메시지가 안 읽은 메시지로 표시되는지 테스트
+        self.client.login(username='testuser', password='12345')
+        self.client.get(reverse('chat_room_detail', args=[self.chat_room.id]))
+        self.assertIsNotNone(read_mark_buffer.pending(self.user.id, self.chat_room.id))
+        self.assertNotContains(self.client.get(reverse('chat_room_list')), 'unread')
+        for i in range(2):
+            Message.objects.create(user=self.other, chat_room=self.chat_room, content=f'new {i}')
+        self.assertContains(self.client.get(reverse('chat_room_list')), '2 unread')
+
+class SequenceTests(ChatStateResetMixin, TransactionTestCase):
+    """채팅방별 메시지 순번(seq)과 재연결 재전송에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='순번 테스트 채팅방', created_by=self.user)
+
+    def test_allocator_continues_from_stored_seq(self):
+        Message.objects.create(chat_room=self.chat_room, content='old', seq=7)
+        allocator = get_sequence_allocator()
+        self.assertEqual(allocator.allocate(self.chat_room.id), 8)
+        # 처음 한 번만 데이터베이스를 조회합니다.
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate(self.chat_room.id), 9)
+            self.assertEqual(allocator.current(self.chat_room.id), 9)
+
+    def test_allocator_continues_after_archiving(self):
+        # 채팅방의 메시지를 모두 보관해도 seq가 1부터 다시 시작하지 않는지 테스트
+        for seq in range(1, 4):
+            Message.objects.create(chat_room=self.chat_room, content=f'old {seq}', seq=seq, created_at=timezone.now() - timedelta(days=40))
+        archive_messages(days=30)
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(MessageArchive.objects.get().last_seq, 3)
+        self.assertEqual(get_sequence_allocator().allocate(self.chat_room.id), 4)
+
+    def test_get_messages_after_uses_cache_then_database(self):
+        self.client.login(username='testuser', password='12345')
+        for i in range(3):
+            self.client.post(reverse('create_message', args=[self.chat_room.id]), {'content': f'message {i}'})
+        self.assertEqual(list(Message.objects.order_by('id').values_list('seq', flat=True)), [1, 2, 3])
+        # 최근 메시지 캐시에 빠짐없이 있으면 쿼리하지 않습니다.
+        get_recent_message_store().prime(self.chat_room.id, [serialize_message(message) for message in Message.objects.order_by('seq')], False)
+        with self.assertNumQueries(0):
+            self.assertEqual([message['seq'] for message in get_messages_after(self.chat_room.id, 1, 10)], [2, 3])
+        get_recent_message_store.cache_clear()
+        with self.assertNumQueries(1):
+            self.assertEqual([message['content'] for message in get_messages_after(self.chat_room.id, 1, 10)], ['testuser: message 1', 'testuser: message 2'])
+        self.assertEqual(get_messages_after(self.chat_room.id, 3, 10), [])
+        self.assertIsNone(get_messages_after(self.chat_room.id, 0, 2))
+
+    def test_websocket_resume_replays_missed_messages(self):
+        # last_seq로 다시 연결하면 놓친 메시지만 순서대로 받고, 입장 메시지 없이 실시간 전달로 전환되는지 테스트
+        async def async_test():
+            sender = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            sender.scope['user'] = self.user
+            await sender.connect()
+            await sender.receive_json_from()
+            seqs = []
+            for i in range(3):
+                await sender.send_json_to({'message': f'message {i}'})
+                seqs.append((await sender.receive_json_from())['seq'])
+            self.assertEqual(seqs, [1, 2, 3])
+
+            resumed = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/?last_seq=1')
+            resumed.scope['user'] = self.user
+            await resumed.connect()
+            replayed = [await resumed.receive_json_from() for _ in range(2)]
+            self.assertEqual([(message['seq'], message['content']) for message in replayed], [(2, 'testuser: message 1'), (3, 'testuser: message 2')])
+            await sender.send_json_to({'message': 'live'})
+            self.assertEqual((await resumed.receive_json_from())['seq'], 4)
+            self.assertTrue(await resumed.receive_nothing())
+
+            # 놓친 메시지가 너무 많으면 새로 고침을 요청합니다.
+            with self.settings(CHAT_SEQUENCE={'MAX_REPLAY': 2}):
+                stale = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/?last_seq=0')
+                await stale.connect()
+                self.assertEqual((await stale.receive_json_from())['type'], 'reset')
+                await stale.disconnect()
+            await sender.disconnect()
+            await resumed.disconnect()
+
+        asyncio.run(async_test())
+
+    def test_websocket_resume_waits_for_unsaved_seq(self):
+        # 발급된 seq의 메시지가 아직 저장되지 않았으면 기다렸다가 다시 조회하고, 끝내 없으면 새로 고침을 요청하는지 테스트
+        async def async_test():
+            sender = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            sender.scope['user'] = self.user
+            await sender.connect()
+            await sender.receive_json_from()
+            for i in range(2):
+                await sender.send_json_to({'message': f'message {i}'})
+                await sender.receive_json_from()
+            # 다른 워커가 seq 3을 발급했지만 아직 쓰기 버퍼에 있는 상황
+            allocator = get_sequence_allocator()
+            self.assertEqual(await allocator.aallocate(self.chat_room.id), 3)
+            real = consumers.aget_messages_after
+            calls = []
+
+            async def save_after_first_lookup(*args):
+                calls.append(args)
+                try:
+                    return await real(*args)
+                finally:
+                    if len(calls) == 1:
+                        await Message.objects.acreate(chat_room=self.chat_room, content='other worker', seq=3)
+
+            with mock.patch.object(write_buffer, 'flush_interval', 0.01), \
+                    mock.patch.object(consumers, 'aget_messages_after', save_after_first_lookup):
+                resumed = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/?last_seq=1')
+                resumed.scope['user'] = self.user
+                await resumed.connect()
+                replayed = [await resumed.receive_json_from() for _ in range(2)]
+                self.assertEqual([message['seq'] for message in replayed], [2, 3])
+                self.assertEqual(len(calls), 2)
+                await resumed.disconnect()
+
+                # 저장에 실패해 끝내 찾을 수 없는 seq는 건너뛰지 않고 새로 고침을 요청합니다.
+                self.assertEqual(await allocator.aallocate(self.chat_room.id), 4)
+                await sender.send_json_to({'message': 'after gap'})
+                await sender.receive_json_from()
+                stale = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/?last_seq=3')
+                stale.scope['user'] = self.user
+                await stale.connect()
+                self.assertEqual((await stale.receive_json_from())['type'], 'reset')
+                await stale.disconnect()
+            await sender.disconnect()
+
+        asyncio.run(async_test())
+
+class AnonymousIdTests(ChatStateResetMixin, TransactionTestCase):
+    """익명 ID 발급에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='익명 테스트 채팅방', created_by=self.user)
+
+    def test_concurrent_allocations_are_unique(self):
+        # 동시에 발급해도 번호가 겹치지 않고, 데이터베이스에는 블록마다 한 번만 쓰는지 테스트
+        first, second = AnonymousIdAllocator(block_size=10), AnonymousIdAllocator(block_size=10)
+
+        async def async_test():
+            return await asyncio.gather(*[(first if i % 2 else second).aallocate() for i in range(200)])
+
+        numbers = asyncio.run(async_test())
+        self.assertEqual(len(set(numbers)), 200)
+        self.assertEqual(first.blocks + second.blocks, 20)
+
+    def test_refill_does_not_block_event_loop(self):
+        # 다른 스레드가 블록을 예약하는 동안(데이터베이스 쓰기) 번호를 기다리는 코루틴이 이벤트 루프를 멈추지 않는지 테스트
+        allocator = AnonymousIdAllocator(block_size=10)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_reserve_block(name, size):
+            started.set()
+            release.wait(5)
+            return 1, size
+
+        async def async_test():
+            with mock.patch('myapp.anonymous.reserve_block', slow_reserve_block):
+                first = asyncio.create_task(allocator.aallocate())
+                await asyncio.to_thread(started.wait, 5)
+                second = asyncio.create_task(allocator.aallocate())
+                threading.Timer(0.5, release.set).start()
+                began = time.monotonic()
+                await asyncio.sleep(0.05)
+                self.assertLess(time.monotonic() - began, 0.3)
+                return sorted(await asyncio.gather(first, second))
+
+        self.assertEqual(asyncio.run(async_test()), [1, 2])
+        self.assertEqual(allocator.blocks, 1)
+
+    def test_http_sessions_get_distinct_ids(self):
+        url = reverse('chat_room_detail', args=[self.chat_room.id])
+        first, second = Client(), Client()
+        first.get(url)
+        second.get(url)
+        first_id = first.session['anonymous_user_id']
+        self.assertRegex(first_id, r'^익명\d+$')
+        self.assertNotEqual(first_id, second.session['anonymous_user_id'])
+        # 같은 세션은 같은 ID를 유지합니다.
+        first.get(url)
+        self.assertEqual(first.session['anonymous_user_id'], first_id)
+        self.assertEqual(Message.objects.filter(content=f'{first_id} joined the room.').count(), 1)
+
+    def test_websocket_uses_session_identity(self):
+        # HTTP에서 받은 익명 ID가 같은 세션의 WebSocket 메시지에도 사용되는지 테스트
+        client = Client()
+        client.get(reverse('chat_room_detail', args=[self.chat_room.id]))
+        anonymous_id = client.session['anonymous_user_id']
+        cookie = f'sessionid={client.cookies["sessionid"].value}'.encode()
+
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/', headers=[(b'cookie', cookie)])
+            await communicator.connect()
+            self.assertEqual((await communicator.receive_json_from())['content'], f'{anonymous_id} joined the room.')
+            await communicator.send_json_to({'message': 'hello'})
+            self.assertEqual((await communicator.receive_json_from())['content'], f'{anonymous_id}: hello')
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+class AnnouncementTests(ChatStateResetMixin, TransactionTestCase):
+    """입장/퇴장 알림 묶음에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create_user(username=f'user{i}', password='12345') for i in range(5)]
+        self.chat_room = ChatRoom.objects.create(name='알림 테스트 채팅방', created_by=self.users[0])
+
+    def test_format_announcement(self):
+        self.assertEqual(format_announcement('joined', ['alice']), 'alice joined the room.')
+        self.assertEqual(format_announcement('left', ['alice', 'bob']), 'alice and bob left the room.')
+        self.assertEqual(format_announcement('joined', ['alice', 'bob', 'carol']), 'alice, bob and 1 other joined the room.')
+        self.assertEqual(format_announcement('joined', [f'user{i}' for i in range(50)]), 'user0, user1 and 48 others joined the room.')
+
+    def connect_all(self):
+        async def connect(user):
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            return communicator
+
+        return asyncio.gather(*[connect(user) for user in self.users])
+
+    @mock.patch.object(presence_announcer, 'window', 0.2)
+    def test_join_storm_is_one_frame_per_window(self):
+        # 한꺼번에 입장하면 첫 입장은 바로, 나머지는 window가 끝날 때 프레임 하나로 보내는지 테스트
+        async def async_test():
+            communicators = await self.connect_all()
+            first = await communicators[0].receive_json_from()
+            self.assertRegex(first['content'], r'^user\d joined the room\.$')
+            batched = await communicators[0].receive_json_from()
+            self.assertRegex(batched['content'], r'^user\d, user\d and 2 others joined the room\.$')
+            self.assertTrue(await communicators[0].receive_nothing(timeout=0.3))
+            for communicator in communicators:
+                await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+    @mock.patch.object(presence_announcer, 'window', 0.2)
+    @mock.patch.object(presence_announcer, 'count_only_threshold', 2)
+    def test_large_room_gets_count_only_presence(self):
+        async def async_test():
+            communicators = await self.connect_all()
+            await communicators[0].receive_json_from()
+            self.assertEqual(await communicators[0].receive_json_from(), {'type': 'presence', 'online_count': 5})
+            for communicator in communicators:
+                await communicator.disconnect()
+
+        asyncio.run(async_test())
+
+    @mock.patch.object(presence_announcer, 'window', 0.1)
+    def test_persisted_announcements_are_batched(self):
+        # 참여자 입장 메시지가 window마다 한 번만 저장되는지 테스트
+        async def async_test():
+            for user in self.users:
+                await presence_announcer.announce(
+                    f'chat_{self.chat_room.id}', self.chat_room.id, JOINED, user.username, user_id=user.pk, persist=True,
+                )
+            await asyncio.sleep(0.3)
+            await write_buffer.flush()
+
+        asyncio.run(async_test())
+        self.assertEqual(
+            list(Message.objects.filter(chat_room=self.chat_room).order_by('seq').values_list('content', 'seq')),
+            [('user0 joined the room.', 1), ('user1, user2 and 2 others joined the room.', 2)],
+        )
+        self.assertEqual(RoomSummary.objects.get(chat_room=self.chat_room).message_count, 2)
+
+class TypingIndicatorTests(ChatStateResetMixin, TransactionTestCase):
+    """입력 중 표시에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='입력 중 테스트 채팅방', created_by=self.user)
+
+    def test_typing_is_throttled_and_not_persisted(self):
+        # 입력 중 이벤트는 사용자마다 INTERVAL에 한 번만 전달되고, 메시지를 보내면 다시 바로 전달되는지 테스트
+        async def async_test():
+            sender = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            sender.scope['user'] = self.user
+            await sender.connect()
+            listener = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            await listener.connect()
+            await listener.receive_json_from()
+            await sender.receive_json_from()
+            await sender.receive_json_from()
+
+            for _ in range(5):
+                await sender.send_json_to({'type': 'typing'})
+            self.assertEqual(await listener.receive_json_from(), {'type': 'typing', 'username': 'testuser', 'expires_in': 3.0})
+            self.assertTrue(await listener.receive_nothing())
+
+            await sender.send_json_to({'message': 'hello'})
+            self.assertEqual((await listener.receive_json_from())['content'], 'testuser: hello')
+            await sender.send_json_to({'type': 'typing'})
+            self.assertEqual((await listener.receive_json_from())['type'], 'typing')
+
+            await sender.disconnect()
+            await listener.disconnect()
+
+        asyncio.run(async_test())
+        self.assertFalse(Message.objects.exclude(content='testuser: hello').exists())
+
+    def test_throttle_expires(self):
+        with mock.patch('myapp.typing_indicator.time.monotonic', return_value=100):
+            throttle = TypingThrottle(interval=1.0)
+            self.assertTrue(throttle.allow('chat_1', 'alice'))
+            self.assertFalse(throttle.allow('chat_1', 'alice'))
+            self.assertTrue(throttle.allow('chat_1', 'bob'))
+        with mock.patch('myapp.typing_indicator.time.monotonic', return_value=101):
+            self.assertTrue(throttle.allow('chat_2', 'carol'))
+            # 오래된 항목은 지워집니다.
+            self.assertEqual(len(throttle), 1)
+            self.assertTrue(throttle.allow('chat_1', 'alice'))
+
+class HandshakeCacheTests(ChatStateResetMixin, TransactionTestCase):
+    """WebSocket 연결 때 사용자 캐시에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='핸드셰이크 테스트 채팅방', created_by=self.user)
+        self.client.force_login(self.user)
+        self.session_key = self.client.cookies['sessionid'].value
+
+    def connect_and_get_join(self):
+        async def async_test():
+            communicator = WebsocketCommunicator(
+                application, f'/ws/chat/{self.chat_room.id}/', headers=[(b'cookie', f'sessionid={self.session_key}'.encode())]
+            )
+            await communicator.connect()
+            content = (await communicator.receive_json_from())['content']
+            await communicator.disconnect()
+            return content
+
+        return asyncio.run(async_test())
+
+    def test_second_connect_uses_cache(self):
+        # 같은 세션으로 다시 연결하면 세션과 사용자를 조회하지 않는지 테스트
+        from channels.auth import get_user
+        with mock.patch('myapp.handshake.get_user', wraps=get_user) as lookup:
+            self.assertEqual(self.connect_and_get_join(), 'testuser joined the room.')
+            self.assertEqual(self.connect_and_get_join(), 'testuser joined the room.')
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(get_handshake_cache().get(self.session_key), self.user)
+
+    def test_logout_invalidates_cache(self):
+        self.connect_and_get_join()
+        self.assertIsNotNone(get_handshake_cache().get(self.session_key))
+        self.client.logout()
+        self.assertIsNone(get_handshake_cache().get(self.session_key))
+        # 로그아웃한 세션 쿠키로는 더 이상 로그인 사용자로 연결되지 않습니다.
+        self.assertEqual(self.connect_and_get_join(), 'Anonymous joined the room.')
+
+    def test_session_rotation_invalidates_cache(self):
+        # 로그인이나 비밀번호 변경으로 세션 키가 바뀌면(cycle_key) 이전 세션 키의 캐시를 지우는지 테스트
+        self.connect_and_get_join()
+        session = SessionStore(self.session_key)
+        session.cycle_key()
+        self.assertNotEqual(session.session_key, self.session_key)
+        self.assertIsNone(get_handshake_cache().get(self.session_key))
+
+    def test_local_cache_bounds(self):
+        # 오래된 항목은 timeout이 지나면, 개수가 넘치면 가장 오래 사용되지 않은 항목부터 제거되는지 테스트
+        handshake_cache = LocalHandshakeCache(timeout=30, max_entries=2)
+        with mock.patch('myapp.handshake.time.monotonic', return_value=100):
+            handshake_cache.set('a', 'user-a')
+            handshake_cache.set('b', 'user-b')
+            handshake_cache.get('a')
+            handshake_cache.set('c', 'user-c')
+            self.assertIsNone(handshake_cache.get('b'))
+            self.assertEqual(handshake_cache.get('a'), 'user-a')
+            self.assertEqual(len(handshake_cache), 2)
+        with mock.patch('myapp.handshake.time.monotonic', return_value=131):
+            self.assertIsNone(handshake_cache.get('a'))
+
+@override_settings(
+    CHAT_RECENT_MESSAGES={'BACKEND': 'myapp.message_cache.DjangoCacheRecentMessageStore', 'OPTIONS': {}},
+    CHAT_PRESENCE={'BACKEND': 'myapp.presence.DjangoCachePresenceRegistry', 'OPTIONS': {}},
+    CHAT_RATE_LIMITS={**settings.CHAT_RATE_LIMITS, 'BACKEND': 'myapp.ratelimit.DjangoCacheRateLimiter', 'OPTIONS': {}},
+    CHAT_SEQUENCE={**settings.CHAT_SEQUENCE, 'BACKEND': 'myapp.sequence.DjangoCacheSequenceAllocator', 'OPTIONS': {}},
+    CHAT_HANDSHAKE_CACHE={'BACKEND': 'myapp.handshake.DjangoCacheHandshakeCache', 'OPTIONS': {}},
+)
+class SharedBackendTests(ChatStateResetMixin, TransactionTestCase):
+    """여러 워커가 공유하는 Django 캐시 백엔드로 설정해도 테스트 초기화와 채팅이 동작하는지 테스트"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='공유 백엔드 채팅방', created_by=self.user)
+
+    def test_websocket_round_trip(self):
+        async def async_test():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chat_room.id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            self.assertEqual((await communicator.receive_json_from())['content'], 'testuser joined the room.')
+            await communicator.send_json_to({'message': 'hello'})
+            self.assertEqual((await communicator.receive_json_from())['content'], 'testuser: hello')
+            await communicator.disconnect()
+
+        asyncio.run(async_test())
+        self.assertTrue(Message.objects.filter(chat_room=self.chat_room, content='testuser: hello').exists())
+
+
+class RoomTransferTests(TestCase):
+    """채팅방 내보내기/가져오기(export_room, import_room)에 대한 테스트 케이스"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+        cls.other = User.objects.create_user(username='other', password='12345')
+        cls.chat_room = ChatRoom.objects.create(name='내보낼 채팅방', created_by=cls.user)
+        started = timezone.now() - timedelta(days=40)
+        for i in range(5):
+            Message.objects.create(
+                user=cls.user if i % 2 else cls.other, chat_room=cls.chat_room, content=f'메시지 {i}',
+                created_at=started + timedelta(days=i * 10), seq=i + 1,
+            )
+
+    def export(self, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'room.ndjson.gz')
+        call_command('export_room', str(self.chat_room.id), '-o', path, *args, stderr=io.StringIO())
+        return path
+
+    def test_round_trip_with_archive_and_gzip(self):
+        # 보관된 메시지까지 gzip으로 내보내고 가져오면 같은 순서로 seq를 새로 발급하는지 테스트
+        archive_messages(days=30)
+        path = self.export('--chunk-size', '2')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+        out = io.StringIO()
+        call_command('import_room', path, '--name', '가져온 채팅방', '--chunk-size', '2', stdout=out)
+        self.assertIn('Imported 5 messages', out.getvalue())
+
+        imported = ChatRoom.objects.get(name='가져온 채팅방')
+        self.assertEqual(imported.created_by, self.user)
+        messages = list(Message.objects.filter(chat_room=imported).order_by('seq'))
+        self.assertEqual([message.seq for message in messages], [1, 2, 3, 4, 5])
+        self.assertEqual([message.content for message in messages], [f'메시지 {i}' for i in range(5)])
+        self.assertEqual([message.user for message in messages], [self.other, self.user, self.other, self.user, self.other])
+        summary = RoomSummary.objects.get(chat_room=imported)
+        self.assertEqual((summary.message_count, summary.last_message), (5, '메시지 4'))
+        self.assertEqual(summary.last_message_at, messages[-1].created_at)
+        # 한꺼번에 저장한 메시지도 검색되고, 이후에 저장하는 메시지도 계속 색인되어야 합니다.
+        Message.objects.create(chat_room=imported, content='새 메시지', seq=6)
+        results, _ = search_messages('메시지', chat_room_id=imported.id)
+        self.assertEqual(len(results), 6)
+
+    def test_unknown_usernames_import_without_user(self):
+        lines = [
+            json.dumps({'room': {'name': '원본', 'created_by': 'testuser', 'version': 1}}),
+            json.dumps({'username': 'other', 'content': 'hi', 'created_at': '2026-01-01T00:00:00+00:00'}),
+            json.dumps({'username': 'ghost', 'content': 'boo', 'created_at': '2026-01-01T00:00:01+00:00'}),
+            json.dumps({'username': None, 'content': 'anonymous', 'created_at': '2026-01-01T00:00:02+00:00'}),
+        ]
+        chat_room, imported, unmapped = import_room(lines)
+        self.assertEqual((chat_room.name, imported, unmapped), ('원본', 3, 1))
+        users = Message.objects.filter(chat_room=chat_room).order_by('seq').values_list('user__username', flat=True)
+        self.assertEqual(list(users), ['other', None, None])
+
+    def test_failed_import_leaves_no_room(self):
+        lines = [
+            json.dumps({'room': {'name': '원본', 'created_by': 'testuser', 'version': 1}}),
+            json.dumps({'username': 'other', 'content': 'hi', 'created_at': '2026-01-01T00:00:00+00:00'}),
+            '{not json',
+        ]
+        with self.assertRaises(ValueError):
+            import_room(lines, chunk_size=1)
+        self.assertFalse(ChatRoom.objects.filter(name='원본').exists())
+        self.assertFalse(Message.objects.filter(content='hi').exists())
+
+    def test_malformed_lines_report_line_number(self):
+        # 헤더나 메시지 줄의 필드가 빠지거나 잘못되면 줄 번호와 함께 ValueError가 발생하는지 테스트
+        header = json.dumps({'room': {'name': '원본', 'created_by': 'testuser', 'version': 1}})
+        message = {'username': 'other', 'content': 'hi', 'created_at': '2026-01-01T00:00:00+00:00'}
+        cases = [
+            ([json.dumps({'room': {'created_by': 'testuser', 'version': 1}})], "Line 1: the room header has no 'name'"),
+            ([json.dumps({'room': {'name': '원본', 'version': 1}})], "Line 1: the room header has no 'created_by'"),
+            ([header, json.dumps(message), json.dumps({**message, 'username': None}), json.dumps({'content': 'hi', 'created_at': message['created_at']})], "Line 4: 'username' is missing"),
+            ([header, json.dumps({'username': 'other', 'created_at': message['created_at']})], "Line 2: 'content' is missing"),
+            ([header, json.dumps({**message, 'created_at': 'yesterday'})], "Line 2: 'created_at'"),
+            ([header, json.dumps({**message, 'created_at': None})], "Line 2: 'created_at'"),
+            ([header, json.dumps([1, 2])], 'Line 2: expected a message object'),
+            ([header, '', '{"username": "other", "cont'], 'Line 3: invalid JSON'),
+        ]
+        for lines, error in cases:
+            with self.subTest(error=error), self.assertRaisesMessage(ValueError, error):
+                import_room(lines, chunk_size=2)
+            self.assertFalse(ChatRoom.objects.filter(name='원본').exists())
+
+    def test_truncated_gzip_file_fails_cleanly(self):
+        # 중간에 잘린 gzip 파일은 CommandError로 알리고 채팅방을 남기지 않는지 테스트
+        path = self.export()
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) - 10])
+        with self.assertRaises(CommandError):
+            call_command('import_room', path, '--name', '잘린 파일', stdout=io.StringIO())
+        self.assertFalse(ChatRoom.objects.filter(name='잘린 파일').exists())
+
+    def test_import_into_existing_name_fails(self):
+        path = self.export()
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            call_command('import_room', path, stdout=io.StringIO())
+        self.assertEqual(ChatRoom.objects.filter(name=self.chat_room.name).count(), 1)
+
+
 class MessageTestCase(TestCase):
     """메시지 모델에 대한 테스트 케이스"""
     
@@ -116,7 +1656,7 @@ class MessageTestCase(TestCase):
             )
             message.full_clean()  # ValidationError를 발생시키기 위해 full_clean() 호출
 
-class ViewTestCase(TestCase):
+class ViewTestCase(ChatStateResetMixin, TestCase):
     """뷰에 대한 테스트 케이스"""
     
     @classmethod
@@ -127,6 +1667,7 @@ class ViewTestCase(TestCase):
 
     def setUp(self):
         """각 테스트마다 클라이언트를 로그인 상태로 만듭니다."""
+        super().setUp()
         self.client.login(username='testuser', password='12345')
 
     def test_chat_room_list_view(self):
@@ -149,10 +1690,266 @@ class ViewTestCase(TestCase):
         self.assertEqual(response.status_code, 302)  # 리다이렉트 상태 코드
         self.assertTrue(Message.objects.filter(content='testuser: 새 메시지입니다.').exists())
 
+    async def test_chat_room_detail_async_client(self):
+        """async 뷰가 AsyncClient(익명 사용자)에서도 동기 쿼리 없이 동작하는지 테스트"""
+        response = await self.async_client.get(reverse('chat_room_detail', args=[self.chat_room.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.content.decode(), r'익명\d+ joined the room\.')
+
     def test_create_message_with_empty_content(self):
         """빈 메시지 내용으로 메시지 생성 시도"""
         response = self.client.post(reverse('create_message', args=[self.chat_room.id]), {
             'content': ''
         })
         self.assertEqual(response.status_code, 400)  # 잘못된 요청 상태 코드
-        self.assertFalse(Message.objects.filter(content='').exists())
\ No newline at end of file
+        self.assertFalse(Message.objects.filter(content='').exists())
+    @override_settings(CHAT_HISTORY={'PAGE_SIZE': 3, 'MAX_PAGE_SIZE': 10})
+    def test_chat_room_detail_renders_latest_page_only(self):
+        """채팅방 상세 뷰가 최근 메시지 한 페이지만 렌더링하는지 테스트"""
+        for i in range(5):
+            Message.objects.create(user=self.user, chat_room=self.chat_room, content=f'메시지 {i}')
+        response = self.client.get(reverse('chat_room_detail', args=[self.chat_room.id]))
+        self.assertEqual(len(response.context['messages']), 3)
+        self.assertNotContains(response, '메시지 1')
+        self.assertContains(response, 'testuser joined the room.')
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_chat_room_messages_keyset_pagination(self):
+        """이전 메시지 JSON 뷰가 커서를 따라 빠짐없이 페이지를 반환하는지 테스트"""
+        for i in range(7):
+            Message.objects.create(user=self.user, chat_room=self.chat_room, content=f'메시지 {i}')
+        url = reverse('chat_room_messages', args=[self.chat_room.id])
+        contents, cursor = [], None
+        while True:
+            data = self.client.get(url, {'limit': 3, **({'before': cursor} if cursor else {})}).json()
+            contents = [message['content'] for message in data['messages']] + contents
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(contents, [f'메시지 {i}' for i in range(7)])
+
+    def test_chat_room_messages_invalid_cursor(self):
+        """잘못된 커서로 요청하면 400을 반환하는지 테스트"""
+        response = self.client.get(reverse('chat_room_messages', args=[self.chat_room.id]), {'before': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+
+
+class HistoryApiTests(ChatStateResetMixin, TestCase):
+    """메시지 기록 JSON API(ETag, gzip)에 대한 테스트 케이스"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.chat_room = ChatRoom.objects.create(name='기록 테스트 채팅방', created_by=self.user)
+        for seq in range(1, 6):
+            Message.objects.create(user=self.user, chat_room=self.chat_room, content=f'testuser: 메시지 {seq}', seq=seq)
+        self.url = reverse('chat_room_history', args=[self.chat_room.id])
+
+    def add_message(self, content):
+        seq = get_sequence_allocator().allocate(self.chat_room.id)
+        return Message.objects.create(user=self.user, chat_room=self.chat_room, content=content, seq=seq)
+
+    def test_unchanged_room_returns_304_without_message_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([message['seq'] for message in data['messages']], [1, 2, 3, 4, 5])
+        self.assertEqual((data['last_seq'], data['has_more']), (5, False))
+        etag = response['ETag']
+
+        # 채팅방 존재 확인 쿼리 하나만 실행합니다.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # 새 메시지가 있으면 ETag가 바뀌고, after_seq로 새 메시지만 받습니다.
+        self.add_message('testuser: 새 메시지')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(self.url, {'after_seq': 5})
+        self.assertEqual(response.json()['messages'], [{'seq': 6, 'content': 'testuser: 새 메시지', 'created_at': response.json()['messages'][0]['created_at']}])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, {'after_seq': 5}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_pages_follow_last_seq(self):
+        response = self.client.get(self.url, {'after_seq': 0, 'limit': 2}).json()
+        self.assertEqual(([message['seq'] for message in response['messages']], response['last_seq'], response['has_more']), ([1, 2], 2, True))
+        self.assertEqual(self.client.get(self.url, {'after_seq': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('chat_room_history', args=[self.chat_room.id + 1])).status_code, 404)
+
+    def test_unsaved_messages_are_not_cached_by_etag(self):
+        # seq는 발급되었지만 아직 저장되지 않은 메시지가 있으면 받은 메시지까지만 ETag에 반영하는지 테스트
+        seq = get_sequence_allocator().allocate(self.chat_room.id)
+        response = self.client.get(self.url)
+        self.assertEqual((response.json()['last_seq'], response.json()['has_more']), (5, True))
+        Message.objects.create(user=self.user, chat_room=self.chat_room, content='testuser: 늦게 저장된 메시지', seq=seq)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['last_seq'], 6)
+
+    def test_gzip_has_its_own_etag(self):
+        for i in range(50):
+            self.add_message(f'testuser: 압축할 만큼 긴 메시지 {i}')
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed['Vary'], 'Accept-Encoding')
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        self.assertLess(len(compressed.content), len(plain.content))
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=compressed['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], compressed['ETag'])
+
+
+# 성능 회귀 테스트의 데이터 크기 (CHAT_PERF_ROOMS, CHAT_PERF_MESSAGES 환경 변수로 10^5까지 늘릴 수 있습니다)
+PERF_ROOMS = int(os.environ.get('CHAT_PERF_ROOMS', 1000))
+PERF_MESSAGES = int(os.environ.get('CHAT_PERF_MESSAGES', 20000))
+# 느린 CI 머신에서는 CHAT_PERF_TIME_FACTOR로 시간 한도를 늘립니다.
+PERF_TIME_FACTOR = float(os.environ.get('CHAT_PERF_TIME_FACTOR', 1))
+
+
+class ViewTimer:
+    """요청 하나의 DB 시간, 템플릿 렌더링 시간, 전체 시간을 잽니다."""
+
+    def __init__(self):
+        self.db = 0.0
+        self.template = 0.0
+        self.total = 0.0
+        self._depth = 0
+
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+
+    def _render(self, template, context):
+        # extends/include로 중첩된 템플릿은 바깥 템플릿 시간에 포함되므로 한 번만 셉니다.
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            return original_template_render(template, context)
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.template += time.perf_counter() - started
+
+    def request(self, method, *args, **kwargs):
+        with connection.execute_wrapper(self._execute), \
+                mock.patch.object(Template, '_render', lambda template, context: self._render(template, context)):
+            started = time.perf_counter()
+            response = method(*args, **kwargs)
+            self.total = time.perf_counter() - started
+        return response
+
+
+original_template_render = Template._render
+
+
+@tag('perf')
+class ViewPerformanceTests(ChatStateResetMixin, TestCase):
+    """뷰의 쿼리 수와 응답 시간 한도를 확인하는 성능 회귀 테스트
+
+    메시지 수나 채팅방 수에 따라 쿼리 수가 늘어나면(N+1) 실패합니다.
+    python manage.py test --settings=liveChat.test_settings --tag perf 로 이 테스트만 실행할 수 있습니다.
+    """
+
+    timings = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='perfuser', password='12345')
+        others = User.objects.bulk_create([User(username=f'perf{i}') for i in range(20)])
+        rooms = ChatRoom.objects.bulk_create([
+            ChatRoom(name=f'방 {i}', created_by=cls.user) for i in range(PERF_ROOMS)
+        ])
+        cls.chat_room = rooms[0]
+        # bulk_create는 post_save 시그널을 보내지 않으므로 요약을 직접 만듭니다.
+        RoomSummary.objects.bulk_create([RoomSummary(chat_room=room) for room in rooms], batch_size=1000)
+        # 메시지 대부분을 첫 번째 방에 넣어 상세 페이지가 큰 방에서도 빠른지 확인합니다.
+        Message.objects.bulk_create([
+            Message(
+                user=others[i % len(others)],
+                chat_room=cls.chat_room if i % 10 else rooms[i % len(rooms)],
+                content=f'메시지 {i}',
+            )
+            for i in range(PERF_MESSAGES)
+        ], batch_size=1000)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls.timings:
+            print(f'\n뷰 성능 ({PERF_ROOMS} rooms, {PERF_MESSAGES} messages)')
+            print(f"{'view':<24}{'queries':>8}{'db ms':>10}{'template ms':>13}{'total ms':>10}")
+            for name, queries, timer in cls.timings:
+                print(f'{name:<24}{queries:>8}{timer.db * 1000:>10.1f}{timer.template * 1000:>13.1f}{timer.total * 1000:>10.1f}')
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='perfuser', password='12345')
+        # seq는 채팅방마다 처음 한 번만 저장된 최댓값을 조회하므로 요청별 비용에서 제외합니다.
+        get_sequence_allocator().current(self.chat_room.id)
+
+    def assertBudget(self, name, max_queries, max_seconds, method, *args, **kwargs):
+        """요청의 쿼리 수와 전체 시간이 한도 안인지 확인하고 응답을 반환합니다."""
+        timer = ViewTimer()
+        with CaptureQueriesContext(connection) as queries:
+            response = timer.request(method, *args, **kwargs)
+        self.timings.append((name, len(queries), timer))
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{name} ran {len(queries)} queries:\n' + '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+        self.assertLess(timer.total, max_seconds * PERF_TIME_FACTOR, f'{name} took {timer.total:.3f}s')
+        return response
+
+    def test_chat_room_list_budget(self):
+        # 세션, 사용자, 요약, 읽음 위치 (읽음 위치가 있으면 안 읽은 메시지 수 쿼리 하나가 더 실행됩니다)
+        response = self.assertBudget('chat_room_list', 4, 0.3, self.client.get, reverse('chat_room_list'))
+        self.assertEqual(response.status_code, 200)
+        response = self.assertBudget(
+            'chat_room_list (page 2)', 4, 0.3, self.client.get, reverse('chat_room_list'), {'cursor': response.context['next_cursor']},
+        )
+        self.assertEqual(len(response.context['summaries']), 50)
+        response = self.assertBudget('chat_room_list (prefix)', 4, 0.3, self.client.get, reverse('chat_room_list'), {'q': '방 99'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_chat_room_detail_budget(self):
+        url = reverse('chat_room_detail', args=[self.chat_room.id])
+        # 첫 입장: 참여자 등록, 입장 메시지 저장과 요약 갱신, 최근 메시지 캐시 채우기
+        response = self.assertBudget('chat_room_detail', 10, 0.5, self.client.get, url)
+        self.assertEqual(response.status_code, 200)
+        # 다시 들어오면 최근 메시지를 캐시에서 읽으므로 메시지 쿼리가 없어야 합니다.
+        response = self.assertBudget('chat_room_detail (hit)', 4, 0.3, self.client.get, url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_message_budget(self):
+        url = reverse('create_message', args=[self.chat_room.id])
+        response = self.assertBudget('create_message', 5, 0.3, self.client.post, url, {'content': '안녕하세요'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_leave_chat_room_budget(self):
+        url = reverse('leave_chat_room', args=[self.chat_room.id])
+        # 참여자 삭제, 접속자 수와 퇴장 메시지 요약 갱신
+        response = self.assertBudget('leave_chat_room', 7, 0.3, self.client.get, url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_search_budget(self):
+        # 전문 검색 인덱스를 사용하므로 메시지 수와 관계없이 빨라야 합니다.
+        url = reverse('chat_room_search', args=[self.chat_room.id])
+        response = self.assertBudget('chat_room_search', 5, 0.3, self.client.get, url, {'q': '메시지 1999'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_chat_room_budget(self):
+        # 메시지 수와 관계없이 관련 행을 한 번에 지워야 합니다.
+        url = reverse('delete_chat_room', args=[self.chat_room.id])
+        response = self.assertBudget('delete_chat_room', 10, 1.0, self.client.post, url)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ChatRoom.objects.filter(id=self.chat_room.id).exists())
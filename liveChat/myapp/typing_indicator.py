@@ -0,0 +1,60 @@
+import threading
+import time
+
+from django.conf import settings
+
+
+class TypingThrottle:
+    """입력 중 표시(typing) 이벤트를 방과 사용자마다 interval에 한 번만 통과시키는 throttle
+
+    같은 사용자가 여러 탭에서 입력해도 방에는 interval마다 한 번만 보냅니다. (방 안에서 중복 제거)
+    interval이 지난 항목은 다음 호출 때 지우므로 메모리는 최근에 입력한 사용자 수만큼만 사용합니다.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._last_sent = {}  # (group, identity) -> 마지막으로 보낸 시각
+        self._last_purge = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._last_sent)
+
+    def allow(self, group, identity):
+        """이번 이벤트를 보내야 하면 True를 반환합니다."""
+        now = time.monotonic()
+        key = (group, identity)
+        with self._lock:
+            if now - self._last_purge >= self.interval:
+                self._last_sent = {
+                    entry: sent_at for entry, sent_at in self._last_sent.items() if now - sent_at < self.interval
+                }
+                self._last_purge = now
+            sent_at = self._last_sent.get(key)
+            if sent_at is not None and now - sent_at < self.interval:
+                return False
+            self._last_sent[key] = now
+            return True
+
+    def reset(self, group, identity):
+        """메시지를 보내면 입력이 끝난 것이므로 다음 입력 이벤트를 바로 보낼 수 있게 합니다."""
+        with self._lock:
+            self._last_sent.pop((group, identity), None)
+
+    def clear(self):
+        with self._lock:
+            self._last_sent.clear()
+
+
+def _build_typing_throttle():
+    config = getattr(settings, 'CHAT_TYPING', {})
+    return TypingThrottle(interval=config.get('INTERVAL', 1.0))
+
+
+def get_typing_ttl():
+    # 클라이언트가 입력 중 표시를 보여주는 시간 (새 이벤트가 없으면 이 시간이 지나 사라집니다)
+    return getattr(settings, 'CHAT_TYPING', {}).get('TTL', 3.0)
+
+
+# 프로세스마다 하나의 throttle을 공유합니다.
+typing_throttle = _build_typing_throttle()
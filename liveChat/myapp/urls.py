@@ -6,8 +6,14 @@ urlpatterns = [
     path('register/', views.register, name='register'),  # 회원가입 페이지 URL 패턴
     path('chat_rooms/', views.chat_room_list, name='chat_room_list'),
     path('chat_rooms/<int:chat_room_id>/', views.chat_room_detail, name='chat_room_detail'),
+    path('chat_rooms/<int:chat_room_id>/messages/', views.chat_room_messages, name='chat_room_messages'),  # 이전 메시지 JSON URL 패턴
+    path('chat_rooms/<int:chat_room_id>/history/', views.chat_room_history, name='chat_room_history'),  # 메시지 기록 JSON URL 패턴 (ETag, gzip)
+    path('chat_rooms/<int:chat_room_id>/search/', views.chat_room_search, name='chat_room_search'),  # 채팅방 메시지 검색 URL 패턴
+    path('search/', views.search, name='search'),  # 전체 메시지 검색 URL 패턴
+    path('chat_rooms/<int:chat_room_id>/online/', views.chat_room_online, name='chat_room_online'),  # 접속자 수 JSON URL 패턴
     path('chat_rooms/<int:chat_room_id>/create_message/', views.create_message, name='create_message'),
     path('chat_rooms/<int:chat_room_id>/leave/', views.leave_chat_room, name='leave_chat_room'),  # 채팅방 나가기 URL 패턴
     path('chat_rooms/<int:chat_room_id>/delete/', views.delete_chat_room, name='delete_chat_room'),  # 채팅방 삭제 URL 패턴
     path('logout/', views.user_logout, name='logout'),  # 로그아웃 URL 패턴
+    path('metrics/', views.metrics_view, name='metrics'),  # Prometheus 메트릭 URL 패턴
 ]
\ No newline at end of file
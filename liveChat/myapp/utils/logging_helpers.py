@@ -1,18 +1,100 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+__all__ = ['log_debug', 'log_info', 'log_warning', 'log_error', 'log_critical']
 
 logger = logging.getLogger('myapp')
 
-def log_debug(message):
-    logger.debug(message)
+# 로그 메시지는 %-스타일 인자로 넘깁니다. (예: log_debug("messages=%d", count))
+# 로그 레벨이 꺼져 있으면 문자열을 만들지 않습니다.
+# stacklevel=2: module/funcName에 이 파일 대신 헬퍼를 호출한 곳이 기록됩니다.
+
+def log_debug(message, *args, **kwargs):
+    logger.debug(message, *args, stacklevel=2, **kwargs)
+
+def log_info(message, *args, **kwargs):
+    logger.info(message, *args, stacklevel=2, **kwargs)
+
+def log_warning(message, *args, **kwargs):
+    logger.warning(message, *args, stacklevel=2, **kwargs)
+
+def log_error(message, *args, **kwargs):
+    logger.error(message, *args, stacklevel=2, **kwargs)
+
+def log_critical(message, *args, **kwargs):
+    logger.critical(message, *args, stacklevel=2, **kwargs)
+
+
+# LogRecord의 기본 속성 (이 외의 속성은 extra로 넘긴 값이므로 JSON에 함께 기록합니다)
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """로그 레코드를 JSON 한 줄로 변환하는 포매터"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'function': record.funcName,
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """로그를 큐에 넣기만 하고, 파일 쓰기와 포매팅은 백그라운드 스레드(QueueListener)가 하는 핸들러
+
+    요청이나 이벤트 루프가 디스크 I/O를 기다리지 않습니다. 큐가 가득 차면 기다리지 않고
+    로그를 버리고 버린 수를 dropped에 셉니다.
+    """
+
+    def __init__(self, filename, max_queue_size=10000, encoding='utf-8'):
+        super().__init__(queue.Queue(max_queue_size))
+        self.target = logging.FileHandler(filename, encoding=encoding, delay=True)
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        # 프로세스가 끝날 때 큐에 남은 로그를 모두 쓰고 스레드를 멈춥니다.
+        atexit.register(self.close)
 
-def log_info(message):
-    logger.info(message)
+    def setFormatter(self, fmt):
+        # 포매팅은 백그라운드 스레드에서 하도록 파일 핸들러에 포매터를 설정합니다.
+        self.target.setFormatter(fmt)
 
-def log_warning(message):
-    logger.warning(message)
+    def prepare(self, record):
+        # 메시지 인자(QuerySet 등)는 다른 스레드에서 평가하면 안 되므로 여기서 메시지를 만듭니다.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-def log_error(message):
-    logger.error(message)
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-def log_critical(message):
-    logger.critical(message)
\ No newline at end of file
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
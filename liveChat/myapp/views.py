@@ -1,101 +1,326 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseServerError
+import gzip
+import json
+import math
+import re
+from django.shortcuts import render, aget_object_or_404, get_object_or_404, redirect
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseServerError, JsonResponse
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from .models import ChatRoom, Message
+from django.conf import settings
+from django.utils.http import parse_etags
+from . import metrics
+from .anonymous import aget_anonymous_id
+from .announcements import JOINED, LEFT, presence_announcer
+from .history import aget_messages_between, aget_recent_messages, decode_cursor, get_message_page, get_page_size, is_contiguous, serialize_message
+from .message_cache import get_recent_message_store
+from .models import ChatRoom, Message, RoomMember
+from .presence import get_presence_registry
+from .ratelimit import acheck_message_rate
+from .read_state import aget_unread_counts, read_mark_buffer
+from .search import search_messages
+from .sequence import get_sequence_allocator
+from .summary import aget_room_page, arecord_messages, aupdate_online_count
 from .utils.logging_helpers import *  # 로깅 헬퍼 임포트
 
-def get_anonymous_user_id(request):
-    # 세션에 익명 사용자 ID가 없으면 새로운 ID 생성
-    if 'anonymous_user_id' not in request.session:
-        existing_ids = [int(id.split('익명')[1]) for id in request.session.keys() if id.startswith('익명')]
-        new_id_number = max(existing_ids, default=0) + 1
-        request.session['anonymous_user_id'] = f'익명{new_id_number}'
-    return request.session['anonymous_user_id']
+async def get_anonymous_user_id(request):
+    # 세션에 익명 사용자 ID가 없으면 공용 카운터에서 새로운 ID를 발급받아 세션에 저장
+    return await aget_anonymous_id(request.session)
 
-def chat_room_list(request):
+async def get_user(request):
+    # async 뷰에서 사용자를 가져옵니다. 템플릿에서 request.user를 읽을 때
+    # 동기 쿼리가 실행되지 않도록 request.user도 가져온 사용자로 바꿉니다.
+    request.user = await request.auser()
+    return request.user
+
+async def get_sender_key(request, user):
+    # rate limit 버킷 키 (로그인 사용자는 사용자별, 익명 사용자는 세션별)
+    if user.is_authenticated:
+        return f'user:{user.pk}'
+    if not request.session.session_key:
+        await request.session.asave()
+    return f'anonymous:{request.session.session_key}'
+
+async def create_chat_message(user, chat_room, content):
+    # 메시지를 저장하고 최근 메시지 캐시에도 추가합니다.
+    seq = await get_sequence_allocator().aallocate(chat_room.id)
+    message = await Message.objects.acreate(user=user, chat_room=chat_room, content=content, seq=seq)
+    await get_recent_message_store().aappend(chat_room.id, serialize_message(message))
+    await arecord_messages([message])
+    return message
+
+async def chat_room_list(request):
     """채팅방 목록을 보여주는 뷰"""
     try:
-        # 모든 채팅방을 가져옵니다.
-        chat_rooms = ChatRoom.objects.all()
-        if request.method == 'POST' and request.user.is_authenticated:
+        user = await get_user(request)
+        if request.method == 'POST' and user.is_authenticated:
             # 새로운 채팅방을 생성합니다.
             room_name = request.POST.get('room_name', '').strip()
             if room_name:
-                chat_room = ChatRoom.objects.create(name=room_name, created_by=request.user)
-                Message.objects.create(user=request.user, chat_room=chat_room, content=f'{request.user.username} created the room.')
+                chat_room = await ChatRoom.objects.acreate(name=room_name, created_by=user)
+                await create_chat_message(user, chat_room, f'{user.username} created the room.')
                 return redirect('chat_room_list')
-        return render(request, 'chat_room_list.html', {'chat_rooms': chat_rooms})
+        # 최근 활동 순으로 채팅방 한 페이지를 가져옵니다. (?q=이름 접두어, ?cursor=다음 페이지)
+        query = request.GET.get('q', '').strip()
+        try:
+            summaries, next_cursor = await aget_room_page(before=request.GET.get('cursor'), prefix=query)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid cursor')
+        # 로그인 사용자는 읽음 위치가 있는 채팅방의 안 읽은 메시지 수를 함께 보여줍니다.
+        if user.is_authenticated and summaries:
+            unread_counts = await aget_unread_counts(user.id, [summary.chat_room_id for summary in summaries])
+            for summary in summaries:
+                summary.unread_count = unread_counts.get(summary.chat_room_id)
+        return render(request, 'chat_room_list.html', {'summaries': summaries, 'next_cursor': next_cursor, 'query': query})
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in chat_room_list: {str(e)}")
+        log_error("Error in chat_room_list: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
-def chat_room_detail(request, chat_room_id):
+async def chat_room_detail(request, chat_room_id):
     """채팅방 상세 정보를 보여주는 뷰"""
     try:
-        # 특정 채팅방과 그 메시지를 가져옵니다.
-        chat_room = get_object_or_404(ChatRoom, id=chat_room_id)
-        messages = Message.objects.filter(chat_room=chat_room).order_by('created_at')
-        log_debug(f"Context data: chat_room={chat_room}, messages={messages}")
+        # 특정 채팅방을 가져옵니다.
+        chat_room = await aget_object_or_404(ChatRoom, id=chat_room_id)
         # 사용자 이름을 설정합니다.
-        if request.user.is_authenticated:
-            username = request.user.username
+        user = await get_user(request)
+        if user.is_authenticated:
+            username = user.username
         else:
-            username = get_anonymous_user_id(request)
-        
-        # 사용자가 입장했을 때 알림 메시지를 생성합니다.
-        if not Message.objects.filter(chat_room=chat_room, content__contains=f'{username} joined the room.').exists():
-            Message.objects.create(user=request.user if request.user.is_authenticated else None, chat_room=chat_room, content=f'{username} joined the room.')
+            username = await get_anonymous_user_id(request)
         
-        return render(request, 'chat_room_detail.html', {'chat_room': chat_room, 'messages': messages, 'username': username})
+        # 사용자가 처음 입장했을 때만 알림 메시지를 생성합니다. (참여자 테이블의 유니크 인덱스로 확인)
+        _, joined = await RoomMember.objects.aget_or_create(
+            chat_room=chat_room,
+            identity=username,
+            defaults={'user': user if user.is_authenticated else None},
+        )
+        if joined:
+            await presence_announcer.announce(
+                f'chat_{chat_room.id}', chat_room.id, JOINED, username, user_id=user.pk if user.is_authenticated else None, persist=True,
+            )
+
+        # 최근 메시지 한 페이지만 가져옵니다. (최근 메시지 캐시에 있으면 데이터베이스를 조회하지 않습니다)
+        # 이전 메시지는 chat_room_messages로 불러옵니다.
+        messages, next_cursor = await aget_recent_messages(chat_room)
+        # 로그인 사용자는 보여준 마지막 메시지까지 읽은 것으로 기록합니다. (버퍼에 모아서 저장)
+        if user.is_authenticated and messages:
+            await read_mark_buffer.mark(user.id, chat_room.id, decode_cursor(messages[-1]['cursor'])[0])
+        log_debug("Context data: chat_room=%s, messages=%d", chat_room, len(messages))
+        return render(request, 'chat_room_detail.html', {'chat_room': chat_room, 'messages': messages, 'next_cursor': next_cursor, 'username': username})
     except ChatRoom.DoesNotExist:
         # 채팅방이 존재하지 않을 때 로그를 기록하고 404 응답을 반환합니다.
-        log_error(f"ChatRoom with id {chat_room_id} does not exist.")
+        log_error("ChatRoom with id %s does not exist.", chat_room_id)
         return HttpResponse("Chat room not found.", status=404)
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in chat_room_detail: {str(e)}")
+        log_error("Error in chat_room_detail: %s", e)
+        return HttpResponseServerError("An unexpected error occurred.")
+
+def chat_room_messages(request, chat_room_id):
+    """이전 메시지를 커서 단위로 불러오는 JSON 뷰"""
+    try:
+        chat_room = get_object_or_404(ChatRoom, id=chat_room_id)
+        try:
+            limit = get_page_size(request.GET.get('limit'))
+            messages, next_cursor = get_message_page(chat_room, before=request.GET.get('before'), limit=limit)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid cursor or limit')
+        return JsonResponse({
+            'messages': [serialize_message(message) for message in messages],
+            'next_cursor': next_cursor,
+        })
+    except Exception as e:
+        # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
+        log_error("Error in chat_room_messages: %s", e)
+        return HttpResponseServerError("An unexpected error occurred.")
+
+def history_etag(chat_room_id, after_seq, last_seq, has_more, encoding=None):
+    # 강한 ETag: 같은 seq 범위의 응답은 항상 같은 바이트이므로 seq 범위로 만듭니다. (인코딩마다 다른 ETag)
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"{chat_room_id}-{after_seq}-{last_seq}-{int(has_more)}{suffix}"'
+
+def etag_matches(request, etags):
+    # If-None-Match는 약한 비교를 사용합니다. (W/ 접두어 무시)
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return None
+    requested = [etag.removeprefix('W/') for etag in parse_etags(if_none_match)]
+    for etag in etags:
+        if '*' in requested or etag in requested:
+            return etag
+    return None
+
+def history_response(response, etag):
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    # 캐시에 저장해도 되지만 쓰기 전에 항상 ETag로 다시 확인해야 합니다.
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+async def chat_room_history(request, chat_room_id):
+    """메시지 기록 JSON 뷰 (ETag 조건부 요청, gzip 압축)
+
+    ?after_seq=N 다음 메시지를 seq 순서로 최대 limit개 반환합니다. after_seq가 없으면 최근 limit개를 반환합니다.
+    응답의 last_seq를 다음 요청의 after_seq로 사용합니다. ETag는 채팅방의 마지막 seq로 만들므로
+    새 메시지가 없으면 메시지를 조회하지 않고 304로 응답합니다.
+    """
+    try:
+        if not await ChatRoom.objects.filter(id=chat_room_id).aexists():
+            return HttpResponse("Chat room not found.", status=404)
+        try:
+            limit = get_page_size(request.GET.get('limit'))
+            after_seq = request.GET.get('after_seq')
+            after_seq = int(after_seq) if after_seq is not None else None
+        except ValueError:
+            return HttpResponseBadRequest('Invalid after_seq or limit')
+        if after_seq is not None and after_seq < 0:
+            return HttpResponseBadRequest('Invalid after_seq or limit')
+
+        current = await get_sequence_allocator().acurrent(chat_room_id)
+        after_seq = max(0, current - limit) if after_seq is None else min(after_seq, current)
+        until_seq = min(current, after_seq + limit)
+        accepts_gzip = bool(re.search(r'\bgzip\b', request.headers.get('Accept-Encoding', '')))
+
+        # 메시지를 조회하기 전에 seq만으로 만든 ETag와 비교합니다. (두 인코딩은 같은 내용이므로 어느 쪽이든 일치하면 304)
+        etags = [history_etag(chat_room_id, after_seq, until_seq, current > until_seq)]
+        if accepts_gzip:
+            etags.append(history_etag(chat_room_id, after_seq, until_seq, current > until_seq, 'gzip'))
+        matched = etag_matches(request, etags)
+        if matched:
+            return history_response(HttpResponse(status=304), matched)
+
+        messages = await aget_messages_between(chat_room_id, after_seq, until_seq)
+        # 다른 워커의 쓰기 버퍼에 있는 메시지가 아직 저장되지 않았으면 받은 메시지까지만 ETag에 반영해 다음 요청에서 다시 조회합니다.
+        if is_contiguous(messages, after_seq, until_seq):
+            last_seq = until_seq
+        else:
+            last_seq = messages[-1]['seq'] if messages else after_seq
+        body = json.dumps({
+            # 본문에 보낸 사람 이름이 들어 있으므로 username은 보내지 않습니다. (캐시와 데이터베이스에서 읽은 응답이 같은 바이트가 되도록)
+            'messages': [
+                {key: message[key] for key in ('seq', 'content', 'created_at')} for message in messages
+            ],
+            'last_seq': last_seq,
+            'has_more': current > last_seq,
+        }, ensure_ascii=False, separators=(',', ':')).encode()
+
+        encoding = None
+        if accepts_gzip and len(body) >= getattr(settings, 'CHAT_HISTORY', {}).get('GZIP_MIN_SIZE', 1024):
+            # mtime=0으로 압축하면 같은 본문은 항상 같은 바이트가 되므로 강한 ETag를 사용할 수 있습니다.
+            body = gzip.compress(body, mtime=0)
+            encoding = 'gzip'
+        response = HttpResponse(body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return history_response(response, history_etag(chat_room_id, after_seq, last_seq, current > last_seq, encoding))
+    except Exception as e:
+        # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
+        log_error("Error in chat_room_history: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
-def create_message(request, chat_room_id):
+def search_results(request, chat_room_id=None):
+    # 검색 JSON 응답 (메시지마다 채팅방 ID를 함께 반환합니다)
+    try:
+        limit = get_page_size(request.GET.get('limit'))
+        messages, next_cursor = search_messages(request.GET.get('q', ''), chat_room_id=chat_room_id, cursor=request.GET.get('cursor'), limit=limit)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor or limit')
+    return JsonResponse({
+        'results': [{**serialize_message(message), 'chat_room_id': message.chat_room_id} for message in messages],
+        'next_cursor': next_cursor,
+    })
+
+def chat_room_search(request, chat_room_id):
+    """채팅방 메시지를 전문 검색하는 JSON 뷰 (?q=검색어)"""
+    try:
+        chat_room = get_object_or_404(ChatRoom, id=chat_room_id)
+        return search_results(request, chat_room.id)
+    except Exception as e:
+        # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
+        log_error("Error in chat_room_search: %s", e)
+        return HttpResponseServerError("An unexpected error occurred.")
+
+def search(request):
+    """모든 채팅방의 메시지를 전문 검색하는 JSON 뷰 (?q=검색어)"""
+    try:
+        return search_results(request)
+    except Exception as e:
+        # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
+        log_error("Error in search: %s", e)
+        return HttpResponseServerError("An unexpected error occurred.")
+
+def chat_room_online(request, chat_room_id):
+    """채팅방 접속자 수와 접속자 목록을 반환하는 JSON 뷰"""
+    try:
+        chat_room = get_object_or_404(ChatRoom, id=chat_room_id)
+        online_users = get_presence_registry().online_users(chat_room.id)
+        return JsonResponse({'online_count': len(online_users), 'users': online_users})
+    except Exception as e:
+        # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
+        log_error("Error in chat_room_online: %s", e)
+        return HttpResponseServerError("An unexpected error occurred.")
+
+async def create_message(request, chat_room_id):
     """메시지를 생성하는 뷰"""
     try:
         # 특정 채팅방을 가져옵니다.
-        chat_room = get_object_or_404(ChatRoom, id=chat_room_id)
+        chat_room = await aget_object_or_404(ChatRoom, id=chat_room_id)
         if request.method == 'POST':
             # 메시지 내용을 가져와서 저장합니다.
             content = request.POST.get('content', '').strip()
             if not content:
                 return HttpResponseBadRequest('Content cannot be empty')
-            if request.user.is_authenticated:
-                user = request.user
+            # 사용자와 채팅방의 전송 한도를 넘으면 저장하지 않습니다.
+            user = await get_user(request)
+            retry_after = await acheck_message_rate(await get_sender_key(request, user), chat_room.id)
+            if retry_after:
+                response = HttpResponse('Too many messages. Please try again later.', status=429)
+                response['Retry-After'] = math.ceil(retry_after)
+                return response
+            if user.is_authenticated:
                 username = user.username
             else:
                 user = None
-                username = f'Anonymous-{get_anonymous_user_id(request)}'
-            Message.objects.create(user=user, chat_room=chat_room, content=f'{username}: {content}')
+                username = await get_anonymous_user_id(request)
+            await create_chat_message(user, chat_room, f'{username}: {content}')
             return redirect(reverse('chat_room_detail', args=[chat_room.id]))
+        await get_user(request)
         return render(request, 'create_message.html', {'chat_room': chat_room})
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in create_message: {str(e)}")
+        log_error("Error in create_message: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
-def leave_chat_room(request, chat_room_id):
+async def leave_chat_room(request, chat_room_id):
     """채팅방 나가기 뷰"""
     try:
         # 특정 채팅방을 가져옵니다.
-        chat_room = get_object_or_404(ChatRoom, id=chat_room_id)
-        # 사용자가 채팅방을 나갈 때 알림 메시지를 생성합니다.
-        username = request.user.username if request.user.is_authenticated else f'Anonymous-{get_anonymous_user_id(request)}'
-        Message.objects.create(user=request.user if request.user.is_authenticated else None, chat_room=chat_room, content=f'{username} left the room.')
+        chat_room = await aget_object_or_404(ChatRoom, id=chat_room_id)
+        # 참여자 목록과 접속자 목록에서 사용자를 제거합니다.
+        user = await get_user(request)
+        identity = user.username if user.is_authenticated else await get_anonymous_user_id(request)
+        await RoomMember.objects.filter(chat_room=chat_room, identity=identity).adelete()
+        await get_presence_registry().aleave(chat_room.id, identity)
+        await aupdate_online_count(chat_room.id)
+        # 사용자가 채팅방을 나갈 때 알림 메시지를 생성합니다. (한꺼번에 나간 사용자는 모아서 한 번에 저장)
+        await presence_announcer.announce(
+            f'chat_{chat_room.id}', chat_room.id, LEFT, identity, user_id=user.pk if user.is_authenticated else None, persist=True,
+        )
         return redirect('chat_room_list')
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in leave_chat_room: {str(e)}")
+        log_error("Error in leave_chat_room: %s", e)
+        return HttpResponseServerError("An unexpected error occurred.")
+
+def metrics_view(request):
+    """Prometheus 텍스트 형식으로 메트릭을 반환하는 뷰 (CHAT_METRICS에 캐시를 설정하면 모든 워커의 합계)"""
+    try:
+        return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
+        log_error("Error in metrics_view: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
 @login_required
@@ -107,11 +332,12 @@ def delete_chat_room(request, chat_room_id):
         # 사용자가 채팅방을 삭제할 권한이 있는지 확인합니다.
         if chat_room.created_by != request.user:
             return HttpResponseForbidden('You are not allowed to delete this room.')
+        get_recent_message_store().discard(chat_room.id)
         chat_room.delete()
         return redirect('chat_room_list')
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in delete_chat_room: {str(e)}")
+        log_error("Error in delete_chat_room: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
 def index(request):
@@ -130,7 +356,7 @@ def index(request):
         return render(request, 'index.html')
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in index: {str(e)}")
+        log_error("Error in index: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
 def register(request):
@@ -155,7 +381,7 @@ def register(request):
         return render(request, 'register.html')
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in register: {str(e)}")
+        log_error("Error in register: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
 
 @login_required
@@ -167,5 +393,5 @@ def user_logout(request):
         return redirect('index')
     except Exception as e:
         # 예외 발생 시 로그를 기록하고 서버 오류 응답을 반환합니다.
-        log_error(f"Error in user_logout: {str(e)}")
+        log_error("Error in user_logout: %s", e)
         return HttpResponseServerError("An unexpected error occurred.")
\ No newline at end of file